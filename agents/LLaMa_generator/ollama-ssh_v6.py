@@ -1,3 +1,4 @@
+import httpx
 import ollama
 import time
 import subprocess
@@ -7,6 +8,18 @@ import sys
 import signal
 import datetime
 import traceback
+import logging
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from settings import LLM_API_HOSTS, LLM_POOL_SIZE
+from agents.http_sessions import LOCAL, create_session
+from agents.llm_pool import OllamaPool
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # Цветовые коды ANSI
 RESET = "\033[0m"
@@ -17,7 +30,13 @@ GRAY = "\033[37m"
 WHITE = "\033[97m"
 
 # 🛠 НАСТРОЙКИ 🛠
-OLLAMA_HOST = "http://"ip_OLLAMA_HOST":11434"
+# Серверы Ollama берутся из settings.LLM_API_HOSTS (переменная LLMCAN_LLM_HOSTS);
+# проверки серверов идут через локальную сессию без системных прокси, как в agents/llm_client.py
+OLLAMA_POOL = OllamaPool(
+    LLM_API_HOSTS,
+    session=create_session(LOCAL, pool_connections=len(LLM_API_HOSTS), pool_maxsize=LLM_POOL_SIZE),
+)
+OLLAMA_CLIENTS = {}  # Клиент на каждый сервер, чтобы переиспользовать соединения
 MODEL_NAME = None  # Выбор модели в меню
 USER_MESSAGE_FILE = None  # Файл с сообщениями
 RESPONSE_FILE = None  # Файл для записи ответов
@@ -49,16 +68,39 @@ def show_status():
     print(f"Последняя обработанная строка: {YELLOW}{LAST_PROCESSED_LINE if LAST_PROCESSED_LINE else 'ЕЩЁ НЕ ОБРАБАТЫВАЛИСЬ'}{RESET}")
     print("-" * 60)
 
+# ====== КЛИЕНТЫ OLLAMA ======
+def get_ollama_client(host):
+    """Возвращает клиента для сервера Ollama, создавая его при первом обращении"""
+    if host not in OLLAMA_CLIENTS:
+        OLLAMA_CLIENTS[host] = ollama.Client(host=host)
+    return OLLAMA_CLIENTS[host]
+
+# Клиент ollama работает через httpx, а OllamaPool.acquire сам распознаёт только
+# ошибки requests, поэтому об отказе сервера пулу сообщается явно
+CONNECTION_ERRORS = (httpx.ConnectError, httpx.TimeoutException)
+
+def chat_via_pool(messages):
+    """Отправляет запрос на сервер из пула; недоступный сервер исключается, и запрос уходит на следующий"""
+    last_error = None
+    for _ in OLLAMA_POOL.hosts:
+        with OLLAMA_POOL.acquire(MODEL_NAME) as host:
+            try:
+                return get_ollama_client(host).chat(model=MODEL_NAME, messages=messages)
+            except CONNECTION_ERRORS as e:
+                OLLAMA_POOL.mark_unhealthy(host, e)
+                last_error = e
+    raise last_error
+
 # ====== ФУНКЦИЯ ВЫБОРА МОДЕЛИ ======
 def get_model_list():
-    """Получает список доступных моделей Ollama"""
-    try:
-        client = ollama.Client(host=OLLAMA_HOST)
-        models = client.list()["models"]
-        return [m["model"] for m in models]
-    except Exception as e:
-        print(f"{RED}Ошибка при получении списка моделей: {e}{RESET}")
-        return []
+    """Получает список моделей со всех доступных серверов Ollama"""
+    OLLAMA_POOL.refresh()
+    models = OLLAMA_POOL.list_models()
+    if not models:
+        for host in OLLAMA_POOL.status():
+            if host["last_error"]:
+                print(f"{RED}Ошибка при получении списка моделей с {host['base_url']}: {host['last_error']}{RESET}")
+    return models
 
 def choose_model():
     """Меню выбора модели"""
@@ -159,11 +201,12 @@ def process_generation():
 
     print(f"\n{GREEN}Запущена обработка с использованием модели `{MODEL_NAME}`...{RESET}")
 
-    client = ollama.Client(host=OLLAMA_HOST)
+    OLLAMA_POOL.start()
 
     try:
         for idx, message in enumerate(open(USER_MESSAGE_FILE).readlines()[START_LINE:], start=START_LINE + 1):
-            response = client.chat(model=MODEL_NAME, messages=[
+            # Каждое сообщение уходит на наименее загруженный исправный сервер с моделью
+            response = chat_via_pool([
                 {"role": "system", "content": open(SYS_PROMPT_FILE).read().strip()},
                 {"role": "user", "content": message.strip()}
             ])
@@ -175,6 +218,9 @@ def process_generation():
     except KeyboardInterrupt:
         print(f"\n{YELLOW}Скрипт приостановлен. Возвращаемся в меню...{RESET}")
         return  # Вернуться в меню
+    except CONNECTION_ERRORS as e:
+        print(f"\n{RED}Серверы Ollama недоступны: {e}. Возвращаемся в меню...{RESET}")
+        return
 
 # ====== ОСНОВНОЙ ЦИКЛ ======
 def main_loop():
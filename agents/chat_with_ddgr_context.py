@@ -3,7 +3,15 @@
 # ==================================================
 # Скрипт для взаимодействия с LLM-моделью с учетом
 # сохранения контекста диалога и использования ddgr.
-# Версия: 2.5
+# Версия: 3.5.2
+# - История передаётся в /api/chat сообщениями, модель удерживается keep_alive.
+# - Результаты поиска кэшируются на диске (agents/search_cache.py).
+# - Поиск через общий бэкенд agents/search_backends.py вместо подпроцесса ddgr.
+# - Повторы поиска по политике agents/retry_policy.py.
+# - Результаты поиска передаются модели компактным нумерованным списком.
+# - История и результаты поиска хранятся в общей базе агентов
+#   (agents/conversation_store.py) без ограничения длины.
+# - Пользователь видит, что поиск не удался или ничего не нашёл.
 # ==================================================
 
 import os
@@ -21,12 +29,21 @@ import re
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
-from settings import BASE_DIR, LLM_API_GENERATE
+from settings import BASE_DIR, LLM_STREAM_OUTPUT
+from agents.llm_client import chat_text, get_llm_client
+from agents.search_cache import cached_search
+from agents.search_backends import get_search_backend
+from agents.retry_policy import RetryPolicy
+from agents.prompt_format import serialize_results
+from agents.conversation_store import get_conversation
+from cognitive_logic import print_message_stream, finish_message_stream
 
 # === Настройки ===
 MODEL = "qwen2:7b"  # Имя модели для обработки
+HISTORY_AGENT = "chat_with_ddgr_context"
+# Файл истории прежних версий; переносится в хранилище диалогов при первом запуске
 HISTORY_FILE = BASE_DIR / "data" / "context_history.txt"
-MAX_HISTORY_LENGTH = 50  # Максимальное количество сообщений в истории
+MAX_HISTORY_LENGTH = 50  # Максимальное количество сообщений в контексте модели
 
 # Цвета для чата
 class Colors:
@@ -60,49 +77,93 @@ logger.addHandler(console_handler)
 logger.addHandler(file_handler)
 logger.propagate = False
 
-# === Глобальная переменная для хранения истории ===
+# === Глобальные переменные: контекст модели и сеанс в хранилище диалогов ===
 dialog_history = []
+conversation = None
+
+# Префиксы строк в истории старого текстового формата
+LEGACY_ROLE_PREFIXES = {
+    "Вы: ": "user",
+    "Ассистент: ": "assistant",
+    "Инструкция: ": "system",
+    "Результаты поиска: ": "system",
+}
 
 # === Функции ===
 def save_dialog_history():
-    """Сохраняет историю диалога в текстовый файл."""
+    """Сообщения сохраняются в хранилище сразу; завершает сеанс агента."""
     try:
-        HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(HISTORY_FILE, "w") as file:
-            file.write("\n".join(dialog_history))
-        logger.info(f"История диалога сохранена в {HISTORY_FILE}")
+        if conversation is not None:
+            conversation.end()
     except Exception as e:
         logger.error(f"Ошибка сохранения истории диалога: {e}")
 
+def add_to_history(*entries):
+    """Добавляет сообщения в контекст модели и сохраняет их в хранилище диалогов."""
+    dialog_history.extend(entries)
+    try:
+        conversation.add(*entries)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения истории диалога: {e}")
+
+def save_search_results(search_query, search_results):
+    """Сохраняет результаты поиска в хранилище диалогов; ошибка хранилища не прерывает чат."""
+    try:
+        conversation.add_search_results(search_query, search_results)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения результатов поиска: {e}")
+
+def convert_legacy_history(lines):
+    """Преобразует историю старого формата (строки "Вы: ...") в сообщения для /api/chat."""
+    messages = []
+    for line in lines:
+        for prefix, role in LEGACY_ROLE_PREFIXES.items():
+            if line.startswith(prefix):
+                content = line if role == "system" else line[len(prefix):]
+                messages.append({"role": role, "content": content})
+                break
+        else:
+            # Продолжение многострочного сообщения
+            if messages:
+                messages[-1]["content"] += "\n" + line
+    return messages
+
+def read_history_file(path):
+    """Читает файл истории прежних версий: JSON или старый текстовый формат."""
+    content = path.read_text(encoding="utf-8")
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        logger.info("История старого формата преобразована в сообщения.")
+        return convert_legacy_history(content.splitlines())
+
 def load_dialog_history():
-    """Загружает историю диалога из текстового файла."""
-    global dialog_history
-    if HISTORY_FILE.exists() and HISTORY_FILE.stat().st_size > 0:
-        try:
-            with open(HISTORY_FILE, "r") as file:
-                dialog_history = file.read().splitlines()
-            logger.info(f"История диалога загружена из {HISTORY_FILE}")
-        except Exception as e:
-            logger.error(f"Ошибка загрузки истории диалога: {e}")
-            dialog_history = []
-    else:
+    """Загружает последние сообщения истории диалога из хранилища (agents/conversation_store.py)."""
+    global dialog_history, conversation
+    try:
+        conversation = get_conversation(HISTORY_AGENT)
+        conversation.import_files(HISTORY_FILE, reader=read_history_file)
+        dialog_history = conversation.recent(MAX_HISTORY_LENGTH)
+        logger.info(f"История диалога загружена, сообщений: {len(dialog_history)}")
+    except Exception as e:
+        logger.error(f"Ошибка загрузки истории диалога: {e}")
         dialog_history = []
 
 def query_ddgr(search_query):
-    """Выполняет поиск с помощью ddgr и возвращает результаты в формате JSON."""
-    command = ["ddgr", "--json", search_query]
-    try:
-        result = subprocess.check_output(command, universal_newlines=True)
-        return json.loads(result)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Ошибка при выполнении ddgr: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        logger.error(f"Ошибка при разборе JSON от ddgr: {e}")
-        return None
+    """
+    Выполняет поиск бэкендом settings.SEARCH_BACKEND (или берёт недавний результат из кэша).
+    Возвращает список результатов, [] — если ничего не найдено, None — если поиск не удался.
+    """
+    backend = get_search_backend()
+    policy = RetryPolicy()
+    return cached_search(lambda query: policy.call(backend.search, query, use_tor=False),
+                         search_query, use_tor=False)
 
-def query_llm_with_context(user_input, search_results=None):
-    """Отправляет запрос в LLM с учетом истории диалога и результатов поиска."""
+def query_llm_with_context(user_input, search_results=None, on_token=None):
+    """
+    Отправляет запрос в LLM с учетом истории диалога и результатов поиска.
+    Если передан on_token, ответ запрашивается в потоковом режиме.
+    """
     global dialog_history
 
     # Если есть результаты поиска, добавляем их в конец истории
@@ -113,35 +174,28 @@ def query_llm_with_context(user_input, search_results=None):
             "дополнить ее тем, что тебе известно из собственной базы знаний."
             "В самом конце подкрепи свою сводку списком ссылок на источники полученной информации"
         )
-        dialog_history.append(f"Инструкция: {search_instruction}")
-        dialog_history.append(f"Результаты поиска: {json.dumps(search_results, ensure_ascii=False)}")
+        add_to_history(
+            {"role": "system", "content": f"Инструкция: {search_instruction}"},
+            {"role": "system", "content": f"Результаты поиска:\n{serialize_results(search_results)}"},
+        )
 
     # Добавляем сообщение пользователя в историю
-    dialog_history.append(f"Вы: {user_input}")
+    add_to_history({"role": "user", "content": user_input})
     if len(dialog_history) > MAX_HISTORY_LENGTH * 2:
-        dialog_history = dialog_history[-MAX_HISTORY_LENGTH * 2:]
+        # Обрезаем контекст (в хранилище история сохраняется целиком) с запасом
+        # до MAX_HISTORY_LENGTH: начало истории меняется редко, и Ollama между
+        # обрезками переиспользует KV-кэш её общего префикса.
+        dialog_history = dialog_history[-MAX_HISTORY_LENGTH:]
 
-    payload = {
-        "model": MODEL,
-        "prompt": "\n".join(dialog_history),
-        "stream": False
-    }
-
-    try:
-        response = requests.post(LLM_API_GENERATE, json=payload)
-        response.raise_for_status()
-
-        # Получаем ответ от модели
-        model_response = response.json().get("response", "<Нет ответа>")
-        dialog_history.append(f"Ассистент: {model_response}")
+    # История уходит в /api/chat сообщениями; модель удерживается в памяти (keep_alive),
+    # так что на каждом ходу вычисляется только новая часть диалога.
+    model_response = chat_text(dialog_history, MODEL, stream=on_token is not None, on_token=on_token)
+    if model_response is None:
+        return None
 
-        # Сохраняем историю
-        save_dialog_history()
+    add_to_history({"role": "assistant", "content": model_response})
 
-        return model_response
-    except requests.RequestException as e:
-        logger.error(f"Ошибка запроса к модели: {e}")
-        return None
+    return model_response
 
 def is_search_query(user_input):
     """Проверяет, является ли ввод пользователя поисковым запросом."""
@@ -181,9 +235,11 @@ if __name__ == "__main__":
             user_input = get_multiline_input()
             
             if user_input.lower() in ['/q', 'выход']:
+                save_dialog_history()
                 print(f"{Colors.GREEN}Чат завершен. История сохранена.{Colors.RESET}")
                 break
             
+            search_query = None
             search_results = None
             if user_input.startswith('/s '):
                 search_query = user_input[3:].strip('"')
@@ -194,17 +250,26 @@ if __name__ == "__main__":
             
             if search_results:
                 print(f"{Colors.GREEN}Результаты поиска получены.{Colors.RESET}")
+                save_search_results(search_query, search_results)
                 user_input = f"Анализ результатов поиска по запросу: {search_query}"
-            elif search_results is not None:
+            elif search_query is not None and search_results is None:
                 print(f"{Colors.RED}Не удалось получить результаты поиска.{Colors.RESET}")
+            elif search_query is not None:
+                print(f"{Colors.YELLOW}Поиск не дал результатов.{Colors.RESET}")
 
             print_message("Вы", user_input)
 
-            response = query_llm_with_context(user_input, search_results)
-            if response:
-                print_message("Ассистент", response)
+            if LLM_STREAM_OUTPUT:
+                response = query_llm_with_context(user_input, search_results, on_token=print_message_stream("Ассистент"))
+                finish_message_stream(get_llm_client().last_stats)
+                if not response:
+                    print_message("Ассистент", "Ошибка: ответ от модели отсутствует.")
             else:
-                print_message("Ассистент", "Ошибка: ответ от модели отсутствует.")
+                response = query_llm_with_context(user_input, search_results)
+                if response:
+                    print_message("Ассистент", response)
+                else:
+                    print_message("Ассистент", "Ошибка: ответ от модели отсутствует.")
     except KeyboardInterrupt:
         print(f"\n{Colors.RED}Чат прерван пользователем. История сохранена.{Colors.RESET}")
         save_dialog_history()
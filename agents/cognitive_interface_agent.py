@@ -2,19 +2,20 @@
 # LLMCAN/agents/cognitive_interface_agent.py
 # ==================================================
 # Когнитивный интерфейсный агент для проекта LLMCAN
-# Версия: 2.7
+# Версия: 2.11
 # ==================================================
 
 import sys
 from pathlib import Path
 import readline
+import shutil
 import subprocess
 
 # Добавляем корневую директорию проекта в sys.path
 project_root = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(project_root))
 
-from settings import BASE_DIR, LLM_API_GENERATE
+from settings import BASE_DIR, LLM_API_GENERATE, LLM_STREAM_OUTPUT
 from cognitive_interface_agent_functions import *
 from agents.install_tor import restart_tor_and_check_ddgr
 
@@ -39,12 +40,10 @@ def show_help():
     print(f"{Colors.CYAN}Для ввода запроса нажмите Enter дважды.{Colors.RESET}")
 
 def check_tor_installation():
-    try:
-        subprocess.run(["torsocks", "--version"], check=True, capture_output=True)
+    if shutil.which("torsocks"):
         return True
-    except FileNotFoundError:
-        print(f"{Colors.RED}torsocks не найден. Установите его для использования TOR.{Colors.RESET}")
-        return False
+    print(f"{Colors.RED}torsocks не найден. Установите его для использования TOR.{Colors.RESET}")
+    return False
 
 def print_header():
     print(f"{Colors.CYAN}{Colors.BOLD}")
@@ -66,7 +65,7 @@ def main():
         tor_active = check_tor_connection()
         if tor_active:
             print(f"{Colors.BLUE}✓ TOR сервис активен в системе.{Colors.RESET}")
-        else:
+        elif tor_active is not None:
             print(f"{Colors.YELLOW}⚠ TOR сервис неактивен в системе.{Colors.RESET}")
         print(f"{Colors.YELLOW}ℹ Режим опроса через TOR по умолчанию выключен. Включить: /tn{Colors.RESET}")
         USE_TOR = False
@@ -100,17 +99,21 @@ def main():
             search_results = perform_search(preprocessed['queries'])
             
             if search_results:
+                save_search_results(user_input, search_results)
                 user_language = detect_language(user_input)
                 response = process_search_results(search_results, preprocessed['instruction'], user_language)
                 if response:
                     references = [result['url'] for result in search_results[0] if 'url' in result]
                     formatted_response = format_response_with_references(response, references)
                     print(f"{Colors.GREEN}Ответ готов:{Colors.RESET}")
-                    print_message("Агент", formatted_response)
+                    if LLM_STREAM_OUTPUT:
+                        # Текст ответа уже выведен потоком, дописываем только источники
+                        print_message("Источники", "\n".join(f"{i}. {ref}" for i, ref in enumerate(references, 1)))
+                    else:
+                        print_message("Агент", formatted_response)
                     
-                    dialog_history.append({"role": "user", "content": user_input})
-                    dialog_history.append({"role": "assistant", "content": formatted_response})
-                    save_dialog_history()
+                    append_dialog_history({"role": "user", "content": user_input},
+                                          {"role": "assistant", "content": formatted_response})
                     save_report(preprocessed, formatted_response)
                 else:
                     print_message("Агент", "Не удалось обработать результаты поиска. Пожалуйста, попробуйте еще раз.")
@@ -18,12 +18,25 @@ import socket
 import socks
 import readline
 
-from settings import BASE_DIR, LLM_API_GENERATE
-from agents.install_tor import restart_tor_and_check_ddgr
+from settings import BASE_DIR, HEALTH_FIRST_WAIT, LLM_STREAM_OUTPUT
+from agents.install_tor import set_tor_probing, tor_rate_limit_handler
+from agents.llm_client import generate_text, generate_stage, get_llm_client
+from agents.context_packer import pack_context
+from agents.search_runner import run_queries
+from agents.search_cache import cached_search
+from agents.search_backends import SearchError, get_search_backend
+from agents.retry_policy import RetryPolicy
+from agents.result_fusion import fuse_results
+from agents.prompt_format import serialize_results, format_results
+from agents.health_monitor import get_health_monitor
+from agents.conversation_store import get_conversation
+from cognitive_logic import print_message_stream, finish_message_stream
 
 # === Настройки ===
 MODEL = "qwen2:7b"
-HISTORY_FILE = BASE_DIR / "data" / "cognitive_agent_history.txt"
+HISTORY_AGENT = "cognitive_interface_agent"
+# Файл истории прежних версий (JSON); переносится в хранилище диалогов при первом запуске
+LEGACY_HISTORY_FILE = BASE_DIR / "data" / "cognitive_agent_history.txt"
 TEMP_DIR = BASE_DIR / "temp"
 REPORT_FILE = BASE_DIR / "data" / "cognitive_agent_reports.txt"
 MAX_HISTORY_LENGTH = 50
@@ -57,23 +70,37 @@ class Colors:
     RESET = "\033[0m"
 
 # === Глобальные переменные ===
-dialog_history = []
+conversation = None
 USE_TOR = False
 original_socket = None
 
 # === Функции ===
+def tor_service_state():
+    """
+    Состояние сервиса TOR по фоновой проверке (agents/health_monitor.py).
+    При старте агента первая проверка ждётся не дольше HEALTH_FIRST_WAIT
+    секунд; если она ещё идёт, опрашивается только systemd — выходной IP и
+    порты проверяет фоновый поток, второй такой проход не запускается.
+    """
+    monitor = get_health_monitor()
+    snapshot = monitor.wait_snapshot(HEALTH_FIRST_WAIT)
+    if snapshot:
+        return snapshot["tor"]["service"]
+    return monitor.check_tor_service()
+
 def check_tor_connection():
-    try:
-        result = subprocess.run(["systemctl", "is-active", "tor"], capture_output=True, text=True, timeout=10)
-        if result.stdout.strip() == "active":
-            print(f"{Colors.BLUE}TOR сервис активен в системе.{Colors.RESET}")
-            return True
-        else:
-            print(f"{Colors.YELLOW}TOR сервис неактивен в системе.{Colors.RESET}")
-            return False
-    except subprocess.CalledProcessError as e:
-        print(f"{Colors.RED}Ошибка при проверке статуса TOR: {e}{Colors.RESET}")
-        return False
+    """
+    Состояние сервиса TOR: True/False или None, если его определить не удалось.
+    """
+    service = tor_service_state()
+    if service is None:
+        print(f"{Colors.YELLOW}Не удалось определить состояние сервиса TOR.{Colors.RESET}")
+        return None
+    if service == "active":
+        print(f"{Colors.BLUE}TOR сервис активен в системе.{Colors.RESET}")
+        return True
+    print(f"{Colors.YELLOW}TOR сервис неактивен в системе.{Colors.RESET}")
+    return False
 
 def handle_command(command):
     global USE_TOR
@@ -82,79 +109,96 @@ def handle_command(command):
         print(f"Режим опроса через TOR: {tor_status}")
     elif command in ['/toron', '/tn']:
         USE_TOR = True
+        set_tor_probing(True)
         print(f"{Colors.GREEN}Режим опроса через TOR включен.{Colors.RESET}")
     elif command in ['/toroff', '/tf']:
         USE_TOR = False
+        set_tor_probing(False)
         print(f"{Colors.YELLOW}Режим опроса через TOR выключен.{Colors.RESET}")
     else:
         print(f"{Colors.RED}Неизвестная команда: {command}{Colors.RESET}")
 
 def save_dialog_history():
-    global dialog_history
+    """
+    Сообщения сохраняются в хранилище сразу; здесь завершается сеанс агента.
+    """
     try:
-        if len(dialog_history) > MAX_HISTORY_LENGTH:
-            dialog_history = dialog_history[-MAX_HISTORY_LENGTH:]
-        HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(HISTORY_FILE, "w", encoding='utf-8') as file:
-            json.dump(dialog_history, file, ensure_ascii=False, indent=2)
-        logger.info(f"История диалога сохранена в {HISTORY_FILE}")
+        if conversation is not None:
+            conversation.end()
     except Exception as e:
         logger.error(f"Ошибка сохранения истории диалога: {e}")
 
 
 def load_dialog_history():
-    global dialog_history
-    if HISTORY_FILE.exists() and HISTORY_FILE.stat().st_size > 0:
-        try:
-            with open(HISTORY_FILE, "r", encoding='utf-8') as file:
-                dialog_history = json.load(file)
-            logger.info(f"История диалога загружена из {HISTORY_FILE}")
-        except Exception as e:
-            logger.error(f"Ошибка загрузки истории диалога: {e}")
-            dialog_history = []
-    else:
-        dialog_history = []
+    """
+    Сеанс агента в хранилище диалогов (agents/conversation_store.py);
+    при первом вызове туда переносится файл истории прежних версий.
+    """
+    global conversation
+    if conversation is None:
+        conversation = get_conversation(HISTORY_AGENT)
+        conversation.import_files(LEGACY_HISTORY_FILE)
+    return conversation
+
+
+def append_dialog_history(*entries):
+    """
+    Сохраняет сообщения в истории диалога; возвращает id последнего.
+    """
+    try:
+        return load_dialog_history().add(*entries)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения истории диалога: {e}")
+        return None
+
+
+def save_search_results(query, results, message_id=None):
+    try:
+        load_dialog_history().add_search_results(query, results, message_id)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения результатов поиска: {e}")
 
 def query_ddgr(search_query):
+    """
+    Поиск бэкендом settings.SEARCH_BACKEND (по умолчанию без запуска ddgr).
+    Возвращает список результатов ([] при пустой выдаче) или выбрасывает SearchError.
+    """
     global USE_TOR
     cleaned_query = clean_query(search_query)
-    command = ["torsocks", "ddgr", "--json", cleaned_query] if USE_TOR else ["ddgr", "--json", cleaned_query]
-    
+    backend = get_search_backend()
+
     print(f"{Colors.YELLOW}Отладка: Использование TOR: {'Да' if USE_TOR else 'Нет'}{Colors.RESET}")
-    print(f"{Colors.YELLOW}Отладка: Выполняемая команда: {' '.join(command)}{Colors.RESET}")
-    
+    print(f"{Colors.YELLOW}Отладка: Поиск ({backend.name}): {cleaned_query}{Colors.RESET}")
+
     try:
-        result = subprocess.check_output(command, universal_newlines=True)
-        if "[ERROR]" in result:
-            print(f"{Colors.RED}Отладка: Получена ошибка: {result}{Colors.RESET}")
-            return None
-        print(f"{Colors.GREEN}Отладка: Запрос успешно выполнен{Colors.RESET}")
-        return json.loads(result)
-    except subprocess.CalledProcessError as e:
-        print(f"{Colors.RED}Отладка: Ошибка выполнения команды: {e}{Colors.RESET}")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"{Colors.RED}Отладка: Ошибка разбора JSON: {e}{Colors.RESET}")
-        return None
+        result = backend.search(cleaned_query, use_tor=USE_TOR)
+    except SearchError as e:
+        print(f"{Colors.RED}Отладка: Ошибка поиска по запросу '{cleaned_query}': {e}{Colors.RESET}")
+        raise
+    print(f"{Colors.GREEN}Отладка: Запрос успешно выполнен{Colors.RESET}")
+    return result
+
+def search_query(query):
+    """
+    Поиск по одному запросу с повторами по политике agents/retry_policy.py.
+    Цепочка TOR меняется только при ограничении частоты запросов.
+    Возвращает результаты или None.
+    """
+    policy = RetryPolicy(on_rate_limit=tor_rate_limit_handler(USE_TOR))
+    return policy.call(query_ddgr, query) or None
 
 def perform_search(queries):
+    """
+    Выполняет запросы одновременно; результаты выводятся и возвращаются в порядке запросов.
+    """
     results = []
-    for i, query in enumerate(queries, 1):
-        for attempt in range(3):
-            if USE_TOR:
-                print("Отладка: Проверка и перезапуск TOR перед запросом ddgr...")
-                restart_tor_and_check_ddgr()
-            result = query_ddgr(query)
-            if result:
-                results.append(result)
-                print(f"Ответ на запрос {i} получен. Обрабатываю...")
-                print_intermediate_result(result)
-                break
-            else:
-                print(f"Попытка {attempt+1} не удалась. {'Повторяю запрос...' if attempt < 2 else 'Переход к следующему запросу.'}")
-                time.sleep(2)
-        if not result:
-            print(f"Не удалось получить результаты для запроса {i} после 3 попыток")
+    for i, result in enumerate(run_queries(queries, lambda query: cached_search(search_query, query, USE_TOR)), 1):
+        if result:
+            results.append(result)
+            print(f"Ответ на запрос {i} получен. Обрабатываю...")
+            print_intermediate_result(result)
+        else:
+            print(f"Не удалось получить результаты для запроса {i}")
     return results
 
 def print_intermediate_result(result):
@@ -174,11 +218,7 @@ def get_local_ip():
         return "Не удалось получить локальный IP"
 
 def check_tor_status():
-    try:
-        result = subprocess.run(["systemctl", "is-active", "tor"], capture_output=True, text=True)
-        return result.stdout.strip() == "active"
-    except subprocess.CalledProcessError:
-        return False
+    return tor_service_state() == "active"
 
 def check_tor_settings():
     try:
@@ -207,30 +247,26 @@ def generate_system_instruction(context):
 def get_current_datetime():
     return datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z')
 
-def query_llm(prompt, include_history=True):
-    global dialog_history
-    
+def query_llm(prompt, include_history=True, stream=False, on_token=None, stage=None, history=None):
+    """
+    Запрос к LLM. Если указан этап конвейера (stage), модель и бюджет времени
+    берутся из settings.LLM_STAGES, иначе используется MODEL.
+    history — уже отобранные под окно контекста записи истории
+    (по умолчанию последние записи истории диалога).
+    """
     current_datetime = get_current_datetime()
     
     if include_history:
-        context = "\n".join([f"{entry['role']}: {entry['content']}" for entry in dialog_history[-5:]])
-        full_prompt = f"Текущая дата и время: {current_datetime}\n\n{context}\n\nСистемная инструкция: {generate_system_instruction(dialog_history)}\n\nТекущий запрос: {prompt}"
+        if history is None:
+            history = load_dialog_history().recent(5)
+        context = "\n".join([f"{entry['role']}: {entry['content']}" for entry in history])
+        full_prompt = f"Текущая дата и время: {current_datetime}\n\n{context}\n\nСистемная инструкция: {generate_system_instruction(history)}\n\nТекущий запрос: {prompt}"
     else:
         full_prompt = f"Текущая дата и время: {current_datetime}\n\n{prompt}"
 
-    payload = {
-        "model": MODEL,
-        "prompt": full_prompt,
-        "stream": False
-    }
-
-    try:
-        response = requests.post(LLM_API_GENERATE, json=payload)
-        response.raise_for_status()
-        return response.json().get("response", "<Нет ответа>")
-    except requests.RequestException as e:
-        logger.error(f"Ошибка запроса к модели: {e}")
-        return None
+    if stage:
+        return generate_stage(stage, full_prompt, stream=stream, on_token=on_token)
+    return generate_text(full_prompt, MODEL, stream=stream, on_token=on_token)
 
 def preprocess_query(user_input):
     print(f"{Colors.YELLOW}Запрос пользователя получен. Начинаю анализ и формирование поисковых запросов...{Colors.RESET}")
@@ -247,7 +283,7 @@ def preprocess_query(user_input):
 [Детальная инструкция по обработке и форматированию результатов поиска]"""
 
     context = f"Запрос пользователя: {user_input}\n\n{system_prompt}"
-    response = query_llm(context, include_history=False)
+    response = query_llm(context, include_history=False, stage="rewrite")
     if response is None:
         print(f"{Colors.RED}Не удалось получить ответ от LLM. Использую исходный запрос пользователя.{Colors.RESET}")
         return {"queries": [user_input], "instruction": "Обработайте результаты поиска и предоставьте краткий ответ."}
@@ -327,17 +363,34 @@ def process_intermediate_result(result, query_number):
 
 def process_search_results(results, instruction, user_language):
     print(f"{Colors.YELLOW}Начинаю обобщение и конечный анализ данных...{Colors.RESET}")
-    context = f"""Инструкция: {instruction}
+    template = """Инструкция: {instruction}
 
 Результаты поиска:
-{json.dumps(results, ensure_ascii=False, indent=2)}
+{results}
 
 Обработай результаты согласно инструкции и сформируй ответ в формате Markdown на языке пользователя: {user_language}."""
 
-    response = query_llm(context, include_history=True)
+    # Результаты и история урезаются так, чтобы промпт вместе с системной
+    # инструкцией query_llm уместился в num_ctx и осталось место под ответ
+    history = load_dialog_history().recent(5)
+    fixed_text = template.format(instruction=instruction, results="", user_language=user_language) \
+        + generate_system_instruction(history) + get_current_datetime()
+    # Списки по отдельным запросам объединяются без дубликатов URL
+    packed_results, packed_history, _ = pack_context(fixed_text, fuse_results(results), history)
+    context = template.format(instruction=instruction,
+                              results=serialize_results(packed_results),
+                              user_language=user_language)
+
+    if LLM_STREAM_OUTPUT:
+        # Ответ выводится по мере генерации, не дожидаясь конца
+        response = query_llm(context, include_history=True, stream=True, on_token=print_message_stream("Агент"),
+                             stage="synthesis", history=packed_history)
+        finish_message_stream(get_llm_client().last_stats)
+    else:
+        response = query_llm(context, include_history=True, stage="synthesis", history=packed_history)
     if response is None:
         print(f"{Colors.RED}Не удалось получить ответ от LLM. Возвращаю необработанные результаты поиска.{Colors.RESET}")
-        return json.dumps(results, ensure_ascii=False, indent=2)
+        return format_results(fuse_results(results))
     print(f"{Colors.GREEN}Анализ завершен. Формирую ответ...{Colors.RESET}")
     return response
 
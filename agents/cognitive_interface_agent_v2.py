@@ -1,15 +1,11 @@
 #!/usr/bin/env python3
 # LLMCAN/agents/cognitive_interface_agent_v2.py
-# Версия: 3.1.0
+# Версия: 3.17.5
 
 import sys
 from pathlib import Path
 import readline
-import subprocess
-import os
-import json
-import time
-import re
+import shutil
 import logging
 
 # Настройка логирования
@@ -19,26 +15,42 @@ logger = logging.getLogger(__name__)
 project_root = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(project_root))
 
-from settings import BASE_DIR, LLM_API_GENERATE
-from agents.install_tor import restart_tor_and_check_ddgr
-from agents.data_management import append_to_dialog_history, save_dialog_history, load_dialog_history, detect_language
+from settings import LLM_PIN_STAGE_MODELS, LLM_STAGES, LLM_STREAM_OUTPUT, PAGE_FETCH_ENABLED
+from agents.install_tor import set_tor_probing, tor_rate_limit_handler
+from agents.data_management import (
+    append_to_dialog_history,
+    finalize_history_saving,
+    load_dialog_history,
+    save_search_results,
+    detect_language,
+)
 from agents.colors import Colors
 from cognitive_logic import print_message, process_search_results
-from preprocess_query import preprocess_query, handle_command, show_help, set_log_level
+from preprocess_query import preprocess_query, handle_command
+from agents.llm_client import warmup_model_async, release_model
+from agents.search_runner import run_queries, start_speculative
+from agents.search_cache import cached_search, normalize_query
+from agents.result_fusion import fuse_results
+from agents.search_backends import get_search_backend
+from agents.retry_policy import RetryPolicy
+from agents.page_fetcher import fetch_passages
+from agents.passage_ranker import select_passages
+from agents.reranker import rerank_results
+from agents.prompt_format import format_results
+from agents.health_monitor import get_health_monitor
 
 # Глобальная переменная для режима TOR
 USE_TOR = True
 MAX_RETRIES = 3
 
 def check_tor_installation():
-    try:
-        subprocess.run(["torsocks", "--version"], check=True, capture_output=True)
+    # Поиск в PATH вместо запуска torsocks: проверка не задерживает старт
+    if shutil.which("torsocks"):
         logger.info("TORSocks установлен и готов к использованию.")
         return True
-    except FileNotFoundError:
-        logger.warning("TORSocks не найден. TOR недоступен.")
-        print(f"{Colors.RED}torsocks не найден. Установите его для использования TOR.{Colors.RESET}")
-        return False
+    logger.warning("TORSocks не найден. TOR недоступен.")
+    print(f"{Colors.RED}torsocks не найден. Установите его для использования TOR.{Colors.RESET}")
+    return False
 
 def print_header():
     logger.info("Вывод заголовка интерфейса.")
@@ -63,55 +75,78 @@ def get_multiline_input():
         if line.startswith(("/", ".")):
             logger.debug(f"Обработка команды пользователя: {line}")
             USE_TOR = handle_command(line, USE_TOR)
+            set_tor_probing(USE_TOR)
             continue
         if line == "":
             break
         lines.append(line)
     return " ".join(lines)
 
-def perform_search(queries, use_tor, max_retries=3):
+def search_query(query, use_tor, max_retries=MAX_RETRIES):
+    """
+    Выполняет поиск по одному запросу бэкендом settings.SEARCH_BACKEND
+    с повторами по политике agents/retry_policy.py. В режиме TOR цепочка
+    меняется только при ограничении частоты запросов.
+    Возвращает список результатов или None.
+    """
+    logger.info(f"Начинаю обработку запроса: {query}")
+    policy = RetryPolicy(max_attempts=max_retries, on_rate_limit=tor_rate_limit_handler(use_tor))
+    results = policy.call(get_search_backend().search, query, use_tor=use_tor)
+    if results:
+        logger.info(f"Успешно выполнен поиск по запросу: {query}")
+    return results or None
+
+
+def cached_search_query(query, use_tor, max_retries=MAX_RETRIES):
     """
-    Выполняет поиск для каждого запроса. Добавляет повторные попытки при ошибке.
+    Поиск по одному запросу с дисковым кэшем (agents/search_cache.py).
+    """
+    return cached_search(lambda q: search_query(q, use_tor, max_retries), query, use_tor)
+
+
+def perform_search(queries, use_tor, max_retries=MAX_RETRIES, speculative=None):
+    """
+    Выполняет поиск по всем запросам одновременно (agents/search_runner.py);
+    недавние результаты берутся из дискового кэша (agents/search_cache.py).
+    Списки результатов объединяются методом RRF без дубликатов URL
+    (agents/result_fusion.py); возвращается не более SEARCH_TOP_K результатов.
+
+    speculative — пара (запрос, Future) поиска, запущенного до переформулировки.
+    Если запрос вошёл в итоговый список, его результат используется вместо
+    повторного поиска. Иначе готовый результат добавляется к объединению,
+    а незавершённый поиск отменяется.
     """
-    results = []
     if not queries:
         logger.warning("Список запросов пуст. Поиск не будет выполнен.")
-        return results
+        return []
 
+    # Совпадающие после нормализации запросы дали бы одинаковые списки
+    # и удвоили бы их вес при объединении
+    unique_queries = []
     for query in queries:
-        logger.info(f"Начинаю обработку запроса: {query}")
-        retries = 0
-        while retries < max_retries:
-            try:
-                command = ["torsocks", "ddgr", "--json", query] if use_tor else ["ddgr", "--json", query]
-                logger.debug(f"Выполняется команда поиска: {' '.join(command)} (попытка {retries + 1})")
-                output = subprocess.check_output(command, universal_newlines=True, stderr=subprocess.STDOUT)
-                logger.debug(f"Вывод команды ddgr: {output}")
-                if output.strip():
-                    json_results = json.loads(output)
-                    if isinstance(json_results, list) and json_results:
-                        results.extend(json_results)
-                        logger.info(f"Успешно выполнен поиск по запросу: {query}")
-                        break
-                    else:
-                        logger.warning(f"Некорректный формат или пустой результат для запроса: {query}")
-                else:
-                    logger.warning(f"Пустой результат для запроса: {query}")
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Ошибка выполнения команды: {e}. Попытка {retries + 1}/{max_retries}")
-                retries += 1
-            except json.JSONDecodeError as e:
-                logger.error(f"Ошибка декодирования JSON: {e}. Попытка {retries + 1}/{max_retries}")
-                retries += 1
-            except Exception as e:
-                logger.error(f"Неизвестная ошибка: {e}. Попытка {retries + 1}/{max_retries}")
-                retries += 1
-            time.sleep(2)  # Задержка перед повторной попыткой
+        if normalize_query(query) not in map(normalize_query, unique_queries):
+            unique_queries.append(query)
+
+    prefetched = {}
+    extra_lists = []
+    if speculative:
+        spec_query, spec_future = speculative
+        spec_key = normalize_query(spec_query)
+        if spec_key in map(normalize_query, unique_queries):
+            logger.info(f"Используется упреждающий поиск: {spec_query}")
+            prefetched[spec_key] = spec_future
+        elif spec_future.done() and not spec_future.exception() and spec_future.result():
+            logger.info(f"Упреждающий поиск добавлен к результатам: {spec_query}")
+            extra_lists.append(spec_future.result())
         else:
-            logger.error(f"Не удалось найти информацию по запросу: {query} после {max_retries} попыток.")
-            results.append(None)
+            spec_future.cancel()
+            logger.info(f"Упреждающий поиск не понадобился: {spec_query}")
 
-    if not any(results):
+    result_lists = run_queries(unique_queries, lambda q: cached_search_query(q, use_tor, max_retries),
+                               prefetched=prefetched)
+    results = fuse_results(result_lists + extra_lists)
+
+    if not results:
         logger.warning("Все поисковые запросы вернули пустые результаты.")
     else:
         logger.debug(f"Итоговые результаты поиска: {results}")
@@ -120,12 +155,22 @@ def perform_search(queries, use_tor, max_retries=3):
 
 def main():
     global USE_TOR
-    dialog_history = load_dialog_history()
+    # Основная модель итогового ответа (или, при LLM_PIN_STAGE_MODELS, модели всех
+    # этапов) загружается в фоне, пока идут проверка TOR и вывод заголовка, и остаётся
+    # закреплённой в памяти до конца сеанса (LLM_KEEP_ALIVE).
+    pinned_stages = LLM_STAGES.keys() if LLM_PIN_STAGE_MODELS else ["synthesis"]
+    stage_models = {LLM_STAGES[stage][0][0] for stage in pinned_stages}
+    for model in stage_models:
+        warmup_model_async(model)
+    # Состояние TOR и серверов Ollama проверяется в фоне для команд /show и /tor
+    get_health_monitor()
+    load_dialog_history()
     logger.info("Запуск основного цикла программы.")
     print_header()
     tor_installed = check_tor_installation()
     if not tor_installed:
         USE_TOR = False
+        set_tor_probing(False)
         logger.warning("TOR не установлен. Все запросы будут выполняться без TOR.")
     else:
         logger.info("TOR установлен. Использование TOR включено по умолчанию.")
@@ -141,28 +186,38 @@ def main():
 
             logger.info(f"Получен пользовательский запрос: {user_input}")
             print(f"{Colors.BLUE}Обрабатываю запрос пользователя...{Colors.RESET}")
-            append_to_dialog_history({"role": "user", "content": user_input})
+            message_id = append_to_dialog_history({"role": "user", "content": user_input})
 
             try:
+                # Поиск по исходному вводу идёт, пока модель переформулирует запрос
+                use_tor = USE_TOR
+                spec_future = start_speculative(user_input, lambda q: cached_search_query(q, use_tor))
+                speculative = (user_input, spec_future) if spec_future else None
                 preprocessed = preprocess_query(user_input)
                 logger.debug(f"Предобработанный запрос: {preprocessed}")
 
                 logger.info("Попытка выполнения поиска.")
-                search_results = perform_search(preprocessed['queries'], use_tor=USE_TOR)
-                print("\n### Данные для передачи в модель ###")
-                print(f"Инструкция для обработки: {preprocessed['instruction']}")
-                print(f"Результаты поиска: {search_results}")
+                search_results = perform_search(preprocessed['queries'], use_tor=use_tor, speculative=speculative)
+                # Необязательное переранжирование по эмбеддингам (settings.RERANK_ENABLED)
+                search_results = rerank_results(search_results, [user_input] + preprocessed['queries'])
+                if any(search_results):
+                    save_search_results(user_input, search_results, message_id)
 
                 # Обязательный вывод перед отправкой в модель
                 print("\n### Данные для передачи в модель ###")
                 print(f"Инструкция для обработки: {preprocessed['instruction']}")
-                print(f"Результаты поиска: {search_results}\n")
+                print(f"Результаты поиска:\n{format_results(search_results)}\n")
 
                 if any(search_results):
                     logger.info("Информация найдена. Формируется ответ...")
                     user_language = detect_language(user_input)
                     
-                    response = process_search_results(preprocessed['instruction'], search_results, user_language)
+                    # Текст первых страниц загружается параллельно в пределах PAGE_FETCH_DEADLINE
+                    passages = fetch_passages(search_results, use_tor=use_tor) if PAGE_FETCH_ENABLED else []
+                    # В промпт идут только фрагменты, лучше всего отвечающие на запросы
+                    passages = select_passages(passages, preprocessed['queries'])
+                    response = process_search_results(preprocessed['instruction'], search_results, user_language,
+                                                      passages=passages)
 
                     references = [result.get('url', '') for result in search_results if isinstance(result, dict) and 'url' in result]
                     report = f"""
@@ -179,7 +234,11 @@ def main():
 """ + "\n".join([f"{i + 1}. {url}" for i, url in enumerate(references[:15])])
 
                     logger.info("Ответ успешно сформирован.")
-                    print_message("Агент", report)
+                    if LLM_STREAM_OUTPUT:
+                        # Ответ уже выведен по мере генерации, дописываем только источники
+                        print_message("Источники", "\n".join(f"{i + 1}. {url}" for i, url in enumerate(references[:15])))
+                    else:
+                        print_message("Агент", report)
                     append_to_dialog_history({"role": "assistant", "content": report})
                 else:
                     logger.warning("Поиск завершён без результата.")
@@ -190,7 +249,10 @@ def main():
     except KeyboardInterrupt:
         logger.info("Сеанс завершён пользователем.")
         print(f"{Colors.RED}\nСеанс прерван пользователем. История сохранена.{Colors.RESET}")
-        save_dialog_history(dialog_history)
+        finalize_history_saving()
+    finally:
+        for model in stage_models:
+            release_model(model)
 
 
 if __name__ == "__main__":
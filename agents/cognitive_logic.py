@@ -1,21 +1,24 @@
 #!/usr/bin/env python3
 # agents/cognitive_logic.py
-# Version: 1.2.1
+# Version: 1.7.1
 # Purpose: Define cognitive logic and LLM interaction for the agent.
 
-import json
 import logging
 from datetime import datetime
 from colors import Colors  # Импортируем Colors из внешнего файла
+from settings import LLM_STREAM_OUTPUT
+from agents.llm_client import generate_stage, get_llm_client
+from agents.context_packer import pack_context
+from agents.prompt_format import serialize_results
 
 logger = logging.getLogger(__name__)
 
 def generate_system_instruction():
     current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     instruction = f"""You are a cognitive agent. Current date and time: {current_datetime}.
-Your task is to provide a structured response based on a user query and an array of 20-30 links with descriptions. Follow these guidelines:
+Your task is to provide a structured response based on a user query and an array of links with descriptions and, when available, text passages from the top pages. Follow these guidelines:
 
-1. Analyze the user query and relevant sources from the provided links.
+1. Analyze the user query and relevant sources from the provided links and page passages. Prefer facts from the page passages over the short link descriptions.
 2. Generate a comprehensive, structured answer based on the information found.
 3. Format your response as follows:
 
@@ -55,10 +58,25 @@ def preprocess_query(user_input):
     logger.debug(f"Generated queries: {queries}, Instruction: {instruction}")
     return {"queries": queries, "instruction": instruction}
 
-def process_search_results(instruction, search_results, user_language="ru"):
+def format_passages(passages):
+    """
+    Оформляет фрагменты текста страниц для промпта: источник и текст фрагмента.
+    """
+    return "\n\n".join(
+        f"[{i}] {p.get('title') or p['url']} ({p['url']})\n{p['text']}" for i, p in enumerate(passages, 1)
+    )
+
+
+def process_search_results(instruction, search_results, user_language="ru", passages=None):
+    """
+    Формирует итоговый ответ по результатам поиска моделью этапа "synthesis".
+    passages — фрагменты текста загруженных страниц (agents/page_fetcher.py).
+    Если модели не уложились в бюджет времени, возвращает нумерованный список ссылок.
+    При потоковом режиме ответ выводится в консоль по мере генерации.
+    """
     print("\n### Начинается обработка результатов ###")
     print(f"Инструкция для обработки данных: {instruction}")
-    print(f"Сырые результаты поиска: {search_results}")
+    print(f"Результатов поиска: {len(search_results)}")
     print(f"Язык пользователя: {user_language}\n")
 
     try:
@@ -67,13 +85,48 @@ def process_search_results(instruction, search_results, user_language="ru"):
             for i, result in enumerate(search_results)
             if isinstance(result, dict)
         ]
-        print(f"Обработанные данные для формирования ответа: {processed_results}\n")
-        response = f"### Результаты поиска:\n" + "\n".join(processed_results)
-        return response
+        # Сами результаты уже выведены вызывающим кодом (format_results)
+        logger.debug(f"Результатов для формирования ответа: {len(processed_results)}")
+        fallback_response = f"### Результаты поиска:\n" + "\n".join(processed_results)
     except Exception as e:
         print(f"❌ Ошибка при обработке результатов: {e}")
         return "Ошибка при обработке данных."
 
+    template = """{system_instruction}
+
+Инструкция для обработки: {instruction}
+
+Результаты поиска:
+{results}
+{passages}
+Язык ответа: {user_language}"""
+    system_instruction = generate_system_instruction()
+    # Результаты и фрагменты страниц отбираются по порядку и урезаются под окно контекста модели
+    packed_results, _, packed_passages = pack_context(
+        template.format(system_instruction=system_instruction, instruction=instruction, results="",
+                        passages="\nФрагменты страниц:\n", user_language=user_language),
+        search_results,
+        passages=passages,
+    )
+    passages_section = f"\nФрагменты страниц:\n{format_passages(packed_passages)}\n" if packed_passages else ""
+    prompt = template.format(system_instruction=system_instruction, instruction=instruction,
+                             results=serialize_results(packed_results),
+                             passages=passages_section, user_language=user_language)
+
+    on_token = print_message_stream("Агент") if LLM_STREAM_OUTPUT else None
+    try:
+        response = generate_stage("synthesis", prompt, stream=LLM_STREAM_OUTPUT, on_token=on_token)
+    finally:
+        if LLM_STREAM_OUTPUT:
+            finish_message_stream(get_llm_client().last_stats)
+
+    if response is None:
+        logger.warning("Модель не сформировала ответ, возвращается список результатов поиска.")
+        if LLM_STREAM_OUTPUT:
+            print_message("Агент", fallback_response)
+        return fallback_response
+    return response
+
 
 
 
@@ -89,3 +142,35 @@ def print_message(role, message):
     except AttributeError as e:
         logger.error(f"Ошибка при выводе сообщения: {e}")
         print(f"{Colors.RED}Ошибка в выводе сообщения.{Colors.RESET}")
+
+
+def print_message_stream(role):
+    """
+    Печатает заголовок сообщения и возвращает колбэк on_token,
+    который выводит токены модели по мере их поступления.
+    """
+    color = Colors.BLUE if role == "Вы" else Colors.GREEN
+    print(f"\n{color}┌─ {role}:{Colors.RESET}")
+    print("│ ", end="", flush=True)
+
+    def on_token(token):
+        print(token.replace("\n", "\n│ "), end="", flush=True)
+
+    return on_token
+
+
+def finish_message_stream(stats=None):
+    """
+    Завершает сообщение, начатое print_message_stream().
+    Если переданы метрики генерации, выводит время загрузки модели отдельно
+    от времени до первого токена и скорости генерации.
+    """
+    print()
+    if stats:
+        summary = (
+            f"Загрузка модели: {stats['load_time']:.2f} с, первый токен: {stats['ttft']:.2f} с, "
+            f"скорость: {stats['tokens_per_sec']:.1f} ток/с"
+        )
+        logger.info(summary)
+        print(f"│ {Colors.GRAY}{summary}{Colors.RESET}")
+    print("└" + "─" * 50)
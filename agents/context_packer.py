@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/context_packer.py
+# ==================================================
+# Упаковка истории и результатов поиска в окно контекста модели
+# Версия: 1.2.0
+# - Оценка числа токенов без токенизатора модели.
+# - Отбор и обрезка результатов поиска и истории под бюджет num_ctx.
+# - Фрагменты текста загруженных страниц получают свою долю бюджета.
+# - Стоимость результата считается по полям, которые попадают в промпт
+#   (agents/prompt_format.py), а не по всем полям словаря.
+# ==================================================
+
+import logging
+import re
+
+from settings import LLM_NUM_CTX, LLM_RESPONSE_RESERVE_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Символов на токен: кириллица у BPE-токенизаторов дробится мельче латиницы
+CHARS_PER_TOKEN_CYRILLIC = 2.5
+CHARS_PER_TOKEN_OTHER = 4.0
+
+# Ограничения на один элемент, чтобы одна длинная запись не вытесняла остальные
+MAX_ABSTRACT_TOKENS = 120
+MAX_HISTORY_ENTRY_TOKENS = 300
+# Доля свободного бюджета, которую может занять история диалога
+HISTORY_SHARE = 0.25
+# Доля оставшегося после истории бюджета под фрагменты текста страниц;
+# неиспользованная часть достаётся результатам поиска
+PASSAGE_SHARE = 0.6
+# Накладные расходы на оформление одного фрагмента (поля, разделители)
+PASSAGE_OVERHEAD_TOKENS = 12
+# Поля результата, которые попадают в промпт, и накладные расходы на номер
+# и переводы строк в компактном формате agents/prompt_format.py
+RESULT_PROMPT_FIELDS = ("title", "url", "abstract")
+RESULT_OVERHEAD_TOKENS = 4
+
+CYRILLIC_RE = re.compile("[а-яА-ЯёЁ]")
+
+
+def estimate_tokens(text):
+    """
+    Приблизительно оценивает число токенов в тексте.
+    """
+    if not text:
+        return 0
+    cyrillic = len(CYRILLIC_RE.findall(text))
+    other = len(text) - cyrillic
+    return int(cyrillic / CHARS_PER_TOKEN_CYRILLIC + other / CHARS_PER_TOKEN_OTHER) + 1
+
+
+def trim_to_tokens(text, max_tokens):
+    """
+    Обрезает текст по границе слова так, чтобы он уложился в max_tokens.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    # Бинарный поиск наибольшего префикса, укладывающегося в бюджет
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(" ".join(words[:middle]) + "…") <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + "…" if low else ""
+
+
+def flatten_results(results):
+    """
+    Приводит результаты поиска к плоскому списку словарей в порядке приоритета.
+    Если результаты сгруппированы по запросам (список списков), они чередуются
+    по рангу: сначала первые результаты каждого запроса, затем вторые и т.д.
+    """
+    groups = [r if isinstance(r, list) else [r] for r in results if r]
+    flat = []
+    for rank in range(max((len(g) for g in groups), default=0)):
+        for group in groups:
+            if rank < len(group) and isinstance(group[rank], dict):
+                flat.append(group[rank])
+    return flat
+
+
+def result_tokens(result):
+    return RESULT_OVERHEAD_TOKENS + sum(estimate_tokens(str(result.get(field) or ""))
+                                        for field in RESULT_PROMPT_FIELDS)
+
+
+def pack_search_results(results, budget):
+    """
+    Отбирает результаты поиска в порядке приоритета, пока они помещаются в budget токенов.
+    Аннотации (abstract) укорачиваются до MAX_ABSTRACT_TOKENS.
+    """
+    packed = []
+    used = 0
+    for result in flatten_results(results):
+        item = dict(result)
+        if "abstract" in item:
+            item["abstract"] = trim_to_tokens(item["abstract"], MAX_ABSTRACT_TOKENS)
+        cost = result_tokens(item)
+        if used + cost > budget:
+            # Последний результат пробуем уместить за счёт аннотации
+            if "abstract" in item:
+                item["abstract"] = trim_to_tokens(item["abstract"], budget - used - (cost - estimate_tokens(item["abstract"])))
+                cost = result_tokens(item)
+            if not item.get("abstract") or used + cost > budget:
+                break
+        packed.append(item)
+        used += cost
+    return packed, used
+
+
+def pack_history(history, budget):
+    """
+    Берёт самые свежие записи истории {"role", "content"}, пока они помещаются в budget.
+    Возвращает записи в хронологическом порядке.
+    """
+    packed = []
+    used = 0
+    for entry in reversed(history):
+        content = trim_to_tokens(entry.get("content", ""), MAX_HISTORY_ENTRY_TOKENS)
+        cost = estimate_tokens(content) + 4
+        if used + cost > budget:
+            break
+        packed.append({**entry, "content": content})
+        used += cost
+    packed.reverse()
+    return packed, used
+
+
+def pack_passages(passages, budget):
+    """
+    Отбирает фрагменты текста страниц {"url", "title", "text"} в порядке приоритета,
+    пока они помещаются в budget токенов.
+    """
+    packed = []
+    used = 0
+    for passage in passages:
+        cost = PASSAGE_OVERHEAD_TOKENS + estimate_tokens(passage.get("text", "")) + estimate_tokens(passage.get("url", ""))
+        if used + cost > budget:
+            continue  # следующий фрагмент может оказаться короче
+        packed.append(passage)
+        used += cost
+    return packed, used
+
+
+def pack_context(fixed_text, results=None, history=None, passages=None, num_ctx=LLM_NUM_CTX,
+                 reserve_tokens=LLM_RESPONSE_RESERVE_TOKENS):
+    """
+    Распределяет окно контекста num_ctx между неизменной частью промпта (fixed_text),
+    историей диалога, фрагментами страниц и результатами поиска;
+    reserve_tokens оставляется под ответ.
+    Возвращает (результаты, история, фрагменты) после отбора и обрезки.
+    """
+    available = num_ctx - reserve_tokens - estimate_tokens(fixed_text)
+    if available <= 0:
+        logger.warning(f"Неизменная часть промпта не помещается в num_ctx={num_ctx}.")
+        return [], [], []
+
+    packed_history, history_used = pack_history(history or [], int(available * HISTORY_SHARE))
+    packed_passages, passages_used = pack_passages(passages or [], int((available - history_used) * PASSAGE_SHARE))
+    packed_results, results_used = pack_search_results(results or [], available - history_used - passages_used)
+
+    total_results = len(flatten_results(results or []))
+    logger.info(
+        f"Контекст: {num_ctx - available - reserve_tokens + history_used + passages_used + results_used}/{num_ctx} токенов, "
+        f"результатов {len(packed_results)}/{total_results}, фрагментов {len(packed_passages)}/{len(passages or [])}, "
+        f"записей истории {len(packed_history)}/{len(history or [])}"
+    )
+    return packed_results, packed_history, packed_passages
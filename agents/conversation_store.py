@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/conversation_store.py
+# ==================================================
+# Хранилище диалогов всех агентов (SQLite, WAL)
+# Версия: 1.0.2
+# - Таблицы: sessions (сеанс работы агента), messages (сообщения сеанса),
+#   search_results (результаты поиска, полученные в сеансе).
+# - Индексы по сеансу и времени; полнотекстовый поиск по сообщениям через
+#   FTS5 (при отсутствии FTS5 в сборке SQLite — через LIKE; символы % и _
+#   в тексте запроса ищутся буквально).
+# - История хранится без ограничения длины: агенты читают из базы только
+#   последние сообщения, а не всю историю.
+# - Режим WAL: несколько агентов могут писать в базу одновременно, чтение
+#   не блокируется записью.
+# - Файлы истории прежних версий переносятся в базу однократно (таблица imports).
+# ==================================================
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from settings import CONVERSATION_DB_PATH
+from agents.context_packer import flatten_results
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    agent TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_agent_started ON sessions (agent, started_at);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages (session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_created ON messages (created_at);
+
+CREATE TABLE IF NOT EXISTS search_results (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    message_id INTEGER REFERENCES messages (id),
+    query TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    title TEXT,
+    url TEXT,
+    abstract TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_search_results_session_created ON search_results (session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_search_results_url ON search_results (url);
+
+CREATE TABLE IF NOT EXISTS imports (
+    source TEXT PRIMARY KEY,
+    imported_at REAL NOT NULL,
+    messages INTEGER NOT NULL
+);
+"""
+
+# Внешнее содержимое (content=messages): текст хранится один раз, индекс
+# поддерживается триггерами
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, content='messages', content_rowid='id', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+
+def fts_query(text):
+    """
+    Запрос FTS5 из произвольного текста: каждое слово в кавычках, чтобы
+    символы синтаксиса FTS5 (кавычки, дефисы, AND/OR) не вызывали ошибок.
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def like_pattern(text):
+    """
+    Шаблон LIKE "содержит text" для условия с ESCAPE по обратной косой черте:
+    символы %, _ и сама косая черта из текста совпадают только сами с собой.
+    """
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def read_history_file(path):
+    """
+    Читает файл истории прежних версий — JSON-массив сообщений.
+    Возвращает список сообщений или None, если формат не распознан.
+    """
+    try:
+        history = json.loads(path.read_text(encoding="utf-8", errors="replace"))
+    except ValueError:
+        return None
+    return history if isinstance(history, list) else None
+
+
+class ConversationStore:
+    """
+    Диалоги агентов в файле SQLite.
+    Безопасно для использования из нескольких потоков одного процесса.
+    """
+
+    def __init__(self, path=CONVERSATION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL NORMAL не теряет целостность при сбое, а fsync выполняется
+        # только при контрольной точке, а не на каждой транзакции
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 недоступен, поиск по истории будет выполняться через LIKE: {e}")
+            self.fts = False
+        self._conn.commit()
+
+    def start_session(self, agent, started_at=None):
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO sessions (agent, started_at) VALUES (?, ?)", (agent, started_at or time.time())
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def end_session(self, session_id):
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET ended_at = ? WHERE id = ?", (time.time(), session_id))
+            self._conn.commit()
+
+    def add_message(self, session_id, role, content):
+        """
+        Сохраняет сообщение и возвращает его id.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, role, str(content), time.time()),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def add_search_results(self, session_id, query, results, message_id=None):
+        """
+        Сохраняет результаты поиска (плоский список или список списков по запросам).
+        """
+        now = time.time()
+        rows = [
+            (session_id, message_id, query, rank, result.get("title"), result.get("url"), result.get("abstract"), now)
+            for rank, result in enumerate(flatten_results(results), 1)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO search_results (session_id, message_id, query, rank, title, url, abstract, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def recent_messages(self, agent=None, session_id=None, limit=50):
+        """
+        Последние limit сообщений сеанса или всех сеансов агента в хронологическом
+        порядке, в виде {"role", "content"}. Сеансы просматриваются от новых к
+        старым по индексу, так что время не зависит от длины всей истории.
+        """
+        rows = []
+        with self._lock:
+            if session_id is None and agent is None:
+                rows = self._conn.execute(
+                    "SELECT role, content FROM messages ORDER BY created_at DESC, id DESC LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                sessions = [session_id] if session_id is not None else [
+                    row[0] for row in self._conn.execute(
+                        "SELECT id FROM sessions WHERE agent = ? ORDER BY started_at DESC, id DESC", (agent,)
+                    )
+                ]
+                for sid in sessions:
+                    rows += self._conn.execute(
+                        "SELECT role, content FROM messages WHERE session_id = ? "
+                        "ORDER BY created_at DESC, id DESC LIMIT ?",
+                        (sid, limit - len(rows)),
+                    ).fetchall()
+                    if len(rows) >= limit:
+                        break
+        return [{"role": row["role"], "content": row["content"]} for row in reversed(rows)]
+
+    def search_messages(self, text, agent=None, limit=20):
+        """
+        Полнотекстовый поиск по сообщениям; лучшие совпадения — первыми.
+        """
+        if not text.strip():
+            return []
+        agent_filter, params = ("AND s.agent = ?", (agent,)) if agent else ("", ())
+        if self.fts:
+            sql = (
+                "SELECT m.id, m.session_id, s.agent, m.role, m.content, m.created_at, "
+                "snippet(messages_fts, 0, '[', ']', '…', 12) AS snippet "
+                "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                "JOIN sessions s ON s.id = m.session_id "
+                f"WHERE messages_fts MATCH ? {agent_filter} ORDER BY bm25(messages_fts) LIMIT ?"
+            )
+            params = (fts_query(text),) + params + (limit,)
+        else:
+            sql = (
+                "SELECT m.id, m.session_id, s.agent, m.role, m.content, m.created_at, m.content AS snippet "
+                "FROM messages m JOIN sessions s ON s.id = m.session_id "
+                f"WHERE m.content LIKE ? ESCAPE '\\' {agent_filter} ORDER BY m.id DESC LIMIT ?"
+            )
+            params = (like_pattern(text),) + params + (limit,)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def session_search_results(self, session_id, limit=100):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, rank, title, url, abstract, created_at FROM search_results "
+                "WHERE session_id = ? ORDER BY created_at, rank LIMIT ?",
+                (session_id, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def is_imported(self, source):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM imports WHERE source = ?", (str(source),)).fetchone() is not None
+
+    def import_history(self, agent, source, entries, started_at=None):
+        """
+        Переносит историю из файла прежней версии отдельным сеансом.
+        Источник (путь к файлу) переносится только один раз.
+        Возвращает число перенесённых сообщений.
+        """
+        source = str(source)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM imports WHERE source = ?", (source,)).fetchone():
+                return 0
+            now = time.time()
+            rows = [(entry.get("role", "user"), str(entry.get("content", ""))) for entry in entries
+                    if isinstance(entry, dict)]
+            with self._conn:  # одна транзакция: файл переносится целиком или не переносится
+                session_id = self._conn.execute(
+                    "INSERT INTO sessions (agent, started_at, ended_at) VALUES (?, ?, ?)",
+                    (agent, started_at or now, started_at or now),
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    [(session_id, role, content, started_at or now) for role, content in rows],
+                )
+                self._conn.execute(
+                    "INSERT INTO imports (source, imported_at, messages) VALUES (?, ?, ?)", (source, now, len(rows))
+                )
+        logger.info(f"История из {source} перенесена в {self.path}, сообщений: {len(rows)}")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Conversation:
+    """
+    Текущий сеанс агента в хранилище. Сеанс создаётся при первой записи.
+    """
+
+    def __init__(self, store, agent):
+        self.store = store
+        self.agent = agent
+        self.session_id = None
+        self._lock = threading.Lock()
+
+    def _session(self):
+        with self._lock:
+            if self.session_id is None:
+                self.session_id = self.store.start_session(self.agent)
+            return self.session_id
+
+    def add(self, *entries):
+        """
+        Сохраняет сообщения {"role", "content"}; возвращает id последнего.
+        """
+        message_id = None
+        for entry in entries:
+            message_id = self.store.add_message(self._session(), entry["role"], entry["content"])
+        return message_id
+
+    def add_search_results(self, query, results, message_id=None):
+        return self.store.add_search_results(self._session(), query, results, message_id)
+
+    def recent(self, limit=50):
+        """
+        Последние сообщения агента, включая предыдущие сеансы.
+        """
+        return self.store.recent_messages(agent=self.agent, limit=limit)
+
+    def search(self, text, limit=20):
+        return self.store.search_messages(text, agent=self.agent, limit=limit)
+
+    def import_files(self, *paths, reader=read_history_file):
+        """
+        Переносит в хранилище существующие файлы истории прежних версий агента.
+        reader(path) возвращает список сообщений или None.
+        """
+        for path in paths:
+            source = str(path.resolve())
+            if not path.exists() or path.stat().st_size == 0 or self.store.is_imported(source):
+                continue
+            try:
+                entries = reader(path)
+            except OSError as e:
+                logger.warning(f"Не удалось прочитать историю из {path}: {e}")
+                continue
+            if entries is None:
+                logger.warning(f"Неизвестный формат истории в {path}, перенос пропущен.")
+                continue
+            self.store.import_history(self.agent, source, entries, started_at=path.stat().st_mtime)
+
+    def end(self):
+        with self._lock:
+            if self.session_id is not None:
+                self.store.end_session(self.session_id)
+                self.session_id = None
+
+
+_store = None
+_store_lock = threading.Lock()
+_conversations = {}
+
+
+def get_conversation_store():
+    """
+    Возвращает общее для процесса хранилище диалогов.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+        return _store
+
+
+def get_conversation(agent):
+    """
+    Возвращает текущий сеанс агента agent (один на процесс).
+    """
+    store = get_conversation_store()
+    with _store_lock:
+        if agent not in _conversations:
+            _conversations[agent] = Conversation(store, agent)
+        return _conversations[agent]
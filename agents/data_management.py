@@ -1,107 +1,97 @@
 #!/usr/bin/env python3
 # agents/data_management.py
-# Version: 1.6.0
+# Version: 1.8.1
 # Purpose: Handle data and dialog history management for the cognitive agent.
+# - История диалога и результаты поиска хранятся в общей базе SQLite
+#   (agents/conversation_store.py); каждое сообщение сохраняется сразу.
 
 import json
 import logging
 import logging.config
+import threading
 from pathlib import Path
 from settings import LOGGING_CONFIG
+from agents.conversation_store import get_conversation
 
 # Настройка логирования
 logging.config.dictConfig(LOGGING_CONFIG)
 logger = logging.getLogger(__name__)
 
-HISTORY_FILE = Path("history/dialog_history.json")
+HISTORY_AGENT = "cognitive_interface_agent_v2"
+# Файл истории прежних версий; переносится в хранилище при первом запуске
+LEGACY_HISTORY_FILE = Path("history/dialog_history.json")
+# Сколько последних сообщений загружается из хранилища (сама история не обрезается)
 MAX_HISTORY_LENGTH = 100
 
-# Cached dialog history to prevent double loading
-dialog_history_cache = None
+_conversation = None
+_conversation_lock = threading.Lock()
 
-def save_dialog_history(dialog_history):
+
+def get_dialog_conversation():
     """
-    Сохраняет историю диалога в файл.
+    Возвращает текущий сеанс агента в хранилище диалогов
+    (agents/conversation_store.py), перенося при первом вызове старый файл истории.
     """
-    global dialog_history_cache
-    try:
-        if not isinstance(dialog_history, list):
-            logger.error("Invalid dialog history format. Expected a list.")
-            return False
-
-        if len(dialog_history) > MAX_HISTORY_LENGTH:
-            dialog_history = dialog_history[-MAX_HISTORY_LENGTH:]
-
-        HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(HISTORY_FILE, "w", encoding="utf-8") as file:
-            json.dump(dialog_history, file, ensure_ascii=False, indent=2)
-        logger.info(f"Dialog history successfully saved to {HISTORY_FILE}")
+    global _conversation
+    with _conversation_lock:
+        if _conversation is None:
+            conversation = get_conversation(HISTORY_AGENT)
+            conversation.import_files(LEGACY_HISTORY_FILE)
+            _conversation = conversation
+        return _conversation
 
-        # Update the cache after saving
-        dialog_history_cache = dialog_history.copy()
 
-        return True
-    except Exception as e:
-        logger.error(f"Error saving dialog history: {e}")
-        return False
-
-def load_dialog_history():
+def load_dialog_history(limit=MAX_HISTORY_LENGTH):
     """
-    Загружает историю диалога из файла.
+    Возвращает последние limit сообщений истории диалога.
     """
-    global dialog_history_cache
-
-    if dialog_history_cache is not None:
-        logger.debug("Using cached dialog history.")
-        return dialog_history_cache
-
-    if HISTORY_FILE.exists() and HISTORY_FILE.stat().st_size > 0:
-        try:
-            with open(HISTORY_FILE, "r", encoding="utf-8") as file:
-                history = json.load(file)
-                if isinstance(history, list):
-                    logger.info(f"Loaded dialog history from {HISTORY_FILE}")
-                    dialog_history_cache = history.copy()
-                    return history
-                else:
-                    logger.warning("Invalid format in dialog history file. Resetting to empty list.")
-        except json.JSONDecodeError:
-            logger.error("Failed to decode dialog history file. Resetting to empty list.")
-        except Exception as e:
-            logger.error(f"Error loading dialog history: {e}")
-    else:
-        logger.warning("No dialog history found or file is empty.")
-
-    dialog_history_cache = []
-    return dialog_history_cache
+    try:
+        return get_dialog_conversation().recent(limit)
+    except Exception as e:
+        logger.error(f"Error loading dialog history: {e}")
+        return []
 
 def append_to_dialog_history(entry):
     """
-    Добавляет запись в историю диалога.
+    Сохраняет запись истории диалога в хранилище; возвращает id сообщения.
     """
-    global dialog_history_cache
-
-    if dialog_history_cache is None:
-        dialog_history_cache = load_dialog_history()
+    try:
+        message_id = get_dialog_conversation().add(entry)
+        logger.debug(f"Appended new entry to dialog history: {entry}")
+        return message_id
+    except Exception as e:
+        logger.error(f"Cannot append to dialog history: {e}")
+        return None
 
-    logger.debug(f"Dialog history before append: {dialog_history_cache}")
+def save_search_results(query, results, message_id=None):
+    """
+    Сохраняет результаты поиска по запросу пользователя в хранилище.
+    """
+    try:
+        get_dialog_conversation().add_search_results(query, results, message_id)
+    except Exception as e:
+        logger.error(f"Error saving search results: {e}")
 
-    if isinstance(dialog_history_cache, list):
-        dialog_history_cache.append(entry)
-        logger.debug(f"Appended new entry to dialog history: {entry}")
-        logger.debug(f"Dialog history after append: {dialog_history_cache}")
-    else:
-        logger.error("Cannot append to dialog history. Cache is not a list.")
+def search_dialog_history(text, limit=20):
+    """
+    Полнотекстовый поиск по всей истории диалогов агента.
+    """
+    try:
+        return get_dialog_conversation().search(text, limit)
+    except Exception as e:
+        logger.error(f"Error searching dialog history: {e}")
+        return []
 
 def finalize_history_saving():
     """
-    Сохраняет историю диалога перед завершением работы программы.
+    Завершает сеанс агента в хранилище перед завершением работы программы.
     """
-    global dialog_history_cache
-    if dialog_history_cache is not None:
+    if _conversation is not None:
         logger.debug("Finalizing dialog history saving...")
-        if not save_dialog_history(dialog_history_cache):
-            logger.error("Failed to finalize dialog history saving.")
+        try:
+            _conversation.end()
+        except Exception as e:
+            logger.error(f"Failed to finalize dialog history saving: {e}")
 
 def save_temp_result(result, query_number, temp_dir=Path("temp")):
     """
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/ddg_standin_server.py
+# ==================================================
+# Локальная заглушка HTML-поиска DuckDuckGo для тестов и замеров
+# Версия: 1.0.1
+# - Отдаёт страницу в разметке html.duckduckgo.com/html/ с детерминированными
+#   результатами для любого запроса (GET ?q= или POST q=).
+# - Имитация задержки сети (--delay) и ограничения частоты (--rate-limit-every).
+# - Замер скорости поиска бэкендом http (--bench N).
+#
+# Запуск заглушки:
+#   python agents/ddg_standin_server.py --port 8765
+#   LLMCAN_SEARCH_DDG_URL=http://127.0.0.1:8765/html/ python agents/cognitive_interface_agent_v2.py
+# Замер (заглушка запускается в том же процессе):
+#   python agents/ddg_standin_server.py --bench 50
+# ==================================================
+
+import argparse
+import html
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlparse
+
+# Добавляем корневую директорию проекта в sys.path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+RESULT_TEMPLATE = """<div class="result results_links results_links_deep web-result">
+  <div class="links_main links_deep result__body">
+    <h2 class="result__title">
+      <a rel="nofollow" class="result__a" href="//duckduckgo.com/l/?uddg={target}&amp;rut=standin">{title}</a>
+    </h2>
+    <a class="result__snippet" href="//duckduckgo.com/l/?uddg={target}">{snippet}</a>
+  </div>
+</div>
+"""
+
+
+def render_results(query, count):
+    """
+    Формирует HTML-страницу с count результатами для запроса.
+    """
+    slug = quote(query.lower().replace(" ", "-"), safe="")
+    items = []
+    for i in range(1, count + 1):
+        url = f"https://example.com/{slug}/{i}?utm_source=standin"
+        items.append(RESULT_TEMPLATE.format(
+            target=quote(url, safe=""),
+            title=f"Результат {i}: <b>{html.escape(query)}</b>",
+            snippet=f"Описание результата {i} по запросу <b>{html.escape(query)}</b>. " * 3,
+        ))
+    return f"<html><body><div id=\"links\" class=\"results\">{''.join(items)}</div></body></html>"
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего сервера
+    # Заголовки и тело пишутся отдельно; без TCP_NODELAY на keep-alive соединении
+    # алгоритм Нейгла и отложенный ACK добавляют ~40 мс к каждому ответу
+    disable_nagle_algorithm = True
+    delay = 0.0
+    results_count = 10
+    rate_limit_every = 0
+    requests_served = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, query):
+        with self.lock:
+            StandinHandler.requests_served += 1
+            served = StandinHandler.requests_served
+        if self.delay:
+            time.sleep(self.delay)
+        if self.rate_limit_every and served % self.rate_limit_every == 0:
+            status, body = 202, "<html><body>anomaly</body></html>"
+        else:
+            status, body = 200, render_results(query, self.results_count)
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._reply(parse_qs(urlparse(self.path).query).get("q", [""])[0])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        self._reply(form.get("q", [""])[0])
+
+
+def start_server(port=0, delay=0.0, results_count=10, rate_limit_every=0):
+    """
+    Запускает заглушку в фоновом потоке и возвращает (сервер, адрес поиска).
+    port=0 — любой свободный порт.
+    """
+    StandinHandler.delay = delay
+    StandinHandler.results_count = results_count
+    StandinHandler.rate_limit_every = rate_limit_every
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandinHandler)
+    threading.Thread(target=server.serve_forever, name="ddg-standin", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/html/"
+
+
+def run_benchmark(count):
+    """
+    Сравнивает поиск бэкендом http с общей сессией и с новой сессией на каждый запрос.
+    """
+    from agents.search_backends import DuckDuckGoHTTPBackend
+    from agents.http_sessions import SessionFactory
+
+    server, url = start_server()
+    backend = DuckDuckGoHTTPBackend(base_url=url)
+
+    started_at = time.perf_counter()
+    for i in range(count):
+        backend.search(f"запрос {i}")
+    pooled = (time.perf_counter() - started_at) / count
+
+    started_at = time.perf_counter()
+    for i in range(count):
+        fresh_sessions = SessionFactory()
+        DuckDuckGoHTTPBackend(base_url=url, sessions=fresh_sessions).search(f"запрос {i}")
+        fresh_sessions.close()
+    fresh = (time.perf_counter() - started_at) / count
+
+    print(f"Запросов: {count}")
+    print(f"Общая сессия (бэкенд http): {pooled * 1000:.2f} мс на запрос")
+    print(f"Новая сессия на запрос:     {fresh * 1000:.2f} мс на запрос")
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка HTML-поиска DuckDuckGo.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="задержка ответа, секунды")
+    parser.add_argument("--results", type=int, default=10, help="число результатов на странице")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="отвечать 202 (ограничение частоты) на каждый N-й запрос")
+    parser.add_argument("--bench", type=int, default=0, help="выполнить N запросов и вывести время")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.bench)
+        return
+
+    server, url = start_server(args.port, args.delay, args.results, args.rate_limit_every)
+    print(f"Заглушка DuckDuckGo: {url} (Ctrl+C для остановки)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
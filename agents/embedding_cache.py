@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/embedding_cache.py
+# ==================================================
+# Дисковый кэш эмбеддингов (numpy.memmap, float16)
+# Версия: 1.1.0
+# - Ключ: SHA-256 текста; отдельное хранилище на каждую модель.
+# - Векторы лежат в файле data/processed/embeddings_<модель>.f16 и
+#   читаются через memmap без загрузки всего файла в память.
+# - Строки векторов — в индексном журнале .keys: запись "<строка> <ключ>"
+#   занимает строку, "<строка> -" освобождает её (формат 1.0.0 — одна
+#   строка журнала на ключ по порядку — читается как прежде).
+# - После max_entries записей новые векторы замещают самые старые
+#   (кольцевой буфер); журнал периодически переписывается целиком.
+# ==================================================
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+from settings import EMBED_CACHE_DIR, EMBED_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 1024
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Хранилище эмбеддингов одной модели.
+
+    Строки файла векторов заполняются по кругу: пока записей меньше
+    max_entries, векторы добавляются в конец, затем замещают самые старые.
+    Ключ записывается в журнал только после сброса вектора на диск, а
+    замещаемая строка заранее освобождается в журнале, поэтому прерванная
+    запись не даёт ключа, указывающего на чужой или пустой вектор.
+    Безопасен для нескольких потоков одного процесса.
+    """
+
+    def __init__(self, model, directory=EMBED_CACHE_DIR, max_entries=EMBED_CACHE_MAX_ENTRIES):
+        safe_name = re.sub(r"[^\w.-]", "_", model)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = directory / f"embeddings_{safe_name}.f16"
+        self.keys_path = directory / f"embeddings_{safe_name}.keys"
+        self.meta_path = directory / f"embeddings_{safe_name}.json"
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._keys = {}
+        self._cursor = 0
+        self._journal_lines = 0
+        self._vectors = None
+        self.dim = None
+        self._open()
+
+    def _open(self):
+        if not self.meta_path.exists():
+            return
+        meta = json.loads(self.meta_path.read_text())
+        self.dim = meta["dim"]
+        capacity = meta["capacity"]
+        text = self.keys_path.read_text() if self.keys_path.exists() else ""
+        if text and not text.endswith("\n"):
+            # Оборванная последняя строка журнала — запись прервалась; отбрасываем её
+            text = text[:text.rfind("\n") + 1]
+            self.keys_path.write_text(text)
+        lines = text.splitlines()
+        legacy_row = 0
+        last_row = -1
+        for line in lines:
+            fields = line.split()
+            if len(fields) == 1:
+                # Формат 1.0.0: номер строки — порядковый номер ключа
+                row, key = legacy_row, fields[0]
+                legacy_row += 1
+            else:
+                row, key = int(fields[0]), fields[1]
+            self._release(row)
+            if key != "-":
+                self._assign(row, key)
+            last_row = row
+        # Ключей не больше, чем строк в файле векторов и чем max_entries
+        for row in [row for row in self._keys if row >= min(capacity, self.max_entries)]:
+            self._release(row)
+        self._cursor = (last_row + 1) % self.max_entries
+        self._journal_lines = len(lines)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+        logger.debug(f"Кэш эмбеддингов {self.vectors_path.name}: {len(self._rows)} записей")
+
+    def _assign(self, row, key):
+        self._release_key(key)
+        self._rows[key] = row
+        self._keys[row] = key
+
+    def _release(self, row):
+        key = self._keys.pop(row, None)
+        if key is not None:
+            del self._rows[key]
+
+    def _release_key(self, key):
+        row = self._rows.pop(key, None)
+        if row is not None:
+            del self._keys[row]
+
+    def _append_journal(self, lines):
+        with open(self.keys_path, "a") as file:
+            file.write("".join(f"{line}\n" for line in lines))
+        self._journal_lines += len(lines)
+
+    def _compact_journal(self):
+        """
+        Переписывает журнал текущими записями от старых к новым (порядок
+        нужен, чтобы при открытии восстановить позицию замещения).
+        """
+        order = sorted(self._keys, key=lambda row: (row - self._cursor) % self.max_entries)
+        tmp_path = self.keys_path.with_suffix(".keys.tmp")
+        tmp_path.write_text("".join(f"{row} {self._keys[row]}\n" for row in order))
+        os.replace(tmp_path, self.keys_path)
+        self._journal_lines = len(order)
+
+    def _ensure_capacity(self, needed, dim):
+        """
+        Создаёт или расширяет файл векторов (удвоением) до needed строк.
+        """
+        if self._vectors is None:
+            self.dim = dim
+            capacity = max(INITIAL_CAPACITY, needed)
+        elif needed <= self._vectors.shape[0]:
+            return
+        else:
+            capacity = max(needed, self._vectors.shape[0] * 2)
+            self._vectors.flush()
+            del self._vectors
+        with open(self.vectors_path, "ab") as file:
+            file.truncate(capacity * self.dim * np.dtype(np.float16).itemsize)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+        self.meta_path.write_text(json.dumps({"dim": self.dim, "capacity": capacity}))
+
+    def get_many(self, keys):
+        """
+        Возвращает {ключ: вектор float32} для найденных в кэше ключей.
+        """
+        with self._lock:
+            if self._vectors is None:
+                return {}
+            return {key: np.asarray(self._vectors[self._rows[key]], dtype=np.float32)
+                    for key in keys if key in self._rows}
+
+    def add_many(self, keys, vectors):
+        """
+        Сохраняет векторы по ключам. Сверх max_entries новые векторы замещают
+        самые старые записи.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                logger.warning(f"Размерность эмбеддингов {vectors.shape[1]} не совпадает с кэшем ({self.dim}).")
+                return
+            new = {key: vector for key, vector in zip(keys, vectors) if key not in self._rows}
+            # Из пакета больше max_entries сохраняются последние векторы
+            new = list(new.items())[-self.max_entries:]
+            if not new:
+                return
+            rows = [(self._cursor + offset) % self.max_entries for offset in range(len(new))]
+            self._ensure_capacity(max(rows) + 1, vectors.shape[1])
+            replaced = [row for row in rows if row in self._keys]
+            if replaced:
+                self._append_journal([f"{row} -" for row in replaced])
+                for row in replaced:
+                    self._release(row)
+                logger.debug(f"Из кэша эмбеддингов вытеснено записей: {len(replaced)}")
+            for row, (_, vector) in zip(rows, new):
+                self._vectors[row] = vector.astype(np.float16)
+            self._vectors.flush()
+            self._append_journal([f"{row} {key}" for row, (key, _) in zip(rows, new)])
+            for row, (key, _) in zip(rows, new):
+                self._assign(row, key)
+            self._cursor = (rows[-1] + 1) % self.max_entries
+            if self._journal_lines > 2 * max(len(self._rows), INITIAL_CAPACITY):
+                self._compact_journal()
+
+    def __len__(self):
+        return len(self._rows)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/health_monitor.py
+# ==================================================
+# Фоновая проверка состояния TOR и серверов Ollama
+# Версия: 1.3.0
+# - Сервис TOR, SOCKS-порты, управляющий порт и выходной IP.
+# - Доступность, версия и список моделей каждого сервера Ollama.
+# - Результат хранится снимком (snapshot), который команды /show и /tor
+#   читают без ожидания; проверки не выполняются на пути запроса.
+# - Выходной IP запрашивается через общую сессию TOR (agents/http_sessions.py).
+# - Серверы Ollama повторно не опрашиваются: их состояние берётся из
+#   пула OllamaPool общего клиента (get_llm_client().pool.status()),
+#   который уже проверяет серверы в своём фоновом потоке.
+# - wait_snapshot(): ожидание первого снимка с ограничением по времени —
+#   для проверок при старте агента вместо повторного синхронного прохода.
+# ==================================================
+
+import logging
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from settings import (
+    HEALTH_CHECK_INTERVAL,
+    HEALTH_CHECK_TIMEOUT,
+    HEALTH_IP_CHECK_URL,
+    TOR_SOCKS_PORTS,
+    TOR_SOCKS_PROXY,
+)
+from agents.tor_controller import get_tor_controller
+from agents.http_sessions import TOR, get_session
+from agents.llm_client import get_llm_client
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """
+    Периодически проверяет внешние зависимости агента в отдельном потоке.
+
+    snapshot() возвращает последний результат мгновенно: пустой словарь до
+    завершения первой проверки, затем {"checked_at", "duration", "tor", "ollama"}.
+    """
+
+    def __init__(self, interval=HEALTH_CHECK_INTERVAL, timeout=HEALTH_CHECK_TIMEOUT,
+                 ip_check_url=HEALTH_IP_CHECK_URL, socks_proxy=TOR_SOCKS_PROXY, socks_ports=TOR_SOCKS_PORTS):
+        parsed = urlsplit(socks_proxy)
+        self.interval = interval
+        self.timeout = timeout
+        self.ip_check_url = ip_check_url
+        self.socks_host = parsed.hostname or "127.0.0.1"
+        self.socks_ports = list(socks_ports) or [parsed.port or 9050]
+        self._snapshot = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def check_tor_service(self):
+        """
+        Состояние сервиса tor по systemd ("active", "inactive", ...) или None.
+        """
+        try:
+            result = subprocess.run(["systemctl", "is-active", "tor"], capture_output=True, text=True,
+                                    timeout=self.timeout)
+            return result.stdout.strip() or None
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.debug(f"Не удалось проверить сервис TOR: {e}")
+            return None
+
+    def check_port(self, port):
+        try:
+            with socket.create_connection((self.socks_host, port), timeout=self.timeout):
+                return True
+        except OSError:
+            return False
+
+    def check_exit_ip(self):
+        """
+        Возвращает (выходной IP TOR, ошибка).
+        """
+        try:
+            response = get_session(TOR).get(self.ip_check_url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.text.strip(), None
+        except requests.RequestException as e:
+            return None, str(e)
+
+    def check_tor(self):
+        socks_ports = {port: self.check_port(port) for port in self.socks_ports}
+        exit_ip, error = self.check_exit_ip() if any(socks_ports.values()) else (None, "SOCKS-порт недоступен")
+        return {
+            "service": self.check_tor_service(),
+            "torsocks": shutil.which("torsocks") is not None,
+            "socks_ports": socks_ports,
+            "control_port": get_tor_controller().is_available(),
+            "exit_ip": exit_ip,
+            "error": error,
+        }
+
+    def check_ollama(self):
+        """
+        Доступность, версия и установленные модели серверов Ollama по
+        последней проверке пула OllamaPool (без собственных запросов).
+        """
+        return [
+            {
+                "base_url": host["base_url"],
+                "available": host["healthy"] and host["checked_at"] is not None,
+                "version": host["version"],
+                "models": host["model_details"],
+                "error": host["last_error"] if host["checked_at"] is not None else "проверка ещё не выполнялась",
+            }
+            for host in get_llm_client().pool.status()
+        ]
+
+    def refresh(self):
+        """
+        Выполняет все проверки и публикует новый снимок.
+        """
+        started_at = time.monotonic()
+        snapshot = {
+            "tor": self.check_tor(),
+            "ollama": self.check_ollama(),
+        }
+        snapshot["checked_at"] = time.time()
+        snapshot["duration"] = time.monotonic() - started_at
+        with self._lock:
+            previous = self._snapshot
+            self._snapshot = snapshot
+        self._ready.set()
+        self._log_changes(previous, snapshot)
+        return snapshot
+
+    def _log_changes(self, previous, current):
+        if previous.get("tor", {}).get("service") != current["tor"]["service"]:
+            logger.info(f"Сервис TOR: {current['tor']['service']}")
+        previous_hosts = {h["base_url"]: h["available"] for h in previous.get("ollama", [])}
+        for host in current["ollama"]:
+            if previous_hosts.get(host["base_url"]) != host["available"]:
+                logger.info(f"Сервер Ollama {host['base_url']}: {'доступен' if host['available'] else host['error']}")
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:  # поток проверки не должен завершаться из-за одной ошибки
+                logger.error(f"Ошибка фоновой проверки состояния: {e}")
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """
+        Запускает фоновую проверку (однократно).
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._snapshot)
+
+    def wait_snapshot(self, timeout):
+        """
+        Ждёт первый снимок не дольше timeout секунд; возвращает снимок
+        или пустой словарь, если первая проверка ещё не завершилась.
+        """
+        self._ready.wait(timeout)
+        return self.snapshot()
+
+
+def snapshot_age(snapshot):
+    """
+    Сколько секунд назад сделан снимок, или None, если проверок ещё не было.
+    """
+    return time.time() - snapshot["checked_at"] if snapshot else None
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_health_monitor():
+    """
+    Возвращает общий для процесса HealthMonitor, запуская его при первом вызове.
+    """
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = HealthMonitor()
+            _monitor.start()
+        return _monitor
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/http_sessions.py
+# ==================================================
+# Общие HTTP-сессии с маршрутом через TOR или напрямую
+# Версия: 1.0.0
+# - Одна requests.Session с пулом keep-alive соединений на каждый маршрут:
+#   напрямую, через TOR или через отдельную цепочку пула TorCircuitPool.
+# - Через TOR — только socks5h: имена разрешаются на стороне TOR.
+# - Локальные сервисы (Ollama) никогда не идут через прокси, в том числе
+#   заданные переменными окружения.
+# ==================================================
+
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from settings import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, TOR_SOCKS_PROXY
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0"
+
+# Маршруты запросов; отдельная цепочка TOR передаётся самим объектом цепочки
+# (любой объект с атрибутом proxy, например TorCircuit из agents/install_tor.py)
+DIRECT = "direct"
+TOR = "tor"
+LOCAL = "local"
+
+
+def tor_route(use_tor, circuit=None):
+    """
+    Маршрут для внешнего запроса: цепочка пула, общий TOR или напрямую.
+    """
+    if circuit is not None:
+        return circuit
+    return TOR if use_tor else DIRECT
+
+
+def to_socks5h(proxy):
+    """
+    socks5:// разрешает имена локально, и DNS-запросы уходят мимо TOR.
+    """
+    return "socks5h://" + proxy[len("socks5://"):] if proxy.startswith("socks5://") else proxy
+
+
+def create_session(route=DIRECT, tor_proxy=TOR_SOCKS_PROXY, pool_connections=HTTP_POOL_CONNECTIONS,
+                   pool_maxsize=HTTP_POOL_MAXSIZE):
+    """
+    Создаёт сессию для маршрута. Прокси задаётся явно, а переменные окружения
+    (HTTP_PROXY, ALL_PROXY и т.п.) не учитываются: в requests они имеют приоритет
+    над session.proxies и увели бы запрос мимо выбранного маршрута.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if route == LOCAL:
+        session.trust_env = False
+        return session
+    session.headers["User-Agent"] = USER_AGENT
+    if route == DIRECT:
+        return session
+    proxy = to_socks5h(tor_proxy if route == TOR else route.proxy)
+    session.trust_env = False
+    session.proxies = {"http": proxy, "https": proxy}
+    return session
+
+
+class SessionFactory:
+    """
+    Хранит по одной сессии на маршрут. Сессии потокобезопасны для
+    параллельных запросов в пределах pool_maxsize соединений на хост.
+    """
+
+    def __init__(self, tor_proxy=TOR_SOCKS_PROXY, pool_connections=HTTP_POOL_CONNECTIONS,
+                 pool_maxsize=HTTP_POOL_MAXSIZE):
+        self.tor_proxy = tor_proxy
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(route):
+        return route if isinstance(route, str) else route.proxy
+
+    def get(self, route=DIRECT):
+        """
+        Сессия для маршрута DIRECT, TOR, LOCAL или цепочки TOR.
+        """
+        key = self._key(route)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = create_session(route, self.tor_proxy, self.pool_connections, self.pool_maxsize)
+                self._sessions[key] = session
+            return session
+
+    def discard(self, route):
+        """
+        Закрывает сессию маршрута, например заменённой цепочки TOR.
+        """
+        with self._lock:
+            session = self._sessions.pop(self._key(route), None)
+        if session is not None:
+            session.close()
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+_factory = None
+_factory_lock = threading.Lock()
+
+
+def get_session_factory():
+    """
+    Возвращает общий для процесса SessionFactory.
+    """
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = SessionFactory()
+        return _factory
+
+
+def get_session(route=DIRECT):
+    """
+    Общая сессия для маршрута (см. SessionFactory.get).
+    """
+    return get_session_factory().get(route)
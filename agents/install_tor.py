@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # agents/install_tor.py
-# Версия: 1.5.0
+# Версия: 1.11.0
 
 import os
 import subprocess
@@ -8,16 +8,39 @@ import sys
 import time
 import logging
 import logging.config
+import statistics
+import uuid
 from pathlib import Path
+from collections import deque
 from itertools import cycle
-from threading import Event, Thread
+from urllib.parse import urlsplit
+from threading import Event, Lock, Thread
 import readline
 
+import requests
+
 # Добавление пути к settings
 project_root = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(project_root))
 
-from settings import LOGGING_CONFIG
+from settings import (
+    LOGGING_CONFIG,
+    TOR_ROTATE_MIN_INTERVAL,
+    TOR_SOCKS_PROXY,
+    TOR_SOCKS_PORTS,
+    TOR_CIRCUIT_POOL_SIZE,
+    TOR_CIRCUIT_MAX_FAILURES,
+    TOR_CIRCUIT_MAX_LATENCY,
+    HEALTH_IP_CHECK_URL,
+    TOR_PROBE_INTERVAL,
+    TOR_PROBE_WINDOW,
+    TOR_PROBE_PERCENTILE,
+    TOR_PROBE_MIN_SUCCESS,
+    TOR_PROBE_MIN_SAMPLES,
+)
+from agents.tor_controller import get_tor_controller
+from agents.http_sessions import TOR, get_session, get_session_factory
+from agents.tor_prober import CircuitProber
 
 # Настройка логирования
 logging.config.dictConfig(LOGGING_CONFIG)
@@ -132,11 +155,12 @@ def restart_tor_and_check_ddgr():
                 continue
 
             try:
-                ip_result = subprocess.run(["torsocks", "curl", "-m", "10", "https://api.ipify.org"], capture_output=True, text=True, timeout=3)
-                new_ip = ip_result.stdout.strip()
+                # Старые соединения через перезапущенный TOR недействительны
+                get_session_factory().discard(TOR)
+                new_ip = get_session(TOR).get(HEALTH_IP_CHECK_URL, timeout=10).text.strip()
                 logger.info(f"Новый IP через TOR: {new_ip}")
                 print(f"Новый IP через TOR: {new_ip}")
-            except subprocess.CalledProcessError:
+            except requests.RequestException:
                 logger.warning("Не удалось получить IP через TOR.")
             return True
 
@@ -154,6 +178,261 @@ def restart_tor_and_check_ddgr():
     logger.error("Не удалось настроить TOR после 5 попыток. Проверьте подключение.")
     return False
 
+# Смена цепочки TOR при ограничении частоты поиска. Параллельные запросы
+# получают отказ почти одновременно, поэтому смена выполняется не чаще
+# раза в TOR_ROTATE_MIN_INTERVAL секунд. Цепочка меняется сигналом NEWNYM
+# через управляющий порт (agents/tor_controller.py); перезапуск сервиса —
+# только если порт недоступен.
+_rotation_lock = Lock()
+_last_rotation = float("-inf")
+
+def rotate_tor_circuit():
+    global _last_rotation
+    with _rotation_lock:
+        if time.monotonic() - _last_rotation < TOR_ROTATE_MIN_INTERVAL:
+            logger.debug("Цепочка TOR недавно сменена, повторная смена пропущена.")
+            return
+        if not get_tor_controller().new_identity():
+            logger.info("Управляющий порт TOR недоступен, выполняется перезапуск сервиса.")
+            restart_tor_and_check_ddgr()
+        _last_rotation = time.monotonic()
+
+# Во сколько раз медиана цепочки может превышать перцентиль остальных цепочек:
+# без запаса rebalance() заменял бы самую медленную цепочку на каждом круге
+REBALANCE_MARGIN = 1.5
+
+
+class TorCircuit:
+    """
+    Изолированная цепочка TOR: SOCKS-порт и уникальная пара логин/пароль.
+
+    TOR по умолчанию (IsolateSOCKSAuth) не пускает соединения с разными
+    учётными данными SOCKS по одной цепочке, поэтому каждая пара даёт
+    отдельную цепочку и, как правило, отдельный выходной узел.
+    Последние window замеров (время ответа и успех) хранятся скользящим окном.
+    """
+
+    def __init__(self, host, port, window=TOR_PROBE_WINDOW):
+        self.host = host
+        self.port = port
+        self.username = f"llmcan-{uuid.uuid4().hex[:12]}"
+        self.password = "x"
+        self.failures = 0
+        self.outstanding = 0
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    @property
+    def proxy(self):
+        # socks5h: имена разрешаются на стороне TOR, DNS не утекает
+        return f"socks5h://{self.username}:{self.password}@{self.host}:{self.port}"
+
+    def record(self, ok, latency=None):
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latencies.append(latency)
+
+    def median_latency(self):
+        return statistics.median(self.latencies) if self.latencies else None
+
+    def success_rate(self):
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else None
+
+    def __repr__(self):
+        return f"TorCircuit({self.username}@{self.port})"
+
+
+class TorCircuitPool:
+    """
+    Пул изолированных цепочек TOR для параллельных запросов.
+
+    acquire() выбирает среди исправных цепочек наименее загруженную, а при
+    равной загрузке — с меньшим медианным временем ответа (цепочка без замеров
+    считается средней по пулу); равные цепочки выбираются по кругу. Цепочки
+    распределяются по SOCKS-портам из settings.TOR_SOCKS_PORTS.
+
+    Цепочка, получившая ограничение частоты, TOR_CIRCUIT_MAX_FAILURES ошибок
+    подряд или ответ медленнее TOR_CIRCUIT_MAX_LATENCY секунд, заменяется
+    новой (новые учётные данные — новая цепочка). rebalance() по замерам
+    agents/tor_prober.py заменяет самые медленные и ненадёжные цепочки.
+    """
+
+    def __init__(self, size=TOR_CIRCUIT_POOL_SIZE, socks_proxy=TOR_SOCKS_PROXY, ports=TOR_SOCKS_PORTS,
+                 max_failures=TOR_CIRCUIT_MAX_FAILURES, max_latency=TOR_CIRCUIT_MAX_LATENCY,
+                 window=TOR_PROBE_WINDOW, min_success=TOR_PROBE_MIN_SUCCESS):
+        parsed = urlsplit(socks_proxy)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.ports = list(ports) or [parsed.port or 9050]
+        self.max_failures = max_failures
+        self.max_latency = max_latency
+        self.window = window
+        self.min_success = min_success
+        self._lock = Lock()
+        self._circuits = [self._new_circuit(self.ports[i % len(self.ports)]) for i in range(max(1, size))]
+        self._next = 0
+
+    def _new_circuit(self, port):
+        return TorCircuit(self.host, port, self.window)
+
+    def _is_healthy(self, circuit):
+        rate = circuit.success_rate()
+        return rate is None or rate >= self.min_success
+
+    def acquire(self):
+        """
+        Резервирует цепочку для запроса; после запроса вызывается release().
+        """
+        with self._lock:
+            count = len(self._circuits)
+            # Порядок обхода сдвигается с каждым вызовом: при равных оценках — по кругу
+            order = [self._circuits[(self._next + i) % count] for i in range(count)]
+            self._next += 1
+            candidates = [c for c in order if self._is_healthy(c)] or order
+            # Цепочка без замеров считается средней по пулу
+            medians = [m for m in (c.median_latency() for c in candidates) if m is not None]
+            default = statistics.median(medians) if medians else 0.0
+
+            def score(c):
+                median = c.median_latency()
+                return c.outstanding, default if median is None else median
+
+            circuit = min(candidates, key=score)
+            circuit.outstanding += 1
+            return circuit
+
+    def release(self, circuit):
+        with self._lock:
+            circuit.outstanding = max(0, circuit.outstanding - 1)
+
+    def report(self, circuit, ok, latency=None, blocked=False):
+        """
+        Учитывает результат запроса через цепочку; заменяет заблокированные,
+        медленные и многократно ошибающиеся цепочки.
+        """
+        with self._lock:
+            circuit.record(ok, latency)
+            if ok:
+                circuit.failures = 0
+                if latency is not None and latency > self.max_latency:
+                    self._evict(circuit, f"ответ за {latency:.1f} с")
+                return
+            circuit.failures += 1
+            if blocked:
+                self._evict(circuit, "ограничение частоты")
+            elif circuit.failures >= self.max_failures:
+                self._evict(circuit, f"ошибок подряд: {circuit.failures}")
+
+    def rebalance(self, percentile=TOR_PROBE_PERCENTILE, min_samples=TOR_PROBE_MIN_SAMPLES):
+        """
+        Заменяет цепочки, у которых доля успешных замеров ниже min_success
+        или медианное время ответа больше чем в REBALANCE_MARGIN раз превышает
+        percentile-й перцентиль замеров остальных цепочек пула.
+        Сами цепочки закрываются через управляющий порт TOR, если он доступен.
+        Возвращает список заменённых цепочек.
+        """
+        percentile = min(max(percentile, 1), 99)
+        with self._lock:
+            evicted = []
+            for circuit in list(self._circuits):
+                if len(circuit.outcomes) < min_samples:
+                    continue
+                if not self._is_healthy(circuit):
+                    self._evict(circuit, f"успешных замеров {circuit.success_rate():.0%}")
+                    evicted.append(circuit)
+                    continue
+                median = circuit.median_latency()
+                others = [latency for c in self._circuits if c is not circuit for latency in c.latencies]
+                if median is None or len(others) < 2:
+                    continue
+                threshold = statistics.quantiles(others, n=100)[percentile - 1]
+                if median > threshold * REBALANCE_MARGIN:
+                    self._evict(circuit, f"медиана {median:.2f} с, p{percentile} остальных {threshold:.2f} с")
+                    evicted.append(circuit)
+        for circuit in evicted:
+            get_tor_controller().close_circuits(circuit.username)
+        return evicted
+
+    def evict(self, circuit, reason="по запросу"):
+        with self._lock:
+            self._evict(circuit, reason)
+
+    def _evict(self, circuit, reason):
+        if circuit not in self._circuits:
+            return  # уже заменена другим потоком
+        index = self._circuits.index(circuit)
+        self._circuits[index] = self._new_circuit(circuit.port)
+        get_session_factory().discard(circuit)
+        logger.info(f"Цепочка TOR {circuit} заменена ({reason}): {self._circuits[index]}")
+
+    def circuits(self):
+        with self._lock:
+            return list(self._circuits)
+
+    def status(self):
+        """
+        Снимок состояния цепочек для вывода пользователю.
+        """
+        with self._lock:
+            return [
+                {
+                    "circuit": repr(c),
+                    "outstanding": c.outstanding,
+                    "median_latency": c.median_latency(),
+                    "success_rate": c.success_rate(),
+                    "samples": len(c.outcomes),
+                }
+                for c in self._circuits
+            ]
+
+
+_circuit_pool = None
+_circuit_prober = None
+_tor_probing = True
+_circuit_pool_lock = Lock()
+
+def get_circuit_pool():
+    """
+    Общий для процесса пул цепочек TOR или None, если пул отключён
+    (settings.TOR_CIRCUIT_POOL_SIZE = 0).
+    """
+    global _circuit_pool, _circuit_prober
+    if TOR_CIRCUIT_POOL_SIZE <= 0:
+        return None
+    with _circuit_pool_lock:
+        if _circuit_pool is None:
+            _circuit_pool = TorCircuitPool()
+            if TOR_PROBE_INTERVAL > 0:
+                # Замеры цепочек идут в фоне, пока используется режим TOR
+                _circuit_prober = CircuitProber(_circuit_pool)
+                if not _tor_probing:
+                    _circuit_prober.pause()
+                _circuit_prober.start()
+        return _circuit_pool
+
+def set_tor_probing(enabled):
+    """
+    Включает или приостанавливает фоновые замеры цепочек вместе с режимом TOR
+    агента (команды /tn и /tf).
+    """
+    global _tor_probing
+    with _circuit_pool_lock:
+        _tor_probing = enabled
+        if _circuit_prober is not None:
+            if enabled:
+                _circuit_prober.resume()
+            else:
+                _circuit_prober.pause()
+
+def tor_rate_limit_handler(use_tor):
+    """
+    Обработчик ограничения частоты для RetryPolicy. При включённом пуле
+    заблокированная цепочка заменяется в самом бэкенде поиска, и общая смена
+    цепочек (NEWNYM) не нужна.
+    """
+    if not use_tor or get_circuit_pool() is not None:
+        return None
+    return rotate_tor_circuit
+
 def start_tor_service():
     logger.info("Запуск сервиса Tor.")
     print("Запускаю сервис Tor...")
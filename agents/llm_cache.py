@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/llm_cache.py
+# ==================================================
+# Дисковый кэш ответов LLM (SQLite)
+# Версия: 1.0.0
+# - Ключ: модель + хэш промпта + параметры генерации.
+# - Срок жизни записей (TTL) и вытеснение давно неиспользуемых (LRU).
+# ==================================================
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from settings import LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# Поля запроса, которые не влияют на текст ответа и не входят в ключ
+NON_KEY_FIELDS = {"keep_alive", "stream"}
+
+
+class LLMCache:
+    """
+    Кэш ответов Ollama в файле SQLite.
+    Безопасен для использования из нескольких потоков одного процесса.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                response TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, prompt, options=None, extra=None):
+        """
+        Формирует ключ кэша из модели, хэша промпта и параметров генерации.
+        """
+        params = {k: v for k, v in (extra or {}).items() if k not in NON_KEY_FIELDS}
+        key_data = {
+            "model": model,
+            "prompt": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+            "options": options or {},
+            "params": params,
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Возвращает сохранённый ответ или None, если записи нет или она устарела.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        logger.debug(f"Ответ LLM взят из кэша ({key[:12]})")
+        return json.loads(response)
+
+    def set(self, key, model, response_data):
+        """
+        Сохраняет ответ модели. Массив context не кэшируется — он велик и привязан к сессии.
+        """
+        data = {k: v for k, v in response_data.items() if k != "context"}
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, created_at, last_access, response) VALUES (?, ?, ?, ?, ?)",
+                (key, model, now, now, json.dumps(data, ensure_ascii=False)),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """
+        Удаляет устаревшие записи и самые давно использованные сверх лимита.
+        Вызывается под блокировкой.
+        """
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            logger.debug(f"Из кэша LLM вытеснено записей: {count - self.max_entries}")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/llm_client.py
+# ==================================================
+# Общий клиент Ollama для всех агентов LLMCAN
+# Версия: 1.9.2
+# - Пул keep-alive соединений вместо requests.post на каждый вызов.
+# - Раздельные таймауты подключения и чтения.
+# - Синхронный и асинхронный интерфейсы.
+# - Потоковый режим (NDJSON) с замером времени до первого токена и скорости.
+# - Дисковый кэш ответов (agents/llm_cache.py) с обходом на уровне вызова.
+# - Диалоговый режим /api/chat с удержанием модели в памяти (keep_alive).
+# - Маршрутизация по нескольким серверам Ollama (agents/llm_pool.py).
+# - Прогрев модели при старте и удержание её в памяти на время сеанса.
+# - Каскад моделей по этапам конвейера с бюджетом времени (generate_stage).
+# - Единое окно контекста options.num_ctx для всех запросов, включая прогрев.
+# - Эмбеддинги текстов пакетами через /api/embed.
+# - Сессия создаётся фабрикой agents/http_sessions.py с маршрутом LOCAL:
+#   запросы к Ollama никогда не идут через TOR или прокси из окружения.
+# ==================================================
+
+import asyncio
+import functools
+import json
+import logging
+import threading
+import time
+
+import requests
+
+from settings import (
+    LLM_API_HOSTS,
+    LLM_POOL_SIZE,
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+    LLM_CACHE_ENABLED,
+    LLM_KEEP_ALIVE,
+    LLM_RELEASE_KEEP_ALIVE,
+    LLM_STAGES,
+    LLM_NUM_CTX,
+)
+from agents.llm_cache import LLMCache
+from agents.llm_pool import OllamaPool
+from agents.http_sessions import LOCAL, create_session
+
+logger = logging.getLogger(__name__)
+
+NO_RESPONSE = "<Нет ответа>"
+
+
+class IncompleteStreamError(requests.RequestException):
+    """
+    Поток NDJSON закончился без итогового фрагмента (done=true): соединение
+    оборвалось или сервер прервал генерацию. Частичный ответ не возвращается.
+    """
+
+
+class OllamaClient:
+    """
+    Клиент Ollama API поверх одной requests.Session.
+
+    Сессия держит пул keep-alive соединений, поэтому повторные вызовы
+    не платят за TCP-рукопожатие с удалённым сервером Ollama.
+    Сервер для каждого запроса выбирает OllamaPool по модели и нагрузке.
+    Если передан cache (LLMCache), ответы /api/generate кэшируются.
+    """
+
+    def __init__(self, hosts=LLM_API_HOSTS, pool_size=LLM_POOL_SIZE,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT, cache=None,
+                 num_ctx=LLM_NUM_CTX):
+        self.cache = cache
+        self.num_ctx = num_ctx
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = create_session(LOCAL, pool_connections=len(hosts), pool_maxsize=pool_size)
+        self.pool = OllamaPool(hosts, session=self.session)
+        # Метрики последнего потокового ответа (для вывода в консоль)
+        self.last_stats = None
+
+    def _timeout(self, read_timeout=None):
+        """
+        Возвращает кортеж (connect, read) для requests.
+        """
+        return (self.connect_timeout, read_timeout or self.read_timeout)
+
+    def _options(self, options=None):
+        """
+        Дополняет параметры генерации окном контекста num_ctx.
+        Ollama перезагружает модель, если num_ctx запроса отличается от того,
+        с которым она загружена, поэтому значение одно для всех запросов.
+        """
+        return {"num_ctx": self.num_ctx, **(options or {})}
+
+    def post(self, path, payload, read_timeout=None):
+        """
+        Отправляет POST на эндпоинт Ollama и возвращает декодированный JSON.
+        Исключения requests пробрасываются вызывающему коду.
+        """
+        with self.pool.acquire(payload.get("model", "")) as base_url:
+            url = f"{base_url}{path}"
+            logger.debug(f"POST {url} (model={payload.get('model')})")
+            response = self.session.post(url, json=payload, timeout=self._timeout(read_timeout))
+            response.raise_for_status()
+            return response.json()
+
+    def post_stream(self, path, payload, on_token=None, read_timeout=None, deadline=None):
+        """
+        Отправляет потоковый запрос и читает NDJSON-фрагменты Ollama.
+
+        Каждый фрагмент текста передаётся в on_token(token) сразу после получения.
+        Если задан deadline (time.monotonic()), после него поток закрывается,
+        генерация на сервере прерывается и выбрасывается requests.Timeout.
+        Возвращает итоговый фрагмент Ollama (done=true), в котором поле "response"
+        (или "message" для /api/chat) заменено полным текстом, а в "stats"
+        добавлены метрики генерации. Если поток закончился без done=true,
+        выбрасывается IncompleteStreamError.
+        """
+        payload = dict(payload, stream=True)
+        self.last_stats = None
+        started_at = time.monotonic()
+        first_token_at = None
+        parts = []
+        final = {}
+
+        with self.pool.acquire(payload.get("model", "")) as base_url:
+            url = f"{base_url}{path}"
+            logger.debug(f"POST {url} (model={payload.get('model')}, stream)")
+            with self.session.post(url, json=payload, stream=True, timeout=self._timeout(read_timeout)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise requests.RequestException(f"Ollama: {chunk['error']}")
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise requests.Timeout(f"Превышен бюджет времени ответа модели {payload.get('model')}")
+                    token = chunk.get("response") or chunk.get("message", {}).get("content", "")
+                    if token:
+                        if first_token_at is None:
+                            first_token_at = time.monotonic()
+                        parts.append(token)
+                        if on_token:
+                            on_token(token)
+                    if chunk.get("done"):
+                        final = chunk
+                        break
+
+        if not final:
+            raise IncompleteStreamError(
+                f"Поток ответа модели {payload.get('model')} оборвался без завершения "
+                f"(получено фрагментов: {len(parts)})"
+            )
+        if path == "/api/chat":
+            final["message"] = {"role": "assistant", "content": "".join(parts)}
+        else:
+            final["response"] = "".join(parts)
+        final["stats"] = stream_stats(final, started_at, first_token_at, len(parts))
+        self.last_stats = final["stats"]
+        logger.debug(
+            f"Модель {payload.get('model')}: первый токен через {final['stats']['ttft']:.2f} с, "
+            f"{final['stats']['tokens_per_sec']:.1f} ток/с"
+        )
+        return final
+
+    def generate(self, prompt, model, options=None, read_timeout=None, stream=False, on_token=None,
+                 use_cache=True, keep_alive=LLM_KEEP_ALIVE, deadline=None, **extra):
+        """
+        Выполняет /api/generate и возвращает полный JSON-ответ Ollama.
+        При stream=True текст приходит по частям в on_token.
+        use_cache=False отключает кэш для запросов, зависящих от времени.
+        keep_alive передаётся в каждом запросе, иначе Ollama сбросит срок
+        удержания модели к своему значению по умолчанию.
+        deadline ограничивает общее время потокового ответа (см. post_stream).
+        """
+        options = self._options(options)
+        cache_key = None
+        if self.cache is not None and use_cache:
+            cache_key = self.cache.make_key(model, prompt, options, extra)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Ответ модели {model} взят из кэша.")
+                if stream:
+                    self.last_stats = None
+                    if on_token:
+                        on_token(cached.get("response", ""))
+                return cached
+
+        payload = {"model": model, "prompt": prompt, "stream": False, "keep_alive": keep_alive, "options": options}
+        payload.update(extra)
+        if stream:
+            response_data = self.post_stream("/api/generate", payload, on_token=on_token,
+                                             read_timeout=read_timeout, deadline=deadline)
+        else:
+            response_data = self.post("/api/generate", payload, read_timeout=read_timeout)
+
+        # В кэш попадают только завершённые ответы
+        if cache_key is not None and response_data.get("done") is True:
+            self.cache.set(cache_key, model, response_data)
+        return response_data
+
+    def chat(self, messages, model, options=None, read_timeout=None, stream=False, on_token=None,
+             keep_alive=LLM_KEEP_ALIVE, **extra):
+        """
+        Выполняет /api/chat со списком сообщений {"role", "content"}.
+
+        История передаётся сообщениями, а не склеенным текстом, и модель
+        остаётся загруженной (keep_alive), поэтому Ollama переиспользует
+        KV-кэш общего префикса диалога и не пересчитывает его на каждом ходу.
+        """
+        payload = {"model": model, "messages": messages, "stream": False, "keep_alive": keep_alive,
+                   "options": self._options(options)}
+        payload.update(extra)
+        if stream:
+            return self.post_stream("/api/chat", payload, on_token=on_token, read_timeout=read_timeout)
+        return self.post("/api/chat", payload, read_timeout=read_timeout)
+
+    def embed(self, texts, model, keep_alive=LLM_KEEP_ALIVE, read_timeout=None):
+        """
+        Выполняет /api/embed для списка текстов одним запросом и возвращает
+        список векторов в том же порядке.
+        """
+        payload = {"model": model, "input": list(texts), "keep_alive": keep_alive}
+        return self.post("/api/embed", payload, read_timeout=read_timeout).get("embeddings", [])
+
+    def warmup(self, model, keep_alive=LLM_KEEP_ALIVE):
+        """
+        Загружает модель в память сервера запросом без промпта и закрепляет её
+        на срок keep_alive. Возвращает время загрузки модели в секундах.
+        """
+        response_data = self.post("/api/generate", {"model": model, "stream": False, "keep_alive": keep_alive,
+                                                     "options": self._options()})
+        return response_data.get("load_duration", 0) / 1e9
+
+    def release(self, model, keep_alive=LLM_RELEASE_KEEP_ALIVE):
+        """
+        Возвращает модели обычный срок удержания в памяти по завершении сеанса.
+        """
+        self.post("/api/generate", {"model": model, "stream": False, "keep_alive": keep_alive,
+                                    "options": self._options()})
+
+    async def agenerate(self, prompt, model, **kwargs):
+        """
+        Асинхронная версия generate(): вызов выполняется в пуле потоков
+        и использует ту же сессию с пулом соединений.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.generate, prompt, model, **kwargs))
+
+    def close(self):
+        self.pool.stop()
+        self.session.close()
+
+
+def stream_stats(final, started_at, first_token_at, chunk_count):
+    """
+    Считает метрики потокового ответа: время загрузки модели (load_time),
+    время до первого токена (ttft) и скорость генерации в токенах в секунду.
+    Если Ollama вернул eval_count/eval_duration, используются они.
+    """
+    finished_at = time.monotonic()
+    ttft = (first_token_at or finished_at) - started_at
+    eval_count = final.get("eval_count") or chunk_count
+    eval_duration = final.get("eval_duration")
+    if eval_duration:
+        seconds = eval_duration / 1e9
+    else:
+        seconds = finished_at - (first_token_at or started_at)
+    return {
+        "load_time": final.get("load_duration", 0) / 1e9,
+        "ttft": ttft,
+        "tokens_per_sec": eval_count / seconds if seconds > 0 else 0.0,
+        "total_time": finished_at - started_at,
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    Возвращает общий для процесса экземпляр OllamaClient.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient(cache=LLMCache() if LLM_CACHE_ENABLED else None)
+                _client.pool.start()
+    return _client
+
+
+def generate_text(prompt, model, **kwargs):
+    """
+    Выполняет запрос к модели и возвращает текст ответа или None при ошибке.
+    """
+    try:
+        response_data = get_llm_client().generate(prompt, model, **kwargs)
+        return response_data.get("response", NO_RESPONSE)
+    except requests.RequestException as e:
+        logger.error(f"Ошибка запроса к модели: {e}")
+        return None
+    except ValueError as e:
+        logger.error(f"Ошибка декодирования JSON: {e}")
+        return None
+
+
+def failure_reason(error, budget=None):
+    """
+    Короткое описание причины, по которой модель не вернула ответ.
+    """
+    # ConnectTimeout — одновременно ConnectionError и Timeout: сервер недоступен
+    if isinstance(error, requests.ConnectionError):
+        return "недоступна (нет соединения с сервером)"
+    if isinstance(error, requests.Timeout):
+        return f"не уложилась в {budget} с" if budget else "не ответила вовремя"
+    if isinstance(error, IncompleteStreamError):
+        return "оборвала ответ"
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        if error.response.status_code == 404:
+            return "не найдена на сервере"
+        return f"вернула ошибку HTTP {error.response.status_code}"
+    if isinstance(error, ValueError):
+        return "вернула некорректный ответ"
+    return "вернула ошибку"
+
+
+def generate_stage(stage, prompt, stream=False, on_token=None, **kwargs):
+    """
+    Выполняет запрос этапа конвейера ("rewrite", "synthesis") по каскаду
+    моделей из settings.LLM_STAGES.
+
+    Каждая модель получает свой бюджет времени; при его превышении или ошибке
+    запрос отменяется и этап переходит к следующей, более дешёвой модели.
+    Если модель успела вывести часть ответа, вывод завершается пометкой,
+    и ответ следующей модели начинается с новой строки.
+    Возвращает текст ответа или None, если ни одна модель не ответила —
+    тогда вызывающий код использует свой запасной вариант.
+    """
+    cascade = LLM_STAGES[stage]
+    for index, (model, budget) in enumerate(cascade):
+        started_at = time.monotonic()
+        emitted = []
+
+        def forward(token):
+            emitted.append(token)
+            on_token(token)
+
+        try:
+            response_data = get_llm_client().generate(
+                prompt, model, stream=stream, on_token=forward if on_token else None,
+                read_timeout=budget, deadline=started_at + budget, **kwargs
+            )
+            logger.info(f"Этап {stage}: ответ модели {model} за {time.monotonic() - started_at:.2f} с")
+            return response_data.get("response", NO_RESPONSE)
+        except (requests.RequestException, ValueError) as e:
+            reason = failure_reason(e, budget)
+            logger.warning(f"Этап {stage}: модель {model} {reason}: {e}")
+        if on_token:
+            if emitted:
+                on_token("\n[— ответ прерван —]")
+            if index + 1 < len(cascade):
+                on_token(f"\n[{model} {reason}, переключаюсь на {cascade[index + 1][0]}]\n")
+    logger.error(f"Этап {stage}: ни одна модель не вернула ответ.")
+    return None
+
+
+def warmup_model(model, keep_alive=LLM_KEEP_ALIVE):
+    """
+    Прогревает модель и пишет в лог время её загрузки. Ошибки не пробрасываются:
+    неудачный прогрев лишь означает, что первый запрос будет медленнее.
+    """
+    started_at = time.monotonic()
+    try:
+        load_time = get_llm_client().warmup(model, keep_alive=keep_alive)
+        logger.info(
+            f"Модель {model} готова: загрузка {load_time:.2f} с, "
+            f"прогрев {time.monotonic() - started_at:.2f} с, keep_alive={keep_alive}"
+        )
+        return load_time
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"Не удалось прогреть модель {model}: {e}")
+        return None
+
+
+def warmup_model_async(model, keep_alive=LLM_KEEP_ALIVE):
+    """
+    Запускает warmup_model() в фоновом потоке и возвращает поток.
+    """
+    thread = threading.Thread(target=warmup_model, args=(model, keep_alive), name=f"warmup-{model}", daemon=True)
+    thread.start()
+    return thread
+
+
+def release_model(model):
+    """
+    Снимает закрепление модели в конце сеанса.
+    """
+    try:
+        get_llm_client().release(model)
+        logger.debug(f"Модель {model}: закрепление в памяти снято.")
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"Не удалось снять закрепление модели {model}: {e}")
+
+
+def chat_text(messages, model, **kwargs):
+    """
+    Выполняет /api/chat и возвращает текст ответа ассистента или None при ошибке.
+    """
+    try:
+        response_data = get_llm_client().chat(messages, model, **kwargs)
+        return response_data.get("message", {}).get("content", NO_RESPONSE)
+    except requests.RequestException as e:
+        logger.error(f"Ошибка запроса к модели: {e}")
+        return None
+    except ValueError as e:
+        logger.error(f"Ошибка декодирования JSON: {e}")
+        return None
+
+
+def embed_texts(texts, model, batch_size=32):
+    """
+    Возвращает эмбеддинги текстов, отправляя их пакетами по batch_size,
+    или None при ошибке.
+    """
+    vectors = []
+    try:
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            embeddings = get_llm_client().embed(batch, model)
+            if len(embeddings) != len(batch):
+                raise ValueError(f"Получено {len(embeddings)} эмбеддингов вместо {len(batch)}")
+            vectors.extend(embeddings)
+    except (requests.RequestException, ValueError) as e:
+        logger.error(f"Ошибка получения эмбеддингов модели {model}: {e}")
+        return None
+    return vectors
+
+
+async def agenerate_text(prompt, model, **kwargs):
+    """
+    Асинхронная версия generate_text().
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(generate_text, prompt, model, **kwargs))
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/llm_pool.py
+# ==================================================
+# Пул серверов Ollama с маршрутизацией запросов
+# Версия: 1.1.0
+# - Список серверов из settings.LLM_API_HOSTS.
+# - Фоновая проверка здоровья и списка моделей (/api/tags, /api/ps).
+# - Версия Ollama и сведения о моделях сохраняются в состоянии сервера:
+#   status() — единственный источник состояния Ollama для /show
+#   (agents/health_monitor.py не опрашивает серверы повторно).
+# - Выбор исправного сервера с нужной моделью и наименьшим числом
+#   незавершённых запросов.
+# ==================================================
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from settings import LLM_API_HOSTS, LLM_HEALTH_CHECK_INTERVAL, LLM_HEALTH_CHECK_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_model_name(name):
+    """
+    Приводит имя модели к виду Ollama: "llama3" и "llama3:latest" — одна модель.
+    """
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaHost:
+    """
+    Состояние одного сервера Ollama.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        # До первой проверки сервер считается исправным, чтобы не блокировать старт
+        self.healthy = True
+        self.models = set()
+        self.running_models = set()
+        self.model_details = []
+        self.version = None
+        self.outstanding = 0
+        self.last_error = None
+        self.checked_at = None
+
+    def has_model(self, model):
+        # Пустой список моделей означает, что сервер ещё не проверялся
+        return not self.models or normalize_model_name(model) in self.models
+
+    def __repr__(self):
+        return f"OllamaHost({self.base_url}, healthy={self.healthy}, outstanding={self.outstanding})"
+
+
+class OllamaPool:
+    """
+    Набор серверов Ollama. Каждый запрос получает адрес через acquire(model):
+    выбирается исправный сервер с нужной моделью и наименьшей текущей нагрузкой.
+    """
+
+    def __init__(self, hosts=LLM_API_HOSTS, session=None,
+                 check_interval=LLM_HEALTH_CHECK_INTERVAL, check_timeout=LLM_HEALTH_CHECK_TIMEOUT):
+        if not hosts:
+            raise ValueError("Список серверов Ollama пуст.")
+        self.hosts = [OllamaHost(url) for url in hosts]
+        self.session = session or requests.Session()
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _get_json(self, host, path):
+        response = self.session.get(f"{host.base_url}{path}", timeout=self.check_timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _fetch_models(self, host, path):
+        details = self._get_json(host, path).get("models", [])
+        return {normalize_model_name(m.get("model") or m.get("name", "")) for m in details}, details
+
+    def check_host(self, host):
+        """
+        Обновляет состояние сервера: доступность, версию, установленные и загруженные модели.
+        """
+        try:
+            models, details = self._fetch_models(host, "/api/tags")
+            try:
+                running, _ = self._fetch_models(host, "/api/ps")
+            except requests.RequestException:
+                # /api/ps есть не во всех версиях Ollama
+                running = set()
+            try:
+                version = self._get_json(host, "/api/version").get("version")
+            except (requests.RequestException, ValueError):
+                version = None
+            with self._lock:
+                host.models = models
+                host.model_details = details
+                host.running_models = running
+                host.version = version
+                if not host.healthy:
+                    logger.info(f"Сервер Ollama {host.base_url} снова доступен.")
+                host.healthy = True
+                host.last_error = None
+                host.checked_at = time.time()
+        except (requests.RequestException, ValueError) as e:
+            with self._lock:
+                if host.healthy:
+                    logger.warning(f"Сервер Ollama {host.base_url} недоступен: {e}")
+                host.healthy = False
+                host.last_error = str(e)
+                host.checked_at = time.time()
+
+    def refresh(self):
+        """
+        Проверяет все серверы пула.
+        """
+        for host in self.hosts:
+            self.check_host(host)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.refresh()
+            self._stop_event.wait(self.check_interval)
+
+    def start(self):
+        """
+        Запускает фоновую проверку серверов (однократно).
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ollama-pool-health", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def select(self, model):
+        """
+        Выбирает сервер для модели. Вызывается под блокировкой.
+        Среди исправных серверов с моделью берётся наименее загруженный;
+        при равной нагрузке предпочитается сервер, где модель уже в памяти.
+        """
+        healthy = [h for h in self.hosts if h.healthy] or self.hosts
+        candidates = [h for h in healthy if h.has_model(model)]
+        if not candidates:
+            logger.warning(f"Модель {model} не найдена ни на одном исправном сервере Ollama.")
+            candidates = healthy
+        name = normalize_model_name(model)
+        return min(candidates, key=lambda h: (h.outstanding, name not in h.running_models))
+
+    @contextmanager
+    def acquire(self, model):
+        """
+        Резервирует сервер на время запроса и возвращает его базовый URL.
+        """
+        with self._lock:
+            host = self.select(model)
+            host.outstanding += 1
+        try:
+            yield host.base_url
+        except requests.ConnectionError as e:
+            self.mark_unhealthy(host.base_url, e)
+            raise
+        finally:
+            with self._lock:
+                host.outstanding -= 1
+
+    def mark_unhealthy(self, base_url, error=None):
+        """
+        Исключает сервер из маршрутизации до следующей успешной проверки.
+        """
+        with self._lock:
+            for host in self.hosts:
+                if host.base_url == base_url.rstrip("/"):
+                    host.healthy = False
+                    host.last_error = str(error) if error else None
+                    logger.warning(f"Сервер Ollama {host.base_url} исключён из пула: {error}")
+
+    def list_models(self):
+        """
+        Возвращает отсортированный список моделей со всех исправных серверов.
+        """
+        with self._lock:
+            models = set()
+            for host in self.hosts:
+                if host.healthy:
+                    models |= host.models
+        return sorted(models)
+
+    def status(self):
+        """
+        Снимок состояния серверов для вывода пользователю.
+        """
+        with self._lock:
+            return [
+                {
+                    "base_url": h.base_url,
+                    "healthy": h.healthy,
+                    "models": sorted(h.models),
+                    "model_details": list(h.model_details),
+                    "running_models": sorted(h.running_models),
+                    "version": h.version,
+                    "outstanding": h.outstanding,
+                    "last_error": h.last_error,
+                    "checked_at": h.checked_at,
+                }
+                for h in self.hosts
+            ]
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/page_fetcher.py
+# ==================================================
+# Загрузка страниц из результатов поиска и извлечение текста
+# Версия: 1.1.1
+# - Параллельная загрузка первых PAGE_FETCH_TOP_N страниц.
+# - Ограничение одновременных соединений к одному хосту; семафор хоста
+#   хранится, только пока к хосту идут загрузки.
+# - Общий срок на весь этап и предельный размер страницы.
+# - Извлечение основного текста и нарезка на фрагменты (passages)
+#   для этапа synthesis.
+# - HTTP-сессии берутся из общей фабрики agents/http_sessions.py.
+# ==================================================
+
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+import requests
+
+from settings import (
+    PAGE_FETCH_TOP_N,
+    PAGE_FETCH_DEADLINE,
+    PAGE_FETCH_MAX_BYTES,
+    PAGE_FETCH_PER_HOST,
+    PAGE_FETCH_WORKERS,
+    PAGE_PASSAGE_WORDS,
+    PAGE_MAX_PASSAGES,
+)
+from agents.http_sessions import get_session_factory, tor_route
+
+logger = logging.getLogger(__name__)
+
+# Содержимое этих элементов не относится к основному тексту страницы
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "button"}
+# Элементы, на границах которых заканчивается абзац
+BLOCK_TAGS = {
+    "p", "div", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "article", "main", "section",
+    "blockquote", "pre", "td", "tr", "table", "br", "dd", "dt",
+}
+# Короткие строки (меню, подписи, кнопки) в основной текст не попадают
+MIN_BLOCK_CHARS = 40
+CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+class TextExtractor(HTMLParser):
+    """
+    Собирает абзацы текста страницы. Если на странице есть <article> или <main>,
+    берутся только абзацы внутри них.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.title = ""
+        self.blocks = []
+        self._buffer = []
+        self._skip_depth = 0
+        self._main_depth = 0
+        self._in_title = False
+
+    def _flush(self):
+        text = " ".join("".join(self._buffer).split())
+        self._buffer = []
+        if len(text) >= MIN_BLOCK_CHARS:
+            self.blocks.append((text, self._main_depth > 0))
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            if tag in ("article", "main"):
+                self._main_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            if tag in ("article", "main"):
+                self._main_depth = max(0, self._main_depth - 1)
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self._buffer.append(data)
+
+    def text(self):
+        self._flush()
+        main_blocks = [text for text, in_main in self.blocks if in_main]
+        return "\n".join(main_blocks or [text for text, _ in self.blocks])
+
+
+def extract_text(html):
+    """
+    Возвращает (заголовок, основной текст) HTML-страницы.
+    """
+    parser = TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:  # разметка реальных страниц бывает сколь угодно сломанной
+        logger.debug(f"Ошибка разбора HTML: {e}")
+    return " ".join(parser.title.split()), parser.text()
+
+
+def split_passages(text, words=PAGE_PASSAGE_WORDS, max_passages=PAGE_MAX_PASSAGES):
+    """
+    Делит текст на фрагменты примерно по words слов, не разрывая абзацы без нужды.
+    """
+    passages = []
+    current = []
+    for paragraph in text.split("\n"):
+        paragraph_words = paragraph.split()
+        while paragraph_words:
+            room = words - len(current)
+            current.extend(paragraph_words[:room])
+            paragraph_words = paragraph_words[room:]
+            if len(current) >= words:
+                passages.append(" ".join(current))
+                current = []
+        if len(current) >= words // 2:
+            passages.append(" ".join(current))
+            current = []
+        if len(passages) >= max_passages:
+            return passages[:max_passages]
+    if current:
+        passages.append(" ".join(current))
+    return passages[:max_passages]
+
+
+class PageFetcher:
+    """
+    Загружает страницы параллельно в пределах общего срока.
+
+    Соединения к одному хосту ограничены PAGE_FETCH_PER_HOST, чтобы не
+    получить отказ от сайта; ответ читается потоком и обрезается по
+    PAGE_FETCH_MAX_BYTES. Страницы, не успевшие загрузиться к сроку,
+    пропускаются — этап занимает не дольше deadline секунд.
+    """
+
+    def __init__(self, workers=PAGE_FETCH_WORKERS, per_host=PAGE_FETCH_PER_HOST,
+                 max_bytes=PAGE_FETCH_MAX_BYTES, sessions=None):
+        self.workers = workers
+        self.per_host = per_host
+        self.max_bytes = max_bytes
+        self.sessions = sessions or get_session_factory()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+        # {хост: [семафор, число загрузок]}; запись удаляется после последней
+        # загрузки, иначе за долгий сеанс словарь растёт с каждым новым сайтом
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def _enter_host(self, host):
+        with self._lock:
+            entry = self._host_limits.setdefault(host, [threading.BoundedSemaphore(self.per_host), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _leave_host(self, host):
+        with self._lock:
+            entry = self._host_limits[host]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._host_limits[host]
+
+    def fetch(self, url, deadline, use_tor=False):
+        """
+        Загружает одну страницу и возвращает её HTML или None.
+        """
+        host = urlsplit(url).hostname or ""
+        limit = self._enter_host(host)
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not limit.acquire(timeout=remaining):
+                return None
+            try:
+                return self._download(url, deadline, use_tor)
+            finally:
+                limit.release()
+        finally:
+            self._leave_host(host)
+
+    def _download(self, url, deadline, use_tor):
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            session = self.sessions.get(tor_route(use_tor))
+            with session.get(url, stream=True, timeout=(min(5, remaining), remaining)) as response:
+                content_type = response.headers.get("Content-Type", "")
+                if response.status_code != 200 or not content_type.startswith(("text/html", "text/plain")):
+                    logger.debug(f"Страница пропущена ({response.status_code}, {content_type}): {url}")
+                    return None
+                data = bytearray()
+                for chunk in response.iter_content(chunk_size=16384):
+                    data.extend(chunk)
+                    if len(data) >= self.max_bytes or time.monotonic() > deadline:
+                        break
+                return decode_html(bytes(data[:self.max_bytes]), response)
+        except requests.RequestException as e:
+            logger.debug(f"Не удалось загрузить {url}: {e}")
+            return None
+
+    def fetch_passages(self, results, top_n=PAGE_FETCH_TOP_N, deadline=PAGE_FETCH_DEADLINE, use_tor=False):
+        """
+        Загружает страницы первых top_n результатов и возвращает фрагменты текста:
+        список {"url", "title", "text"} в порядке результатов и фрагментов на странице.
+        """
+        urls = [r["url"] for r in results if isinstance(r, dict) and r.get("url")][:top_n]
+        if not urls:
+            return []
+        started_at = time.monotonic()
+        end = started_at + deadline
+        futures = [self._executor.submit(self.fetch, url, end, use_tor) for url in urls]
+        wait(futures, timeout=deadline)
+
+        passages = []
+        fetched = 0
+        for url, future in zip(urls, futures):
+            if not future.done() or future.result() is None:
+                continue
+            fetched += 1
+            title, text = extract_text(future.result())
+            passages.extend({"url": url, "title": title, "text": passage} for passage in split_passages(text))
+        logger.info(
+            f"Загружено страниц: {fetched}/{len(urls)} за {time.monotonic() - started_at:.2f} с, "
+            f"фрагментов текста: {len(passages)}"
+        )
+        return passages
+
+
+def decode_html(data, response):
+    """
+    Декодирует страницу по кодировке из заголовка или <meta charset>, иначе UTF-8.
+    """
+    encoding = None
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        encoding = response.encoding
+    else:
+        match = CHARSET_RE.search(data[:4096])
+        if match:
+            encoding = match.group(1).decode("ascii", "ignore")
+    try:
+        return data.decode(encoding or "utf-8", errors="replace")
+    except LookupError:
+        return data.decode("utf-8", errors="replace")
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_page_fetcher():
+    """
+    Возвращает общий для процесса экземпляр PageFetcher.
+    """
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = PageFetcher()
+    return _fetcher
+
+
+def fetch_passages(results, use_tor=False, **kwargs):
+    """
+    Фрагменты текста страниц из результатов поиска (см. PageFetcher.fetch_passages).
+    """
+    return get_page_fetcher().fetch_passages(results, use_tor=use_tor, **kwargs)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/passage_ranker.py
+# ==================================================
+# Ранжирование фрагментов страниц по BM25
+# Версия: 1.0.0
+# - Индекс строится в памяти на каждый запрос пользователя.
+# - Частоты терминов хранятся в матрице NumPy (фрагменты × словарь),
+#   оценки всех фрагментов по всем запросам — одним матричным произведением.
+# - Отбор лучших фрагментов в пределах бюджета токенов.
+# ==================================================
+
+import logging
+import re
+
+import numpy as np
+
+from settings import PAGE_PASSAGE_TOKEN_BUDGET
+from agents.context_packer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Грубая замена стемминга: слова обрезаются до первых STEM_LENGTH букв,
+# чтобы "доллара", "долларов" и "доллар" совпадали
+STEM_LENGTH = 6
+
+
+def tokenize(text):
+    """
+    Разбивает текст на термины: нижний регистр, без однобуквенных слов, с обрезкой окончаний.
+    """
+    return [token[:STEM_LENGTH] for token in TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+
+class BM25Index:
+    """
+    Индекс BM25 по списку текстов.
+
+    term_freqs — матрица float32 размером (число текстов × размер словаря);
+    weights — вклад каждого термина в оценку каждого текста с учётом idf
+    и нормализации по длине, так что оценка запроса — это weights @ query.
+    """
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        tokenized = [tokenize(text) for text in texts]
+        self.vocabulary = {}
+        doc_ids = []
+        term_ids = []
+        for doc_id, tokens in enumerate(tokenized):
+            for token in tokens:
+                doc_ids.append(doc_id)
+                term_ids.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+
+        self.term_freqs = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        np.add.at(self.term_freqs, (np.array(doc_ids, dtype=np.intp), np.array(term_ids, dtype=np.intp)), 1.0)
+
+        lengths = self.term_freqs.sum(axis=1)
+        avg_length = lengths.mean() if len(texts) else 0.0
+        doc_freqs = (self.term_freqs > 0).sum(axis=0)
+        self.idf = np.log1p((len(texts) - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+        norm = k1 * (1 - b + b * lengths / avg_length) if avg_length else np.full(len(texts), k1)
+        self.weights = self.term_freqs * (k1 + 1) / (self.term_freqs + norm[:, None]) * self.idf
+
+    def query_matrix(self, queries):
+        """
+        Матрица (словарь × число запросов) с частотами терминов запросов;
+        термины вне словаря индекса отбрасываются.
+        """
+        matrix = np.zeros((len(self.vocabulary), len(queries)), dtype=np.float32)
+        for column, query in enumerate(queries):
+            for token in tokenize(query):
+                row = self.vocabulary.get(token)
+                if row is not None:
+                    matrix[row, column] += 1.0
+        return matrix
+
+    def scores(self, queries):
+        """
+        Оценки BM25 каждого текста по набору запросов (сумма по запросам).
+        """
+        if not self.vocabulary or not queries:
+            return np.zeros(self.term_freqs.shape[0], dtype=np.float32)
+        return (self.weights @ self.query_matrix(queries)).sum(axis=1)
+
+
+def rank_passages(passages, queries):
+    """
+    Сортирует фрагменты {"url", "title", "text"} по убыванию оценки BM25.
+    Возвращает список пар (оценка, фрагмент).
+    """
+    if not passages:
+        return []
+    index = BM25Index([f"{p.get('title', '')} {p['text']}" for p in passages])
+    scores = index.scores(queries)
+    order = np.argsort(-scores, kind="stable")
+    return [(float(scores[i]), passages[i]) for i in order]
+
+
+def select_passages(passages, queries, budget_tokens=PAGE_PASSAGE_TOKEN_BUDGET):
+    """
+    Отбирает лучшие по BM25 фрагменты, пока они помещаются в budget_tokens.
+    Фрагменты без общих с запросами терминов отбрасываются.
+    """
+    selected = []
+    used = 0
+    for score, passage in rank_passages(passages, queries):
+        if score <= 0:
+            break
+        cost = estimate_tokens(passage["text"])
+        if used + cost > budget_tokens:
+            continue
+        selected.append(passage)
+        used += cost
+    logger.info(f"Отобрано фрагментов по BM25: {len(selected)}/{len(passages)} (~{used} токенов)")
+    return selected
@@ -2,7 +2,7 @@
 # LLMCAN/agents/preprocess_query.py
 # ==================================================
 # Модуль для обработки пользовательских запросов
-# Версия: 1.0.1
+# Версия: 1.5.3
 # ==================================================
 
 import os
@@ -21,11 +21,14 @@ import socks
 import pprint
 import readline
 
-from settings import BASE_DIR, LOGGING_CONFIG
+from settings import BASE_DIR, LOGGING_CONFIG, LLM_STREAM_OUTPUT, LLM_STAGES
 from agents.install_tor import restart_tor_and_check_ddgr
 from colors import Colors
-from agents.data_management import save_dialog_history, load_dialog_history
-from agents.show_info_cognitive_interface_agent_v2 import show_info
+from agents.data_management import finalize_history_saving, search_dialog_history
+from agents.llm_client import get_llm_client, generate_stage
+from cognitive_logic import print_message_stream, finish_message_stream
+from agents.show_info_cognitive_interface_agent_v2 import show_info, check_tor_service, check_tor_ip
+from agents.health_monitor import get_health_monitor, snapshot_age
 
 # === Настройка логирования ===
 logging.config.dictConfig(LOGGING_CONFIG)
@@ -35,10 +38,13 @@ logger = logging.getLogger(__name__)
 # Хорошо понимают поисковые результаты от ggdr
 # MODEL = "llama3:latest"
 # deepseek-r1:14b
-MODEL = "deepseek-r1:14b"
 #MODEL = "gemma:7b"
 # Слабые ответы:
 # MODEL = "qwen2:7b"
+# Переформулировка запроса — отдельный этап с быстрой моделью и бюджетом времени,
+# см. settings.LLM_STAGES["rewrite"] (LLMCAN_REWRITE_MODEL, по умолчанию llama3:latest).
+# Здесь — основная модель этапа.
+MODEL = LLM_STAGES["rewrite"][0][0]
 LOG_DIR = BASE_DIR / 'logs'
 ENV_FILE = Path(".env")
 
@@ -67,6 +73,8 @@ def show_help():
     print(f"  {Colors.CYAN}/DEBUG, /INFO, /ERROR{Colors.RESET} - установить уровень логирования")
     print(f"  {Colors.CYAN}/log, /l{Colors.RESET} - показать текущий уровень логирования")
     print(f"  {Colors.CYAN}/show, .покажи{Colors.RESET} - показать информацию о системе и текущих режимах")
+    print(f"  {Colors.CYAN}/show test, .покажи тест{Colors.RESET} - то же и тестовый запрос к модели (до минуты)")
+    print(f"  {Colors.CYAN}/history, /hs <текст>{Colors.RESET} - найти текст в истории диалогов")
     print(f"  {Colors.CYAN}/exit, /q{Colors.RESET} - выйти из программы")
     print(f"{Colors.CYAN}Для ввода запроса нажмите Enter.{Colors.RESET}")
 
@@ -108,6 +116,12 @@ def handle_command(command, use_tor):
         # Показать текущий статус TOR
         status = "включен" if use_tor else "выключен"
         print(f"Режим опроса через TOR: {status}")
+        # Состояние TOR — из снимка фоновой проверки, без обращения к сети
+        snapshot = get_health_monitor().snapshot()
+        print(f"Сервис TOR: {check_tor_service(snapshot)}")
+        print(f"Выходной IP: {check_tor_ip(snapshot)}")
+        if snapshot:
+            print(f"{Colors.GRAY}Проверено {snapshot_age(snapshot):.0f} с назад.{Colors.RESET}")
 
     elif command in ["/tn", ".ет", ".тв", ".твк", ".твкл"]:
         # Включение TOR
@@ -154,15 +168,29 @@ def handle_command(command, use_tor):
 
     elif command in ["/exit", "/q", ".й", ".в", ".выход", ".учше"]:
         # Выход из программы
-        save_dialog_history(load_dialog_history())
+        finalize_history_saving()
         print(f"{Colors.GREEN}Сеанс завершен.{Colors.RESET}")
         sys.exit()
 
-    elif command in ["/show", "/view", "/s", ".мшуц",".покажи", ".п", ".покаж", ".ырщц"]:
-        # Показать дополнительную информацию о системе
+    elif command.split(maxsplit=1)[0] in ["/show", "/view", "/s", ".мшуц",".покажи", ".п", ".покаж", ".ырщц"]:
+        # Показать дополнительную информацию о системе; "/show test" — с тестовым запросом к модели
         from agents.show_info_cognitive_interface_agent_v2 import show_info
         log_level = logging.getLevelName(logger.level)
-        show_info(use_tor, log_level)
+        argument = command.split(maxsplit=1)[1] if " " in command else ""
+        show_info(use_tor, log_level, test_query=argument in ["test", "тест", "еуые"])
+
+    elif command.split(maxsplit=1)[0] in ["/history", "/hs", ".история"]:
+        # Полнотекстовый поиск по всей истории диалогов агента
+        text = command.split(maxsplit=1)[1] if " " in command else ""
+        if not text:
+            print(f"{Colors.YELLOW}Укажите текст для поиска: /history <текст>{Colors.RESET}")
+        else:
+            matches = search_dialog_history(text)
+            if not matches:
+                print(f"{Colors.YELLOW}В истории ничего не найдено.{Colors.RESET}")
+            for match in matches:
+                created_at = datetime.fromtimestamp(match["created_at"]).strftime("%Y-%m-%d %H:%M")
+                print(f"{Colors.GRAY}{created_at} {match['role']}:{Colors.RESET} {match['snippet']}")
 
     else:
         print(f"{Colors.RED}Неизвестная команда: {command}{Colors.RESET}")
@@ -198,39 +226,22 @@ def preprocess_user_query(user_input):
     return user_input_with_datetime
 
 
-def query_llm(prompt, include_history=True):
+def query_llm(prompt, include_history=True, stream=LLM_STREAM_OUTPUT):
     """
-    Выполняет запрос к LLM и возвращает отфильтрованный ответ.
+    Выполняет запрос этапа переформулировки к LLM и возвращает ответ.
+    При stream=True ответ выводится в консоль по мере генерации.
+    Если модели этапа не уложились в бюджет времени, возвращает None.
     """
-    current_datetime = get_current_datetime()
-    payload = {
-        "model": MODEL,
-        "prompt": prompt,
-        "stream": False
-    }
-
+    on_token = print_message_stream("Анализ запроса") if stream else None
     try:
-        from settings import LLM_API_GENERATE
-
-        response = requests.post(LLM_API_GENERATE, json=payload, timeout=70)
-        response.raise_for_status()
-
-        # Декодируем JSON и фильтруем данные
-        response_data = response.json()
-        filtered_response = {
-            "response": response_data.get("response", "<Нет ответа>"),
-            "done_reason": response_data.get("done_reason", "Неизвестно")
-        }
+        response = generate_stage("rewrite", prompt, stream=stream, on_token=on_token)
+    finally:
+        if stream:
+            finish_message_stream(get_llm_client().last_stats)
 
-        logger.debug(f"Фильтрованный ответ от LLM: {filtered_response}")
-        logger.info(f"Ответ модели: {response_data.get('response', '<Нет ответа>')}")
-        return response_data.get("response", "<Нет ответа>")
-    except requests.RequestException as e:
-        logger.error(f"Ошибка запроса к модели: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        logger.error(f"Ошибка декодирования JSON: {e}")
-        return None
+    if response is not None:
+        logger.info(f"Ответ модели: {response}")
+    return response
 
 
 
@@ -239,11 +250,12 @@ from datetime import datetime
 def preprocess_query(user_input):
     print(f"{Colors.YELLOW}Запрос пользователя получен. Начинаю анализ и формирование поисковых запросов...{Colors.RESET}")
 
-    # Получаем текущую дату и время
-    current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # Для анализа запроса достаточно даты: со временем промпт менялся бы каждую
+    # минуту, и повторы того же запроса не попадали бы в кэш ответов LLM.
+    current_date = datetime.now().strftime("%Y-%m-%d")
 
     # Системная инструкция модели с учётом текущей даты и времени
-    system_prompt = f"""Проанализируй запрос пользователя, исправь возможные ошибки и сформулируй до трех связанных поисковых запросов для расширения контекста, при этом ориентируясь в текущем времени и дате, которая получена тобой на ввод. Текущие время: {current_datetime}. Учитывай их при анализе запроса пользователя и отталкивайся от этих данных при составлении инструкций. Также в отдельной секции создай инструкцию для обработки результатов поиска "Инструкция для обработки данных для LLM модели".
+    system_prompt = f"""Проанализируй запрос пользователя, исправь возможные ошибки и сформулируй до трех связанных поисковых запросов для расширения контекста, при этом ориентируясь в текущей дате, которая получена тобой на ввод. Текущая дата: {current_date}. Учитывай её при анализе запроса пользователя и отталкивайся от этих данных при составлении инструкций. Также в отдельной секции создай инструкцию для обработки результатов поиска "Инструкция для обработки данных для LLM модели".
 
 Формат ответа:
 Основной запрос: [исправленный запрос пользователя]
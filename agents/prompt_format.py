@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/prompt_format.py
+# ==================================================
+# Компактное представление результатов поиска в промпте
+# Версия: 1.0.0
+# - Нумерованный текст вместо JSON с отступами: только заголовок,
+#   ссылка и укороченная аннотация, без имён полей, скобок и кавычек.
+# - Оценка экономии токенов относительно json.dumps(..., indent=2).
+# ==================================================
+
+import json
+import logging
+
+from agents.context_packer import (
+    MAX_ABSTRACT_TOKENS,
+    estimate_tokens,
+    flatten_results,
+    trim_to_tokens,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def format_result(number, result, max_abstract_tokens=MAX_ABSTRACT_TOKENS):
+    """
+    Один результат в виде:
+        1. Заголовок
+        https://example.com/page
+        Аннотация…
+    """
+    lines = [f"{number}. {result.get('title') or 'Без заголовка'}"]
+    if result.get("url"):
+        lines.append(result["url"])
+    abstract = trim_to_tokens(" ".join(str(result.get("abstract") or "").split()), max_abstract_tokens)
+    if abstract:
+        lines.append(abstract)
+    return "\n".join(lines)
+
+
+def format_results(results, max_abstract_tokens=MAX_ABSTRACT_TOKENS):
+    """
+    Нумерованный список результатов поиска для промпта.
+    Принимает как плоский список, так и список списков по запросам.
+    """
+    return "\n\n".join(
+        format_result(number, result, max_abstract_tokens)
+        for number, result in enumerate(flatten_results(results), 1)
+    )
+
+
+def token_savings(results, text):
+    """
+    Возвращает (токены в JSON с отступами, токены в компактном виде).
+    """
+    json_tokens = estimate_tokens(json.dumps(flatten_results(results), ensure_ascii=False, indent=2))
+    return json_tokens, estimate_tokens(text)
+
+
+def serialize_results(results, max_abstract_tokens=MAX_ABSTRACT_TOKENS):
+    """
+    Форматирует результаты для промпта и пишет в лог экономию токенов.
+    """
+    text = format_results(results, max_abstract_tokens)
+    json_tokens, compact_tokens = token_savings(results, text)
+    if json_tokens:
+        logger.info(
+            f"Результаты поиска в промпте: ~{compact_tokens} токенов вместо ~{json_tokens} в JSON "
+            f"(экономия {100 * (json_tokens - compact_tokens) / json_tokens:.0f}%)"
+        )
+    return text
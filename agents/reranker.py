@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/reranker.py
+# ==================================================
+# Переранжирование результатов поиска по эмбеддингам Ollama
+# Версия: 1.0.0
+# - Эмбеддинги запросов и аннотаций результатов через /api/embed пакетами.
+# - Косинусная близость одним матричным произведением NumPy.
+# - Повторно встречающиеся тексты берутся из кэша agents/embedding_cache.py.
+# - Включается settings.RERANK_ENABLED; при ошибке порядок не меняется.
+# ==================================================
+
+import logging
+import threading
+import time
+
+import numpy as np
+
+from settings import EMBED_MODEL, EMBED_BATCH_SIZE, RERANK_ENABLED
+from agents.embedding_cache import EmbeddingCache, content_hash
+from agents.llm_client import embed_texts
+
+logger = logging.getLogger(__name__)
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model=EMBED_MODEL):
+    with _caches_lock:
+        if model not in _caches:
+            _caches[model] = EmbeddingCache(model)
+        return _caches[model]
+
+
+def embed_with_cache(texts, model=EMBED_MODEL, batch_size=EMBED_BATCH_SIZE):
+    """
+    Возвращает матрицу эмбеддингов (float32, len(texts) × dim) или None при ошибке.
+    В Ollama отправляются только тексты, которых нет в кэше.
+    """
+    cache = get_embedding_cache(model)
+    keys = [content_hash(text) for text in texts]
+    found = cache.get_many(keys)
+    missing = list({key: text for key, text in zip(keys, texts) if key not in found}.items())
+    if missing:
+        vectors = embed_texts([text for _, text in missing], model, batch_size=batch_size)
+        if vectors is None:
+            return None
+        cache.add_many([key for key, _ in missing], vectors)
+        found.update({key: np.asarray(vector, dtype=np.float32) for (key, _), vector in zip(missing, vectors)})
+    logger.debug(f"Эмбеддинги: {len(texts)} текстов, из кэша {len(texts) - len(missing)}")
+    return np.vstack([found[key] for key in keys])
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def rerank_results(results, queries, model=EMBED_MODEL):
+    """
+    Упорядочивает результаты поиска по косинусной близости их заголовка
+    и аннотации к ближайшему из запросов. Если эмбеддинги получить не удалось,
+    возвращает результаты в исходном порядке.
+    """
+    candidates = [r for r in results if isinstance(r, dict)]
+    if not RERANK_ENABLED or not candidates or not queries:
+        return results
+
+    started_at = time.monotonic()
+    texts = [f"{r.get('title', '')}\n{r.get('abstract', '')}" for r in candidates]
+    matrix = embed_with_cache(list(queries) + texts, model)
+    if matrix is None:
+        logger.warning("Переранжирование пропущено: эмбеддинги недоступны.")
+        return results
+
+    matrix = normalize_rows(matrix)
+    query_vectors, candidate_vectors = matrix[:len(queries)], matrix[len(queries):]
+    scores = (candidate_vectors @ query_vectors.T).max(axis=1)
+    order = np.argsort(-scores, kind="stable")
+    logger.info(f"Переранжировано результатов: {len(candidates)} за {time.monotonic() - started_at:.2f} с")
+    return [candidates[i] for i in order]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/result_fusion.py
+# ==================================================
+# Объединение результатов поиска по нескольким запросам
+# Версия: 1.0.0
+# - Нормализация URL: хост в нижнем регистре, без фрагмента,
+#   трекинговых параметров и завершающего "/".
+# - Устранение дубликатов по нормализованному URL.
+# - Reciprocal Rank Fusion (RRF) и отбор лучших SEARCH_TOP_K результатов.
+# ==================================================
+
+import logging
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from settings import SEARCH_TOP_K, SEARCH_RRF_K
+
+logger = logging.getLogger(__name__)
+
+# Параметры, которые не меняют содержимое страницы
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "yclid", "msclkid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "igshid", "ref", "ref_src", "spm", "from", "rut",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """
+    Приводит URL к каноническому виду для сравнения.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def fuse_results(result_lists, top_k=SEARCH_TOP_K, k=SEARCH_RRF_K):
+    """
+    Объединяет ранжированные списки результатов (по одному на запрос).
+
+    Каждый результат получает сумму 1 / (k + ранг) по всем спискам, где встречается
+    его нормализованный URL: страницы, найденные несколькими запросами, поднимаются
+    выше. Из дубликатов остаётся запись с самой длинной аннотацией.
+    Возвращает не более top_k результатов по убыванию оценки.
+    """
+    scores = {}
+    best = {}
+    order = []
+    total = 0
+    for results in result_lists:
+        for rank, result in enumerate(results or [], 1):
+            if not isinstance(result, dict) or not result.get("url"):
+                continue
+            total += 1
+            key = normalize_url(result["url"])
+            if key not in scores:
+                scores[key] = 0.0
+                order.append(key)
+                best[key] = result
+            elif len(result.get("abstract", "")) > len(best[key].get("abstract", "")):
+                best[key] = result
+            scores[key] += 1.0 / (k + rank)
+
+    # sorted устойчива: при равной оценке сохраняется порядок первого появления
+    ranked = sorted(order, key=lambda key: scores[key], reverse=True)[:top_k]
+    logger.info(f"Объединение результатов: {total} → {len(scores)} уникальных, отобрано {len(ranked)}")
+    return [best[key] for key in ranked]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/retry_policy.py
+# ==================================================
+# Политика повторных попыток для поиска
+# Версия: 1.0.0
+# - Экспоненциальная задержка со случайным разбросом (full jitter).
+# - Общий срок на все попытки одного запроса.
+# - Разное поведение по классу ошибки: пустой результат не повторяется,
+#   ошибка разбора повторяется один раз, смена цепочки TOR — только
+#   при ограничении частоты запросов.
+# ==================================================
+
+import logging
+import random
+import time
+
+from settings import (
+    SEARCH_QUERY_TIMEOUT,
+    SEARCH_RETRY_ATTEMPTS,
+    SEARCH_RETRY_BASE_DELAY,
+    SEARCH_RETRY_MAX_DELAY,
+)
+from agents.search_backends import SearchDecodeError, SearchNetworkError, SearchRateLimited
+
+logger = logging.getLogger(__name__)
+
+# Классы ошибок поиска
+RATE_LIMITED = "rate_limited"
+NETWORK = "network"
+EMPTY = "empty"
+DECODE = "decode"
+
+
+def classify_error(error):
+    """
+    Определяет класс ошибки поиска.
+    """
+    if isinstance(error, SearchRateLimited):
+        return RATE_LIMITED
+    if isinstance(error, SearchDecodeError):
+        return DECODE
+    if isinstance(error, SearchNetworkError):
+        return NETWORK
+    return None
+
+
+class RetryPolicy:
+    """
+    Выполняет функцию поиска с повторами по классу ошибки.
+
+    - network:      повтор с экспоненциальной задержкой;
+    - rate_limited: вызов on_rate_limit (смена цепочки TOR) и повтор
+                    с увеличенной задержкой (rate_limit_factor);
+    - decode:       не более одного повтора — обычно это сбойный ответ;
+    - empty:        без повторов, ответ поисковика не изменится;
+    - прочие исключения не повторяются и пробрасываются.
+
+    Все попытки укладываются в deadline секунд от первого вызова.
+    """
+
+    def __init__(self, max_attempts=SEARCH_RETRY_ATTEMPTS, base_delay=SEARCH_RETRY_BASE_DELAY,
+                 max_delay=SEARCH_RETRY_MAX_DELAY, deadline=SEARCH_QUERY_TIMEOUT,
+                 on_rate_limit=None, rate_limit_factor=4):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.on_rate_limit = on_rate_limit
+        self.rate_limit_factor = rate_limit_factor
+
+    def backoff(self, attempt, kind=None):
+        """
+        Задержка перед попыткой attempt + 1: случайная в [0, base * 2^(attempt-1)].
+        """
+        base = self.base_delay * (self.rate_limit_factor if kind == RATE_LIMITED else 1)
+        return random.uniform(0, min(self.max_delay, base * 2 ** (attempt - 1)))
+
+    def call(self, search_fn, query, *args, **kwargs):
+        """
+        Выполняет search_fn(query, ...) и возвращает список результатов
+        ([] — если ничего не найдено) или None, если все попытки исчерпаны.
+        """
+        started_at = time.monotonic()
+        decode_errors = 0
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                results = search_fn(query, *args, **kwargs)
+                if not results:
+                    logger.warning(f"Пустой результат для запроса: {query} (без повтора)")
+                    return []
+                return results
+            except Exception as e:
+                kind = classify_error(e)
+                if kind is None:
+                    raise
+                logger.warning(f"Запрос '{query}', попытка {attempt}/{self.max_attempts}: {kind}: {e}")
+                if kind == DECODE:
+                    decode_errors += 1
+                    if decode_errors > 1:
+                        break
+                if kind == RATE_LIMITED and self.on_rate_limit:
+                    self.on_rate_limit()
+
+            if attempt == self.max_attempts:
+                break
+            delay = self.backoff(attempt, kind)
+            if time.monotonic() - started_at + delay > self.deadline:
+                logger.warning(f"Запрос '{query}': повтор не укладывается в срок {self.deadline} с")
+                break
+            time.sleep(delay)
+
+        logger.error(f"Не удалось найти информацию по запросу: {query}")
+        return None
+
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/search_backends.py
+# ==================================================
+# Поисковые бэкенды агентов LLMCAN
+# Версия: 1.4.4
+# - Общий интерфейс: search(query, use_tor) -> список {"title", "url", "abstract"};
+#   базовый класс SearchBackend абстрактный, подклассы обязаны реализовать _search().
+# - Ошибки поиска классифицируются исключениями SearchError: ограничение
+#   частоты, сетевая ошибка, ошибка разбора ответа (см. agents/retry_policy.py).
+# - ddgr: поиск через подпроцесс ddgr (torsocks ddgr в режиме TOR).
+# - http: запрос к HTML-версии DuckDuckGo внутри процесса через
+#   requests.Session с пулом соединений; в режиме TOR — через SOCKS-прокси.
+#   ddgr остаётся внешним процессом, поэтому в режиме TOR запускается через torsocks.
+# - Выбор бэкенда: settings.SEARCH_BACKEND.
+# - В режиме TOR запросы распределяются по пулу изолированных цепочек
+#   (TorCircuitPool в agents/install_tor.py); заблокированные и медленные
+#   цепочки заменяются; предпочтение — быстрым и свободным цепочкам.
+#   Любая неудача запроса (не только сетевая) засчитывается цепочке.
+# - HTTP-сессии берутся из общей фабрики agents/http_sessions.py.
+# - Разбор выдачи: пустые элементы (<br>, <img>, <wbr>) не нарушают учёт
+#   вложенности тегов внутри заголовка и аннотации.
+# ==================================================
+
+import abc
+import json
+import logging
+import subprocess
+import threading
+import time
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urljoin, urlparse
+
+import requests
+
+from settings import (
+    SEARCH_BACKEND,
+    SEARCH_DDG_URL,
+    SEARCH_MAX_RESULTS,
+    SEARCH_QUERY_TIMEOUT,
+)
+from agents.install_tor import get_circuit_pool
+from agents.http_sessions import get_session_factory, tor_route
+
+logger = logging.getLogger(__name__)
+
+# Признаки ограничения частоты запросов в ответах DuckDuckGo и выводе ddgr
+RATE_LIMIT_MARKERS = ("HTTP Error 202", "HTTP Error 403", "HTTP Error 429", "Too Many Requests", "anomaly")
+
+
+class SearchError(Exception):
+    """Поиск не удался."""
+
+
+class SearchRateLimited(SearchError):
+    """Поисковик ограничил частоту запросов с текущего адреса."""
+
+
+class SearchNetworkError(SearchError):
+    """Сетевая ошибка или превышение времени ожидания."""
+
+
+class SearchDecodeError(SearchError):
+    """Ответ поисковика не удалось разобрать."""
+
+
+class SearchBackend(abc.ABC):
+    """
+    Базовый класс поискового бэкенда.
+
+    search() возвращает список результатов (пустой, если ничего не найдено)
+    или выбрасывает SearchError с указанием причины неудачи. Подклассы
+    реализуют _search(); в режиме TOR search() выбирает цепочку из пула
+    и сообщает пулу результат запроса.
+    """
+
+    name = "base"
+
+    def search(self, query, use_tor=False):
+        pool = get_circuit_pool() if use_tor else None
+        if pool is None:
+            return self._search(query, use_tor)
+        circuit = pool.acquire()
+        started_at = time.monotonic()
+        try:
+            results = self._search(query, use_tor, circuit)
+        except SearchRateLimited:
+            pool.report(circuit, ok=False, blocked=True)
+            raise
+        except Exception:
+            # Неразобранный ответ (SearchDecodeError) и непредвиденные ошибки —
+            # тоже неудача цепочки, иначе она остаётся в пуле как исправная
+            pool.report(circuit, ok=False)
+            raise
+        finally:
+            pool.release(circuit)
+        pool.report(circuit, ok=True, latency=time.monotonic() - started_at)
+        return results
+
+    @abc.abstractmethod
+    def _search(self, query, use_tor=False, circuit=None):
+        """
+        Выполняет запрос; circuit — цепочка TOR из пула (None вне режима TOR).
+        """
+
+    def close(self):
+        pass
+
+
+class DdgrBackend(SearchBackend):
+    """
+    Поиск через утилиту ddgr в отдельном процессе.
+    """
+
+    name = "ddgr"
+
+    def __init__(self, timeout=SEARCH_QUERY_TIMEOUT, max_results=SEARCH_MAX_RESULTS):
+        self.timeout = timeout
+        self.max_results = max_results
+
+    def _search(self, query, use_tor=False, circuit=None):
+        command = ["ddgr", "--json", "--num", str(self.max_results), query]
+        if use_tor:
+            # Учётные данные SOCKS цепочки изолируют процесс ddgr от других запросов
+            isolation = ["-a", circuit.host, "-P", str(circuit.port), "-u", circuit.username,
+                         "-p", circuit.password] if circuit else []
+            command = ["torsocks", *isolation, *command]
+        logger.debug(f"Выполняется команда поиска: {' '.join(command)}")
+        try:
+            output = subprocess.check_output(command, universal_newlines=True, stderr=subprocess.STDOUT,
+                                             timeout=self.timeout)
+        except subprocess.CalledProcessError as e:
+            if any(marker in (e.output or "") for marker in RATE_LIMIT_MARKERS):
+                raise SearchRateLimited(f"ddgr: {e.output.strip()}") from e
+            raise SearchNetworkError(f"Ошибка выполнения ddgr: {e}") from e
+        except subprocess.TimeoutExpired as e:
+            raise SearchNetworkError(f"Превышено время ожидания ddgr: {e}") from e
+        if "[ERROR]" in output:
+            if any(marker in output for marker in RATE_LIMIT_MARKERS):
+                raise SearchRateLimited(f"ddgr: {output.strip()}")
+            raise SearchNetworkError(f"ddgr вернул ошибку: {output.strip()}")
+        if not output.strip():
+            return []
+        try:
+            results = json.loads(output)
+        except json.JSONDecodeError as e:
+            raise SearchDecodeError(f"Ошибка декодирования JSON от ddgr: {e}") from e
+        return results if isinstance(results, list) else []
+
+
+# Элементы HTML без закрывающего тега (<br>, <img> и т.п.)
+VOID_ELEMENTS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+})
+
+
+class DuckDuckGoResultParser(HTMLParser):
+    """
+    Извлекает результаты из HTML-версии DuckDuckGo (html.duckduckgo.com/html/).
+    Заголовок и ссылка — элемент a.result__a, аннотация — элемент .result__snippet.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.results = []
+        self._field = None
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._field:
+            if tag in VOID_ELEMENTS:
+                # У пустых элементов нет закрывающего тега: глубину не меняем,
+                # а <br> разделяет слова
+                if tag == "br":
+                    self.results[-1][self._field] += " "
+                return
+            self._depth += 1
+            return
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if tag == "a" and "result__a" in classes:
+            self.results.append({"title": "", "url": unwrap_redirect(attrs.get("href", "")), "abstract": ""})
+            self._field = "title"
+        elif "result__snippet" in classes and self.results:
+            self._field = "abstract"
+
+    def handle_endtag(self, tag):
+        if not self._field or tag in VOID_ELEMENTS:
+            return
+        if self._depth:
+            self._depth -= 1
+        else:
+            self.results[-1][self._field] = " ".join(self.results[-1][self._field].split())
+            self._field = None
+
+    def handle_data(self, data):
+        if self._field:
+            self.results[-1][self._field] += data
+
+
+def unwrap_redirect(href):
+    """
+    Ссылки DuckDuckGo ведут через редирект //duckduckgo.com/l/?uddg=<url>;
+    возвращает исходный адрес.
+    """
+    parsed = urlparse(href)
+    if parsed.path.endswith("/l/"):
+        target = parse_qs(parsed.query).get("uddg")
+        if target:
+            return target[0]
+    return href
+
+
+class DuckDuckGoHTTPBackend(SearchBackend):
+    """
+    Поиск запросом к HTML-версии DuckDuckGo без запуска внешних процессов.
+
+    Сессии с пулом keep-alive соединений (напрямую, через TOR или через
+    цепочку пула) берутся из фабрики agents/http_sessions.py, поэтому повторные
+    поиски не платят за запуск интерпретатора и TLS-рукопожатие. Адрес
+    (settings.SEARCH_DDG_URL) можно направить на локальную заглушку
+    agents/ddg_standin_server.py.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url=SEARCH_DDG_URL, timeout=SEARCH_QUERY_TIMEOUT,
+                 max_results=SEARCH_MAX_RESULTS, sessions=None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_results = max_results
+        self.sessions = sessions or get_session_factory()
+
+    def _search(self, query, use_tor=False, circuit=None):
+        try:
+            session = self.sessions.get(tor_route(use_tor, circuit))
+            response = session.post(self.base_url, data={"q": query}, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise SearchNetworkError(f"Ошибка запроса к DuckDuckGo: {e}") from e
+        # DuckDuckGo отвечает 202/403/429 вместо результатов при ограничении частоты
+        if response.status_code in (202, 403, 429):
+            raise SearchRateLimited(f"DuckDuckGo вернул статус {response.status_code}")
+        if response.status_code != 200:
+            raise SearchNetworkError(f"DuckDuckGo вернул статус {response.status_code}")
+        parser = DuckDuckGoResultParser()
+        parser.feed(response.text)
+        if not parser.results and "anomaly" in response.text:
+            # Страница проверки на робота вместо выдачи
+            raise SearchRateLimited("DuckDuckGo запросил проверку на робота")
+        results = [
+            dict(r, url=urljoin(self.base_url, r["url"]))
+            for r in parser.results
+            if r["url"] and "/y.js" not in r["url"]  # рекламные блоки
+        ]
+        return results[:self.max_results]
+
+
+BACKENDS = {
+    DdgrBackend.name: DdgrBackend,
+    DuckDuckGoHTTPBackend.name: DuckDuckGoHTTPBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_search_backend(name=SEARCH_BACKEND):
+    """
+    Возвращает общий для процесса экземпляр бэкенда по имени.
+    """
+    with _backends_lock:
+        if name not in _backends:
+            if name not in BACKENDS:
+                raise ValueError(f"Неизвестный поисковый бэкенд: {name}. Доступны: {', '.join(BACKENDS)}")
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
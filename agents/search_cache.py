@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/search_cache.py
+# ==================================================
+# Дисковый кэш результатов поиска (SQLite)
+# Версия: 1.0.0
+# - Ключ: нормализованный текст запроса + режим TOR.
+# - Срок жизни записей (TTL) и ограничение числа записей (LRU).
+# ==================================================
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from settings import SEARCH_CACHE_ENABLED, SEARCH_CACHE_PATH, SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query):
+    """
+    Приводит запрос к каноническому виду: нижний регистр, без кавычек,
+    лишних пробелов и знаков препинания по краям.
+    "Курс  доллара?" и "курс доллара" дают одну запись кэша.
+    """
+    query = query.lower().replace('"', " ").replace("«", " ").replace("»", " ")
+    query = re.sub(r"\s+", " ", query)
+    return query.strip(" .,;:!?")
+
+
+class SearchCache:
+    """
+    Кэш результатов поиска в файле SQLite.
+    Безопасен для использования из нескольких потоков одного процесса.
+    """
+
+    def __init__(self, path=SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                use_tor INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                results TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_last_access ON search_cache (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(query, use_tor):
+        data = f"{int(bool(use_tor))}:{normalize_query(query)}"
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, query, use_tor):
+        """
+        Возвращает сохранённые результаты или None, если записи нет или она устарела.
+        """
+        key = self.make_key(query, use_tor)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            results, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE search_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        logger.info(f"Результаты поиска по запросу '{query}' взяты из кэша.")
+        return json.loads(results)
+
+    def set(self, query, use_tor, results):
+        """
+        Сохраняет результаты поиска. Пустые результаты не кэшируются.
+        """
+        if not results:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, query, use_tor, created_at, last_access, results) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.make_key(query, use_tor), normalize_query(query), int(bool(use_tor)), now, now,
+                 json.dumps(results, ensure_ascii=False)),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """
+        Удаляет устаревшие записи и самые давно использованные сверх лимита.
+        Вызывается под блокировкой.
+        """
+        self._conn.execute("DELETE FROM search_cache WHERE created_at < ?", (now - self.ttl,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM search_cache WHERE key IN "
+                "(SELECT key FROM search_cache ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            logger.debug(f"Из кэша поиска вытеснено записей: {count - self.max_entries}")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """
+    Возвращает общий для процесса кэш поиска или None, если кэш отключён.
+    """
+    global _cache
+    if not SEARCH_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache()
+    return _cache
+
+
+def cached_search(search_fn, query, use_tor):
+    """
+    Возвращает результаты search_fn(query) из кэша, а при промахе выполняет
+    поиск и сохраняет непустой результат.
+    """
+    cache = get_search_cache()
+    if cache is not None:
+        results = cache.get(query, use_tor)
+        if results is not None:
+            return results
+    results = search_fn(query)
+    if cache is not None and results:
+        cache.set(query, use_tor, results)
+    return results
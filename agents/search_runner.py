@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/search_runner.py
+# ==================================================
+# Параллельное выполнение поисковых запросов
+# Версия: 1.2.1
+# - Ограниченный пул потоков (settings.SEARCH_MAX_WORKERS).
+# - Одинаковые после нормализации запросы выполняются один раз.
+# - Собственный таймаут на каждый запрос (settings.SEARCH_QUERY_TIMEOUT).
+# - Результаты возвращаются в порядке запросов; ошибка или зависание
+#   одного запроса не блокирует остальные.
+# - Упреждающий поиск (start_speculative): запрос запускается до того,
+#   как известен итоговый список, и его результат подхватывается run_queries.
+#   Пока предыдущий упреждающий поиск ещё выполняется (отмена не прерывает
+#   начатый поиск), новый не запускается, чтобы не вставать за ним в очередь.
+# ==================================================
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from settings import SEARCH_MAX_WORKERS, SEARCH_QUERY_TIMEOUT
+from agents.search_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Отдельный пул для упреждающих запросов: они живут дольше одного вызова run_queries
+_speculative_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative")
+_speculative_future = None
+_speculative_lock = threading.Lock()
+
+
+def start_speculative(query, search_fn):
+    """
+    Запускает search_fn(query) в фоне, пока вызывающий код ещё готовит
+    итоговый список запросов. Возвращает Future или None, если предыдущий
+    упреждающий поиск ещё выполняется: его отмена не останавливает уже
+    начатый запрос, и новый поиск ждал бы в очереди за ненужным.
+    """
+    global _speculative_future
+    with _speculative_lock:
+        if _speculative_future is not None and not _speculative_future.done():
+            logger.debug(f"Упреждающий поиск пропущен, предыдущий ещё выполняется: {query}")
+            return None
+        logger.debug(f"Упреждающий поиск: {query}")
+        _speculative_future = _speculative_executor.submit(search_fn, query)
+        return _speculative_future
+
+
+def run_queries(queries, search_fn, max_workers=SEARCH_MAX_WORKERS, timeout=SEARCH_QUERY_TIMEOUT,
+                key=normalize_query, prefetched=None):
+    """
+    Выполняет search_fn(query) для каждого запроса в отдельном потоке.
+
+    Возвращает список той же длины, что и queries: на месте запроса — результат
+    search_fn или None, если запрос завершился ошибкой или не уложился в timeout.
+    Таймаут отсчитывается от общего старта, так как все запросы идут одновременно.
+    Запросы с одинаковым key(query) выполняются один раз и получают общий результат.
+    prefetched — {key: Future} уже запущенных запросов (см. start_speculative);
+    такие запросы повторно не выполняются, их результат ожидается наравне с остальными.
+    """
+    if not queries:
+        return []
+
+    results = [None] * len(queries)
+    started_at = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(queries)), thread_name_prefix="search")
+    try:
+        submitted = dict(prefetched or {})
+        for query in queries:
+            if key(query) not in submitted:
+                submitted[key(query)] = executor.submit(search_fn, query)
+        futures = [submitted[key(query)] for query in queries]
+        for index, (query, future) in enumerate(zip(queries, futures)):
+            remaining = max(0.0, timeout - (time.monotonic() - started_at))
+            try:
+                results[index] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()
+                logger.error(f"Запрос '{query}' не уложился в {timeout} с и пропущен.")
+            except Exception as e:
+                logger.error(f"Ошибка поиска по запросу '{query}': {e}")
+    finally:
+        # Зависшие потоки не ждём: их результат уже не нужен
+        executor.shutdown(wait=False)
+
+    logger.info(
+        f"Поиск по {len(queries)} запросам завершён за {time.monotonic() - started_at:.2f} с, "
+        f"успешно: {sum(r is not None for r in results)}"
+    )
+    return results
@@ -2,22 +2,24 @@
 # LLMCAN/agents/show_info_cognitive_interface_agent_v2.py
 # ==================================================
 # Сценарий для отображения текущей информации об агенте
-# Версия: 1.3.0
+# Версия: 1.6.0
+# - Состояние TOR и Ollama берётся из снимка фоновой проверки
+#   (agents/health_monitor.py); команда /show не ждёт сетевых запросов.
+# - Тестовый запрос к модели выполняется командой /show test через общий
+#   клиент Ollama (agents/llm_client.py).
 # ==================================================
 
 import socket
-import requests
 from pathlib import Path
 from colors import Colors
 import time
 
 # Импорт из settings
-from settings import (
-    LLM_API_HEALTH,
-    LLM_API_TAGS,
-    LLM_API_GENERATE,
-    LLM_API_BASE
-)
+from settings import LLM_STAGES
+from agents.health_monitor import get_health_monitor, snapshot_age
+from agents.llm_client import get_llm_client
+
+PENDING = f"{Colors.YELLOW}проверка ещё выполняется в фоне{Colors.RESET}"
 
 def get_ip_address():
     """Получает локальный IP-адрес."""
@@ -26,49 +28,58 @@ def get_ip_address():
     except Exception as e:
         return f"{Colors.RED}Ошибка получения IP: {str(e)}{Colors.RESET}"
 
-def check_tor_ip():
-    """Возвращает текущий IP-адрес, используемый TOR."""
-    try:
-        response = requests.get(
-            "https://api.ipify.org",
-            proxies={"http": "socks5h://127.0.0.1:9050", "https": "socks5h://127.0.0.1:9050"},
-            timeout=10
-        )
-        return response.text
-    except Exception as e:
-        return f"{Colors.RED}Ошибка получения IP TOR: {str(e)}{Colors.RESET}"
-
-def check_llm_api_status():
-    """Проверяет доступность API LLM."""
-    try:
-        response = requests.get(LLM_API_HEALTH, timeout=60)
-        if response.status_code == 200:
-            return f"{Colors.WHITE}API доступен.\n Ollama работает.{Colors.RESET}"
-        return (
-            f"{Colors.YELLOW}Базовый URL доступен, но эндпоинт вернул код "
-            f"{response.status_code}{Colors.RESET}"
-        )
-    except Exception as e:
-        return f"{Colors.RED}API недоступен: {str(e)}{Colors.RESET}"
-
-def get_ollama_version():
-    """Получает версию Ollama API."""
-    try:
-        response = requests.get(f"{LLM_API_BASE}/api/version", timeout=60)
-        if response.status_code == 200:
-            version_info = response.json()
-            return f"{Colors.GREEN} - {Colors.RESET}{version_info.get('version', 'Не указано')}"
-        return f"{Colors.RED}Ошибка получения версии Ollama: {response.status_code}{Colors.RESET}"
-    except Exception as e:
-        return f"{Colors.RED}Ошибка получения версии Ollama: {str(e)}{Colors.RESET}"
-
-def get_ollama_models():
-    """Получает список доступных моделей Ollama и форматирует их."""
+def check_tor_ip(snapshot):
+    """Возвращает выходной IP-адрес TOR из последней проверки."""
+    if not snapshot:
+        return PENDING
+    tor = snapshot["tor"]
+    if tor["exit_ip"]:
+        return tor["exit_ip"]
+    return f"{Colors.RED}Ошибка получения IP TOR: {tor['error']}{Colors.RESET}"
+
+def check_tor_service(snapshot):
+    """Состояние сервиса TOR и его портов из последней проверки."""
+    if not snapshot:
+        return PENDING
+    tor = snapshot["tor"]
+    ports = ", ".join(f"{port} {'доступен' if ok else 'недоступен'}" for port, ok in tor["socks_ports"].items())
+    return (
+        f"{tor['service'] or 'неизвестно'}; SOCKS: {ports}; "
+        f"управляющий порт: {'доступен' if tor['control_port'] else 'недоступен'}"
+    )
+
+def check_llm_api_status(snapshot):
+    """Доступность серверов Ollama по последней проверке."""
+    if not snapshot:
+        return PENDING
+    lines = []
+    for host in snapshot["ollama"]:
+        if host["available"]:
+            lines.append(f"{Colors.WHITE}{host['base_url']}: API доступен, Ollama работает.{Colors.RESET}")
+        else:
+            lines.append(f"{Colors.RED}{host['base_url']}: API недоступен: {host['error']}{Colors.RESET}")
+    return "\n ".join(lines)
+
+def get_ollama_version(snapshot):
+    """Версии Ollama на серверах по последней проверке."""
+    if not snapshot:
+        return PENDING
+    versions = [f"{host['base_url']}: {host['version']}" for host in snapshot["ollama"] if host["available"]]
+    if not versions:
+        return f"{Colors.RED}Ошибка получения версии Ollama: серверы недоступны{Colors.RESET}"
+    return f"{Colors.GREEN} - {Colors.RESET}" + "; ".join(versions)
+
+def get_ollama_models(snapshot):
+    """Список моделей Ollama с доступных серверов, отформатированный для вывода."""
+    if not snapshot:
+        return f" {PENDING}"
     try:
-        response = requests.get(LLM_API_TAGS, timeout=60)
-        if response.status_code == 200:
-            data = response.json()  # {'models': [ {...}, {...}, ... ] }
-            models_list = data.get("models", [])
+        if any(host["available"] for host in snapshot["ollama"]):
+            models_list = {}
+            for host in snapshot["ollama"]:
+                for model_info in host["models"]:
+                    models_list.setdefault(model_info.get("name"), model_info)
+            models_list = list(models_list.values())
 
             if not models_list:
                 return f" {Colors.YELLOW}Список моделей пуст.{Colors.RESET}"
@@ -133,47 +144,35 @@ def get_ollama_models():
                 f" Если у вас возникли проблемы, обратитесь к документации на сайте Ollama или в сообщество поддержки."
             )
         else:
-            return (
-                f" {Colors.RED}Ошибка получения моделей: "
-                f"{response.status_code}, {response.text}{Colors.RESET}"
-            )
+            errors = "; ".join(f"{host['base_url']}: {host['error']}" for host in snapshot["ollama"])
+            return f" {Colors.RED}Ошибка получения моделей: {errors}{Colors.RESET}"
     except Exception as e:
         return f" {Colors.RED}Ошибка получения моделей: {str(e)}{Colors.RESET}"
 
 
 
 def test_ollama_query():
-    """Выполняет тестовый запрос к API LLM и красиво выводит результат."""
-    import json
+    """Выполняет тестовый запрос к основной модели этапа synthesis и красиво выводит результат."""
+    model_name = LLM_STAGES["synthesis"][0][0]
+    prompt_text = "Готов к работе?"
     try:
-        payload = {
-            "model": "deepseek-r1:32b",
-            "prompt": "Готов к работе?",
-            "stream": False
-        }
         start_time = time.time()
-        response = requests.post(LLM_API_GENERATE, json=payload, timeout=60)
+        # Через общий клиент: запрос идёт на исправный сервер пула, мимо кэша ответов
+        data = get_llm_client().generate(prompt_text, model_name, read_timeout=60, use_cache=False)
         elapsed_time = time.time() - start_time
-
-        if response.status_code == 200:
-            data = response.json()
-            model_name = payload.get("model", "—")
-            prompt_text = payload.get("prompt", "—")
-            answer_text = data.get("response", "Нет ответа")
-
-            output = (
-                f" {Colors.BLUE + Colors.BOLD}\n"
-                f" ╔═══════════════════════════════════════════════╗\n"
-                f" ║           Тестовый запрос к модели            ║\n"
-                f" ╚═══════════════════════════════════════════════╝\n"
-                f" {Colors.RESET}{Colors.GREEN}Модель: {Colors.RESET}{model_name}\n"
-                f" {Colors.MAGENTA}Запрос (prompt):{Colors.RESET} {prompt_text}\n"
-                f" {Colors.CYAN}Ответ (response):{Colors.RESET} {answer_text}\n"
-                f" {Colors.YELLOW}Время выполнения: {elapsed_time:.2f} сек.{Colors.RESET}"
-            )
-            return output
-        else:
-            return f" {Colors.RED}Ошибка тестового запроса: {response.status_code}{Colors.RESET}"
+        answer_text = data.get("response", "Нет ответа")
+
+        output = (
+            f" {Colors.BLUE + Colors.BOLD}\n"
+            f" ╔═══════════════════════════════════════════════╗\n"
+            f" ║           Тестовый запрос к модели            ║\n"
+            f" ╚═══════════════════════════════════════════════╝\n"
+            f" {Colors.RESET}{Colors.GREEN}Модель: {Colors.RESET}{model_name}\n"
+            f" {Colors.MAGENTA}Запрос (prompt):{Colors.RESET} {prompt_text}\n"
+            f" {Colors.CYAN}Ответ (response):{Colors.RESET} {answer_text}\n"
+            f" {Colors.YELLOW}Время выполнения: {elapsed_time:.2f} сек.{Colors.RESET}"
+        )
+        return output
     except Exception as e:
         return f" {Colors.RED}Ошибка тестового запроса: {str(e)}{Colors.RESET}"
 
@@ -202,8 +201,13 @@ def get_script_versions():
             versions[name] = f"{Colors.RED}Ошибка: {str(e)}{Colors.RESET}"
     return versions
 
-def show_info(use_tor, log_level):
-    """Отображает информацию об агенте в разделах."""
+def show_info(use_tor, log_level, test_query=False):
+    """
+    Отображает информацию об агенте в разделах. Сетевые проверки не выполняются:
+    данные берутся из снимка фонового монитора. Тестовый запрос к модели
+    (test_query, команда /show test) занимает до минуты и выполняется только по запросу.
+    """
+    snapshot = get_health_monitor().snapshot()
     print(" " + Colors.CYAN + Colors.BOLD)
     print(" ╔═══════════════════════════════════════════════╗")
     print(" ║                Информация о сервере           ║")
@@ -211,7 +215,8 @@ def show_info(use_tor, log_level):
     print(Colors.RESET)
 
     print(f" {Colors.GREEN}Локальный IP-адрес: {Colors.RESET}{get_ip_address()}")
-    print(f" {Colors.GREEN}IP TOR: {Colors.RESET}{check_tor_ip()}")
+    print(f" {Colors.GREEN}Сервис TOR: {Colors.RESET}{check_tor_service(snapshot)}")
+    print(f" {Colors.GREEN}IP TOR: {Colors.RESET}{check_tor_ip(snapshot)}")
     print(f" {Colors.GREEN}Режим TOR: {Colors.RESET}{'Включен' if use_tor else 'Отключен'}")
     print(f" {Colors.GREEN}Текущий режим логирования: {Colors.RESET}{log_level}")
 
@@ -221,10 +226,13 @@ def show_info(use_tor, log_level):
     print(" ╚═══════════════════════════════════════════════╝")
     print(Colors.RESET)
 
-    print(f" {Colors.GREEN}Доступность LLM API: {Colors.RESET}\n {check_llm_api_status()}")
-    print(f" {Colors.GREEN}Версия Ollama: {Colors.RESET}{get_ollama_version()}")
-    print(f" {Colors.GREEN}Модели Ollama: {Colors.RESET}{get_ollama_models()}")
-    print(" " + test_ollama_query())
+    print(f" {Colors.GREEN}Доступность LLM API: {Colors.RESET}\n {check_llm_api_status(snapshot)}")
+    print(f" {Colors.GREEN}Версия Ollama: {Colors.RESET}{get_ollama_version(snapshot)}")
+    print(f" {Colors.GREEN}Модели Ollama: {Colors.RESET}{get_ollama_models(snapshot)}")
+    if snapshot:
+        print(f" {Colors.GRAY}Состояние проверено {snapshot_age(snapshot):.0f} с назад.{Colors.RESET}")
+    if test_query:
+        print(" " + test_ollama_query())
 
     print(" " + Colors.YELLOW + Colors.BOLD)
     print(" ╔═══════════════════════════════════════════════╗")
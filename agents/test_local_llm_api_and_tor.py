@@ -3,6 +3,8 @@
 # ===========================================
 # Сценарий тестирования локального LLM API (Ollama) 
 # + проверка IP и включение/выключение TOR через session-level proxy
+# - Сессии берутся из общей фабрики agents/http_sessions.py
+#   (socks5h для TOR, Ollama — всегда без прокси).
 # ===========================================
 
 import os
@@ -31,6 +33,7 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 from settings import LLM_API_GENERATE
+from agents.http_sessions import DIRECT, LOCAL, TOR, get_session
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -48,18 +51,10 @@ def toggle_tor(enable: bool):
 
 def get_session_for_external_requests() -> requests.Session:
     """
-    Возвращаем session, которая либо использует TOR (socks5://127.0.0.1:9050),
-    либо обычное прямое подключение, в зависимости от USE_TOR.
+    Возвращаем общую session, которая либо использует TOR (socks5h через
+    settings.TOR_SOCKS_PROXY), либо обычное прямое подключение, в зависимости от USE_TOR.
     """
-    s = requests.Session()
-    if USE_TOR:
-        s.proxies = {
-            "http": "socks5://127.0.0.1:9050",
-            "https": "socks5://127.0.0.1:9050"
-        }
-    else:
-        s.proxies = {}
-    return s
+    return get_session(TOR if USE_TOR else DIRECT)
 
 def check_tor_status():
     """Смотрим, запущен ли tor (systemd)."""
@@ -87,7 +82,7 @@ def check_ip():
 def test_llm_connection():
     """
     Делаем запрос к локальному Ollama (http://10.x.x.x:11434).
-    Здесь нам TOR не нужен, поэтому session.proxies = {}.
+    Здесь нам TOR не нужен: сессия LOCAL никогда не использует прокси.
     """
     logger.info(Colors.YELLOW + "Тест подключения к локальному LLM (Ollama)" + Colors.RESET)
     payload = {
@@ -96,11 +91,8 @@ def test_llm_connection():
         "stream": False
     }
     try:
-        with requests.Session() as s:
-            # Всегда без прокси для локального адреса:
-            s.proxies = {}
-            logger.info(Colors.YELLOW + f"Отправка запроса к {LLM_API_GENERATE}" + Colors.RESET)
-            r = s.post(LLM_API_GENERATE, json=payload, timeout=120)
+        logger.info(Colors.YELLOW + f"Отправка запроса к {LLM_API_GENERATE}" + Colors.RESET)
+        r = get_session(LOCAL).post(LLM_API_GENERATE, json=payload, timeout=120)
         
         logger.info(Colors.YELLOW + f"Статус ответа: {r.status_code}" + Colors.RESET)
         logger.info(Colors.YELLOW + f"Содержимое ответа: {r.text[:100]}..." + Colors.RESET)
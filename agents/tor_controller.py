@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/tor_controller.py
+# ==================================================
+# Управление TOR через управляющий порт (stem)
+# Версия: 1.1.0
+# - Смена цепочек сигналом NEWNYM вместо перезапуска сервиса.
+# - Ожидание построения новой цепочки после NEWNYM.
+# - Соблюдение ограничения TOR на частоту NEWNYM (get_newnym_wait).
+# - Одно соединение с управляющим портом на процесс, переподключение при обрыве.
+# - Закрытие цепочек отдельного логина SOCKS (close_circuits).
+# ==================================================
+
+import logging
+import threading
+import time
+
+from settings import TOR_CONTROL_HOST, TOR_CONTROL_PORT, TOR_CONTROL_PASSWORD, TOR_CIRCUIT_WAIT
+
+logger = logging.getLogger(__name__)
+
+# TOR принимает NEWNYM не чаще раза в 10 секунд
+MAX_NEWNYM_WAIT = 10.0
+CIRCUIT_POLL_INTERVAL = 0.1
+
+
+class TorController:
+    """
+    Соединение с управляющим портом TOR (ControlPort в torrc).
+
+    Без пароля используется аутентификация по cookie (CookieAuthentication 1);
+    файл cookie должен быть доступен пользователю, от которого запущен агент.
+    Все методы потокобезопасны; при недоступном порте возвращают False/None,
+    чтобы вызывающий код мог перейти к перезапуску сервиса.
+    """
+
+    def __init__(self, host=TOR_CONTROL_HOST, port=TOR_CONTROL_PORT, password=TOR_CONTROL_PASSWORD,
+                 circuit_wait=TOR_CIRCUIT_WAIT):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.circuit_wait = circuit_wait
+        self._controller = None
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        if self._controller is not None and self._controller.is_alive():
+            return self._controller
+        # stem нужен только при работе через TOR, поэтому импортируется здесь
+        from stem.control import Controller
+        controller = Controller.from_port(address=self.host, port=self.port)
+        try:
+            controller.authenticate(password=self.password)
+        except Exception:
+            controller.close()
+            raise
+        logger.info(f"Подключено к управляющему порту TOR {self.host}:{self.port}")
+        self._controller = controller
+        return controller
+
+    def is_available(self):
+        """
+        Проверяет, что управляющий порт доступен и аутентификация проходит.
+        """
+        with self._lock:
+            try:
+                self._connect()
+                return True
+            except Exception as e:
+                logger.debug(f"Управляющий порт TOR недоступен ({self.host}:{self.port}): {e}")
+                self.close()
+                return False
+
+    def _built_circuits(self, controller):
+        from stem import CircStatus
+        return {c.id for c in controller.get_circuits() if c.status == CircStatus.BUILT and c.purpose == "GENERAL"}
+
+    def new_identity(self):
+        """
+        Отправляет NEWNYM и ждёт до circuit_wait секунд, пока TOR построит новую цепочку.
+        Возвращает True, если сигнал принят, и False, если управляющий порт недоступен.
+        """
+        started_at = time.monotonic()
+        with self._lock:
+            try:
+                from stem import Signal
+                controller = self._connect()
+                # Более ранний сигнал TOR откладывает, не создавая новых цепочек,
+                # поэтому дожидаемся разрешения
+                wait = min(controller.get_newnym_wait(), MAX_NEWNYM_WAIT)
+                if wait > 0:
+                    logger.debug(f"Ожидание разрешения NEWNYM: {wait:.1f} с")
+                    time.sleep(wait)
+
+                previous = self._built_circuits(controller)
+                controller.signal(Signal.NEWNYM)
+                deadline = time.monotonic() + self.circuit_wait
+                while time.monotonic() < deadline:
+                    if self._built_circuits(controller) - previous:
+                        logger.info(f"Цепочка TOR сменена за {time.monotonic() - started_at:.2f} с")
+                        return True
+                    time.sleep(CIRCUIT_POLL_INTERVAL)
+                # Цепочка будет построена при следующем соединении
+                logger.info(f"NEWNYM отправлен, новая цепочка не построена за {self.circuit_wait} с")
+                return True
+            except Exception as e:
+                logger.warning(f"Не удалось сменить цепочку через управляющий порт TOR: {e}")
+                self.close()
+                return False
+
+    def close_circuits(self, socks_username):
+        """
+        Закрывает цепочки, построенные для соединений с данным логином SOCKS
+        (изоляция IsolateSOCKSAuth). Возвращает число закрытых цепочек или
+        None, если управляющий порт недоступен.
+        """
+        with self._lock:
+            try:
+                controller = self._connect()
+                closed = 0
+                for circuit in controller.get_circuits():
+                    if getattr(circuit, "socks_username", None) == socks_username:
+                        controller.close_circuit(circuit.id)
+                        closed += 1
+                logger.debug(f"Закрыто цепочек TOR для {socks_username}: {closed}")
+                return closed
+            except Exception as e:
+                logger.debug(f"Не удалось закрыть цепочки TOR для {socks_username}: {e}")
+                self.close()
+                return None
+
+    def close(self):
+        with self._lock:
+            if self._controller is not None:
+                try:
+                    self._controller.close()
+                except Exception:
+                    pass
+                self._controller = None
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_tor_controller():
+    """
+    Возвращает общий для процесса экземпляр TorController.
+    """
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = TorController()
+    return _controller
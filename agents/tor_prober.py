@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# LLMCAN/agents/tor_prober.py
+# ==================================================
+# Фоновые замеры цепочек пула TOR
+# Версия: 1.1.0
+# - Время ответа (до получения заголовков) и успешность запроса к
+#   settings.TOR_PROBE_URL через каждую цепочку TorCircuitPool.
+# - Замеры хранятся скользящим окном в самой цепочке (TorCircuit.record);
+#   после каждого круга пул заменяет медленные и ненадёжные цепочки
+#   (TorCircuitPool.rebalance).
+# - По умолчанию замеряется лёгкий служебный адрес, а не поисковик: замеры не
+#   расходуют лимит запросов к DuckDuckGo.
+# - Пока режим TOR выключен, замеры приостановлены (pause/resume).
+# ==================================================
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from settings import TOR_PROBE_INTERVAL, TOR_PROBE_TIMEOUT, TOR_PROBE_URL
+from agents.http_sessions import get_session
+
+logger = logging.getLogger(__name__)
+
+# Ответы, которыми сервер (например, поисковик, если замеряется он) сообщает
+# об ограничении частоты или блокировке
+BLOCKED_STATUS_CODES = {202, 403, 429}
+
+
+class CircuitProber:
+    """
+    Периодически замеряет все цепочки пула параллельно в отдельном потоке.
+    """
+
+    def __init__(self, pool, target=TOR_PROBE_URL, interval=TOR_PROBE_INTERVAL, timeout=TOR_PROBE_TIMEOUT):
+        self.pool = pool
+        self.target = target
+        self.interval = interval
+        self.timeout = timeout
+        self._stop_event = threading.Event()
+        self._active = threading.Event()
+        self._active.set()
+        self._thread = None
+
+    def probe(self, circuit):
+        """
+        Один замер цепочки. Возвращает (успех, время ответа в секундах, заблокирована).
+        """
+        started_at = time.monotonic()
+        try:
+            # stream=True: тело не загружается, замеряется время до заголовков
+            with get_session(circuit).get(self.target, timeout=self.timeout, stream=True) as response:
+                latency = time.monotonic() - started_at
+                blocked = response.status_code in BLOCKED_STATUS_CODES
+                return response.status_code < 400 and not blocked, latency, blocked
+        except requests.RequestException as e:
+            logger.debug(f"Замер цепочки {circuit} не удался: {e}")
+            return False, None, False
+
+    def probe_all(self):
+        """
+        Замеряет все цепочки, передаёт результаты пулу и заменяет худшие цепочки.
+        """
+        circuits = self.pool.circuits()
+        with ThreadPoolExecutor(max_workers=len(circuits), thread_name_prefix="tor-probe") as executor:
+            outcomes = list(executor.map(self.probe, circuits))
+        for circuit, (ok, latency, blocked) in zip(circuits, outcomes):
+            self.pool.report(circuit, ok=ok, latency=latency, blocked=blocked)
+        evicted = self.pool.rebalance()
+        logger.debug(
+            "Замер цепочек TOR: "
+            + ", ".join(f"{c}: {f'{latency:.2f} с' if ok else 'ошибка'}" for c, (ok, latency, _) in zip(circuits, outcomes))
+            + (f"; заменено: {len(evicted)}" if evicted else "")
+        )
+        return outcomes
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self._active.is_set():
+                try:
+                    self.probe_all()
+                except Exception as e:  # поток замеров не должен завершаться из-за одной ошибки
+                    logger.error(f"Ошибка замера цепочек TOR: {e}")
+            self._stop_event.wait(self.interval)
+
+    @property
+    def paused(self):
+        return not self._active.is_set()
+
+    def pause(self):
+        """
+        Приостанавливает замеры (режим TOR выключен); поток продолжает ждать.
+        """
+        self._active.clear()
+
+    def resume(self):
+        self._active.set()
+
+    def start(self):
+        """
+        Запускает фоновые замеры (однократно).
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="tor-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
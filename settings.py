@@ -17,7 +17,7 @@
 # - ERROR: Только ошибки.
 # Логи записываются как в консоль, так и в файл, путь к которому указан в LOG_FILE_PATH.
 #
-# Версия: 1.3 (2025-01-21)
+# Версия: 1.23 (2026-10-18)
 
 import logging
 import logging.config
@@ -42,14 +42,171 @@ LLM_API_BASE      = "http://10.67.67.2:11434"
 LLM_API_TAGS      = f"{LLM_API_BASE}/api/tags"
 LLM_API_GENERATE  = f"{LLM_API_BASE}/api/generate"
 LLM_API_HEALTH    = LLM_API_BASE  # Если нужно проверить "жив" ли сервер (статус 200)
- 
+
+# Список серверов Ollama через запятую; по умолчанию — один LLM_API_BASE.
+# Запросы распределяются между ними (agents/llm_pool.py).
+LLM_API_HOSTS = [
+    host.strip() for host in os.getenv("LLMCAN_LLM_HOSTS", LLM_API_BASE).split(",") if host.strip()
+]
+# Фоновая проверка серверов: период и таймаут запроса, секунды
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLMCAN_LLM_HEALTH_INTERVAL", "30"))
+LLM_HEALTH_CHECK_TIMEOUT  = float(os.getenv("LLMCAN_LLM_HEALTH_TIMEOUT", "3"))
+
+# Пул keep-alive соединений общего клиента Ollama (agents/llm_client.py)
+LLM_POOL_SIZE       = int(os.getenv("LLMCAN_LLM_POOL_SIZE", "4"))
+# Таймауты в секундах: подключение к серверу и ожидание ответа модели
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLMCAN_LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT    = float(os.getenv("LLMCAN_LLM_READ_TIMEOUT", "120"))
+# Сколько Ollama держит модель в памяти после запроса (формат Ollama: "30m", "1h", "-1")
+# Пока сеанс агента открыт, модель закреплена на LLM_KEEP_ALIVE; при выходе срок
+# возвращается к LLM_RELEASE_KEEP_ALIVE (значение Ollama по умолчанию — 5m).
+LLM_KEEP_ALIVE         = os.getenv("LLMCAN_LLM_KEEP_ALIVE", "30m")
+LLM_RELEASE_KEEP_ALIVE = os.getenv("LLMCAN_LLM_RELEASE_KEEP_ALIVE", "5m")
+# Модели по этапам конвейера: список (модель, бюджет в секундах) от основной к запасным.
+# rewrite   — переформулировка запроса перед поиском (быстрая модель; при неудаче
+#             используется исходный запрос пользователя);
+# synthesis — итоговый ответ по результатам поиска (крупная модель).
+# llama3 (8B) — самая лёгкая из моделей, хорошо понимающих результаты поиска
+# (см. комментарий в agents/preprocess_query.py); qwen2:7b там отмечена как слабая.
+LLM_STAGES = {
+    "rewrite": [
+        (os.getenv("LLMCAN_REWRITE_MODEL", "llama3:latest"), float(os.getenv("LLMCAN_REWRITE_BUDGET", "15"))),
+    ],
+    "synthesis": [
+        (os.getenv("LLMCAN_SYNTHESIS_MODEL", "deepseek-r1:14b"), float(os.getenv("LLMCAN_SYNTHESIS_BUDGET", "120"))),
+        (os.getenv("LLMCAN_SYNTHESIS_FALLBACK_MODEL", "llama3:latest"), float(os.getenv("LLMCAN_SYNTHESIS_FALLBACK_BUDGET", "60"))),
+    ],
+}
+# Закреплять в памяти основные модели всех этапов на весь сеанс (1 - да, 0 - нет).
+# По умолчанию при запуске загружается только модель этапа synthesis. Закрепление
+# обеих моделей требует памяти GPU на обе сразу: deepseek-r1:14b (~9 ГБ в Q4) и
+# llama3:latest (~5 ГБ) — около 14 ГБ VRAM плюс KV-кэш под LLM_NUM_CTX. Если памяти
+# не хватает, Ollama выгружает одну модель ради другой на каждом запросе.
+LLM_PIN_STAGE_MODELS = os.getenv("LLMCAN_LLM_PIN_STAGE_MODELS", "0") == "1"
+# Окно контекста модели (options.num_ctx) и резерв токенов под ответ.
+# Значение одинаково для всех запросов: при другом num_ctx Ollama перезагружает модель.
+# История и результаты поиска урезаются под этот бюджет (agents/context_packer.py).
+LLM_NUM_CTX                 = int(os.getenv("LLMCAN_LLM_NUM_CTX", "8192"))
+LLM_RESPONSE_RESERVE_TOKENS = int(os.getenv("LLMCAN_LLM_RESPONSE_RESERVE", "2048"))
+# Потоковый вывод ответа модели по мере генерации (1 - включен, 0 - выключен)
+LLM_STREAM_OUTPUT   = os.getenv("LLMCAN_LLM_STREAM", "1") == "1"
+
+# Дисковый кэш ответов LLM (agents/llm_cache.py)
+LLM_CACHE_ENABLED     = os.getenv("LLMCAN_LLM_CACHE", "1") == "1"
+LLM_CACHE_PATH        = BASE_DIR / "data" / "llm_cache.sqlite3"
+LLM_CACHE_TTL         = int(os.getenv("LLMCAN_LLM_CACHE_TTL", str(24 * 3600)))  # секунды
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLMCAN_LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# ---------------------------
+# Настройки поиска
+# ---------------------------
+# Поисковый бэкенд (agents/search_backends.py):
+# http — HTML-версия DuckDuckGo внутри процесса, ddgr — внешняя утилита ddgr
+SEARCH_BACKEND     = os.getenv("LLMCAN_SEARCH_BACKEND", "http")
+# Адрес HTML-поиска DuckDuckGo; для тестов — локальная заглушка agents/ddg_standin_server.py
+SEARCH_DDG_URL     = os.getenv("LLMCAN_SEARCH_DDG_URL", "https://html.duckduckgo.com/html/")
+SEARCH_MAX_RESULTS = int(os.getenv("LLMCAN_SEARCH_MAX_RESULTS", "10"))
+# SOCKS-прокси TOR для запросов в режиме TOR (socks5h — DNS через TOR)
+TOR_SOCKS_PROXY    = os.getenv("LLMCAN_TOR_SOCKS", "socks5h://127.0.0.1:9050")
+# Общие HTTP-сессии (agents/http_sessions.py): сколько хостов держит пул
+# соединений одной сессии и сколько соединений на хост
+HTTP_POOL_CONNECTIONS = int(os.getenv("LLMCAN_HTTP_POOL_CONNECTIONS", "16"))
+HTTP_POOL_MAXSIZE     = int(os.getenv("LLMCAN_HTTP_POOL_MAXSIZE", "8"))
+# Объединение результатов нескольких запросов (agents/result_fusion.py):
+# сколько лучших результатов передаётся модели и константа k метода RRF
+SEARCH_TOP_K       = int(os.getenv("LLMCAN_SEARCH_TOP_K", "15"))
+SEARCH_RRF_K       = int(os.getenv("LLMCAN_SEARCH_RRF_K", "60"))
+# Поисковые запросы выполняются параллельно (agents/search_runner.py):
+# число одновременных запросов и предельное время одного запроса, секунды
+SEARCH_MAX_WORKERS   = int(os.getenv("LLMCAN_SEARCH_WORKERS", "3"))
+SEARCH_QUERY_TIMEOUT = float(os.getenv("LLMCAN_SEARCH_TIMEOUT", "60"))
+# Повторы поиска (agents/retry_policy.py): число попыток, начальная и
+# предельная задержка экспоненциального ожидания, секунды
+SEARCH_RETRY_ATTEMPTS   = int(os.getenv("LLMCAN_SEARCH_RETRY_ATTEMPTS", "3"))
+SEARCH_RETRY_BASE_DELAY = float(os.getenv("LLMCAN_SEARCH_RETRY_BASE_DELAY", "0.5"))
+SEARCH_RETRY_MAX_DELAY  = float(os.getenv("LLMCAN_SEARCH_RETRY_MAX_DELAY", "8"))
+# Минимальный интервал между сменами цепочки TOR при ограничении частоты, секунды
+TOR_ROTATE_MIN_INTERVAL = float(os.getenv("LLMCAN_TOR_ROTATE_INTERVAL", "10"))
+# Управляющий порт TOR (agents/tor_controller.py): адрес, порт и пароль
+# (HashedControlPassword в torrc); без пароля — аутентификация по cookie.
+# TOR_CIRCUIT_WAIT — сколько ждать новой цепочки после NEWNYM, секунды
+TOR_CONTROL_HOST     = os.getenv("LLMCAN_TOR_CONTROL_HOST", "127.0.0.1")
+TOR_CONTROL_PORT     = int(os.getenv("LLMCAN_TOR_CONTROL_PORT", "9051"))
+TOR_CONTROL_PASSWORD = os.getenv("LLMCAN_TOR_CONTROL_PASSWORD") or None
+TOR_CIRCUIT_WAIT     = float(os.getenv("LLMCAN_TOR_CIRCUIT_WAIT", "5"))
+# Пул изолированных цепочек TOR (TorCircuitPool в agents/install_tor.py):
+# число цепочек (0 — без пула, одна общая цепочка), SOCKS-порты через запятую
+# (дополнительные порты должны быть объявлены в torrc: SocksPort 9052 и т.д.;
+# по умолчанию — порт из TOR_SOCKS_PROXY), сколько ошибок подряд и какое время
+# ответа (секунды) приводят к замене цепочки
+TOR_CIRCUIT_POOL_SIZE    = int(os.getenv("LLMCAN_TOR_CIRCUITS", "4"))
+TOR_SOCKS_PORTS          = [int(port) for port in os.getenv("LLMCAN_TOR_SOCKS_PORTS", "").split(",") if port.strip()]
+TOR_CIRCUIT_MAX_FAILURES = int(os.getenv("LLMCAN_TOR_CIRCUIT_MAX_FAILURES", "2"))
+TOR_CIRCUIT_MAX_LATENCY  = float(os.getenv("LLMCAN_TOR_CIRCUIT_MAX_LATENCY", "15"))
+# Замеры цепочек пула (agents/tor_prober.py): адрес, период (секунды, 0 — без
+# замеров) и таймаут замера, размер скользящего окна на цепочку, перцентиль
+# времени ответа, выше которого цепочка заменяется, минимальная доля успешных
+# замеров и число замеров, после которого цепочку можно заменить.
+# Адрес по умолчанию — короткий JSON-ответ Tor Project, а не страница поиска:
+# замеры не расходуют лимит запросов к поисковику. Пока режим TOR выключен,
+# замеры приостановлены.
+TOR_PROBE_URL         = os.getenv("LLMCAN_TOR_PROBE_URL", "https://check.torproject.org/api/ip")
+TOR_PROBE_INTERVAL    = float(os.getenv("LLMCAN_TOR_PROBE_INTERVAL", "60"))
+TOR_PROBE_TIMEOUT     = float(os.getenv("LLMCAN_TOR_PROBE_TIMEOUT", "10"))
+TOR_PROBE_WINDOW      = int(os.getenv("LLMCAN_TOR_PROBE_WINDOW", "10"))
+TOR_PROBE_PERCENTILE  = int(os.getenv("LLMCAN_TOR_PROBE_PERCENTILE", "90"))
+TOR_PROBE_MIN_SUCCESS = float(os.getenv("LLMCAN_TOR_PROBE_MIN_SUCCESS", "0.5"))
+TOR_PROBE_MIN_SAMPLES = int(os.getenv("LLMCAN_TOR_PROBE_MIN_SAMPLES", "3"))
+# Фоновая проверка состояния TOR и серверов Ollama (agents/health_monitor.py):
+# период и таймаут одной проверки (секунды), адрес для определения выходного IP,
+# сколько секунд при старте ждать первую проверку, прежде чем спросить только systemd
+HEALTH_CHECK_INTERVAL = float(os.getenv("LLMCAN_HEALTH_INTERVAL", "60"))
+HEALTH_CHECK_TIMEOUT  = float(os.getenv("LLMCAN_HEALTH_TIMEOUT", "10"))
+HEALTH_FIRST_WAIT     = float(os.getenv("LLMCAN_HEALTH_FIRST_WAIT", "2"))
+HEALTH_IP_CHECK_URL   = os.getenv("LLMCAN_IP_CHECK_URL", "https://api.ipify.org")
+# Загрузка страниц найденных результатов (agents/page_fetcher.py):
+# сколько первых результатов загружать, общий срок этапа (секунды), предельный
+# размер страницы (байты), потоков всего и соединений на один хост
+PAGE_FETCH_ENABLED   = os.getenv("LLMCAN_PAGE_FETCH", "1") == "1"
+PAGE_FETCH_TOP_N     = int(os.getenv("LLMCAN_PAGE_FETCH_TOP_N", "5"))
+PAGE_FETCH_DEADLINE  = float(os.getenv("LLMCAN_PAGE_FETCH_DEADLINE", "8"))
+PAGE_FETCH_MAX_BYTES = int(os.getenv("LLMCAN_PAGE_FETCH_MAX_BYTES", str(1024 * 1024)))
+PAGE_FETCH_WORKERS   = int(os.getenv("LLMCAN_PAGE_FETCH_WORKERS", "8"))
+PAGE_FETCH_PER_HOST  = int(os.getenv("LLMCAN_PAGE_FETCH_PER_HOST", "2"))
+# Фрагменты текста страницы: длина в словах и число фрагментов с одной страницы
+PAGE_PASSAGE_WORDS   = int(os.getenv("LLMCAN_PAGE_PASSAGE_WORDS", "120"))
+PAGE_MAX_PASSAGES    = int(os.getenv("LLMCAN_PAGE_MAX_PASSAGES", "8"))
+# Бюджет токенов на фрагменты, отобранные по BM25 (agents/passage_ranker.py)
+PAGE_PASSAGE_TOKEN_BUDGET = int(os.getenv("LLMCAN_PAGE_PASSAGE_BUDGET", "2000"))
+# Переранжирование результатов поиска по эмбеддингам (agents/reranker.py):
+# модель эмбеддингов Ollama, число текстов в одном запросе /api/embed
+RERANK_ENABLED          = os.getenv("LLMCAN_RERANK", "0") == "1"
+EMBED_MODEL             = os.getenv("LLMCAN_EMBED_MODEL", "nomic-embed-text")
+EMBED_BATCH_SIZE        = int(os.getenv("LLMCAN_EMBED_BATCH_SIZE", "32"))
+# Кэш эмбеддингов по хэшу текста (memmap float16, agents/embedding_cache.py)
+EMBED_CACHE_DIR         = BASE_DIR / "data" / "processed"
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("LLMCAN_EMBED_CACHE_MAX_ENTRIES", "200000"))
+
+# Дисковый кэш результатов поиска (agents/search_cache.py)
+SEARCH_CACHE_ENABLED     = os.getenv("LLMCAN_SEARCH_CACHE", "1") == "1"
+SEARCH_CACHE_PATH        = BASE_DIR / "data" / "search_cache.sqlite3"
+SEARCH_CACHE_TTL         = int(os.getenv("LLMCAN_SEARCH_CACHE_TTL", "3600"))  # секунды
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("LLMCAN_SEARCH_CACHE_MAX_ENTRIES", "2000"))
+
+# Хранилище диалогов всех агентов (SQLite в режиме WAL, agents/conversation_store.py)
+CONVERSATION_DB_PATH = BASE_DIR / "data" / "conversations.sqlite3"
+
 
 # Указать путь для логов
-LOG_FILE_PATH = os.getenv("LLMCAN_LOG_PATH", "./data/logs/llmcan.log")
+# (относительно BASE_DIR, чтобы скрипты из подпапок, например LLaMa_generator, тоже находили его)
+LOG_FILE_PATH = os.getenv("LLMCAN_LOG_PATH", str(BASE_DIR / "data" / "logs" / "llmcan.log"))
 
 # Конфигурация логирования
 LOGGING_CONFIG = {
     'version': 1,
+    # Модули вызывают dictConfig повторно; уже созданные логгеры (например,
+    # agents.llm_client с метриками генерации) не должны при этом отключаться.
+    'disable_existing_loggers': False,
     'formatters': {
         'default': {
             'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
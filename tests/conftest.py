@@ -0,0 +1,13 @@
+# LLMCAN/tests/conftest.py
+# ==================================================
+# Общая настройка тестов: пути импорта как при запуске агентов
+# ==================================================
+
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+# Корень проекта (settings, agents.*) и agents/ (модули агентов импортируют
+# друг друга без префикса, например cognitive_logic)
+sys.path.insert(0, str(project_root / "agents"))
+sys.path.insert(0, str(project_root))
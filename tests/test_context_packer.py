@@ -0,0 +1,81 @@
+# LLMCAN/tests/test_context_packer.py
+# ==================================================
+# Тесты упаковки контекста модели (agents/context_packer.py)
+# ==================================================
+
+from agents.context_packer import (
+    MAX_ABSTRACT_TOKENS,
+    estimate_tokens,
+    flatten_results,
+    pack_context,
+    pack_history,
+    pack_passages,
+    pack_search_results,
+    result_tokens,
+    trim_to_tokens,
+)
+
+
+def result(n, abstract="текст"):
+    return {"title": f"T{n}", "url": f"http://{n}", "abstract": abstract, "extra": "x" * 1000}
+
+
+def test_cyrillic_costs_more_tokens_than_latin():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("а" * 100) > estimate_tokens("a" * 100)
+
+
+def test_trim_to_tokens_cuts_on_word_boundary():
+    text = " ".join(["слово"] * 100)
+    trimmed = trim_to_tokens(text, 20)
+    assert estimate_tokens(trimmed) <= 20
+    assert trimmed.endswith("…") and "слово слово" in trimmed
+    assert trim_to_tokens("коротко", 20) == "коротко"
+
+
+def test_flatten_interleaves_query_groups_by_rank():
+    flat = flatten_results([[result(1), result(2)], [result(3)], [], result(4)])
+    assert [r["title"] for r in flat] == ["T1", "T3", "T4", "T2"]
+
+
+def test_result_cost_counts_only_prompt_fields():
+    assert result_tokens(result(1)) < estimate_tokens("x" * 1000)
+
+
+def test_search_results_fit_budget_with_trimmed_abstracts():
+    results = [result(n, " ".join(["слово"] * 200)) for n in range(10)]
+    packed, used = pack_search_results(results, 300)
+    assert 0 < len(packed) < 10
+    assert used <= 300
+    assert all(estimate_tokens(r["abstract"]) <= MAX_ABSTRACT_TOKENS for r in packed)
+
+
+def test_history_keeps_newest_entries_in_order():
+    history = [{"role": "user", "content": f"сообщение {n} " + "x" * 100} for n in range(10)]
+    packed, used = pack_history(history, 100)
+    assert packed == history[-len(packed):]
+    assert 0 < len(packed) < 10 and used <= 100
+
+
+def test_passages_skip_long_ones_for_shorter_followers():
+    passages = [{"url": "u", "text": "x" * 4000}, {"url": "u", "text": "короткий фрагмент"}]
+    packed, used = pack_passages(passages, 100)
+    assert packed == passages[1:] and used <= 100
+
+
+def test_pack_context_respects_num_ctx():
+    results = [result(n, " ".join(["слово"] * 200)) for n in range(50)]
+    history = [{"role": "user", "content": "x" * 2000}] * 20
+    passages = [{"url": "u", "text": "y" * 800}] * 20
+    packed_results, packed_history, packed_passages = pack_context(
+        "инструкция", results, history, passages, num_ctx=2048, reserve_tokens=512)
+    total = (estimate_tokens("инструкция")
+             + sum(result_tokens(r) for r in packed_results)
+             + sum(estimate_tokens(h["content"]) + 4 for h in packed_history)
+             + sum(12 + estimate_tokens(p["text"]) + estimate_tokens(p["url"]) for p in packed_passages))
+    assert packed_results and packed_history and packed_passages
+    assert total <= 2048 - 512
+
+
+def test_pack_context_when_fixed_text_does_not_fit():
+    assert pack_context("x" * 10000, [result(1)], num_ctx=1024, reserve_tokens=512) == ([], [], [])
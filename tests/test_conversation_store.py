@@ -0,0 +1,75 @@
+# LLMCAN/tests/test_conversation_store.py
+# ==================================================
+# Тесты хранилища диалогов (agents/conversation_store.py)
+# ==================================================
+
+import pytest
+
+from agents.conversation_store import Conversation, ConversationStore, like_pattern, read_history_file
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ConversationStore(path=tmp_path / "conversations.sqlite3")
+    yield store
+    store.close()
+
+
+def test_recent_messages_span_sessions_in_chronological_order(store):
+    first = Conversation(store, "agent")
+    first.add({"role": "user", "content": "1"}, {"role": "assistant", "content": "2"})
+    first.end()
+    second = Conversation(store, "agent")
+    second.add({"role": "user", "content": "3"})
+    Conversation(store, "other").add({"role": "user", "content": "чужое"})
+
+    assert [m["content"] for m in second.recent(limit=2)] == ["2", "3"]
+    assert [m["content"] for m in second.recent()] == ["1", "2", "3"]
+
+
+def test_search_is_limited_to_agent(store):
+    Conversation(store, "agent").add({"role": "user", "content": "курс доллара сегодня"})
+    Conversation(store, "other").add({"role": "user", "content": "курс доллара вчера"})
+
+    matches = store.search_messages("доллара", agent="agent")
+    assert [m["content"] for m in matches] == ["курс доллара сегодня"]
+    assert store.search_messages("   ") == []
+
+
+def test_like_fallback_matches_wildcards_literally(store):
+    store.fts = False
+    conversation = Conversation(store, "agent")
+    conversation.add(
+        {"role": "user", "content": "скидка 50% на всё"},
+        {"role": "user", "content": "скидка 500 рублей"},
+        {"role": "user", "content": "file_name.txt"},
+        {"role": "user", "content": "filename.txt"},
+    )
+
+    assert [m["content"] for m in conversation.search("50%")] == ["скидка 50% на всё"]
+    assert [m["content"] for m in conversation.search("file_name")] == ["file_name.txt"]
+    assert like_pattern("a\\%_") == "%a\\\\\\%\\_%"
+
+
+def test_search_results_are_flattened_and_ranked(store):
+    conversation = Conversation(store, "agent")
+    conversation.add_search_results("q", [[{"title": "A", "url": "http://a"}], [{"title": "B", "url": "http://b"}]])
+
+    rows = store.session_search_results(conversation.session_id)
+    assert [(r["rank"], r["title"]) for r in rows] == [(1, "A"), (2, "B")]
+
+
+def test_history_file_is_imported_once(store):
+    entries = [{"role": "user", "content": "старое"}, "мусор"]
+    assert store.import_history("agent", "/tmp/history.json", entries) == 1
+    assert store.import_history("agent", "/tmp/history.json", entries) == 0
+    assert store.is_imported("/tmp/history.json")
+    assert store.recent_messages(agent="agent") == [{"role": "user", "content": "старое"}]
+
+
+def test_read_history_file_accepts_only_json_array(tmp_path):
+    legacy = tmp_path / "history.json"
+    legacy.write_text('[{"role": "user", "content": "старое"}]', encoding="utf-8")
+    assert read_history_file(legacy) == [{"role": "user", "content": "старое"}]
+    legacy.write_text('{"role": "user", "content": "старое"}\n', encoding="utf-8")
+    assert read_history_file(legacy) is None
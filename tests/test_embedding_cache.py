@@ -0,0 +1,76 @@
+# LLMCAN/tests/test_embedding_cache.py
+# ==================================================
+# Тесты дискового кэша эмбеддингов (agents/embedding_cache.py)
+# ==================================================
+
+import numpy as np
+
+from agents import embedding_cache
+from agents.embedding_cache import EmbeddingCache
+
+
+def vector(value, dim=4):
+    return np.full(dim, value, dtype=np.float32)
+
+
+def stored(cache, keys):
+    return {key: float(v[0]) for key, v in cache.get_many(keys).items()}
+
+
+def test_vectors_survive_reopen(tmp_path):
+    cache = EmbeddingCache("nomic-embed-text", directory=tmp_path)
+    cache.add_many(["a", "b"], [vector(1), vector(2)])
+    cache.add_many(["a", "c"], [vector(9), vector(3)])
+
+    reopened = EmbeddingCache("nomic-embed-text", directory=tmp_path)
+    assert len(reopened) == 3
+    assert stored(reopened, ["a", "b", "c", "x"]) == {"a": 1.0, "b": 2.0, "c": 3.0}
+
+
+def test_oldest_entries_are_evicted_after_max_entries(tmp_path):
+    cache = EmbeddingCache("m", directory=tmp_path, max_entries=3)
+    for value, key in enumerate("abcde", 1):
+        cache.add_many([key], [vector(value)])
+
+    assert len(cache) == 3
+    assert stored(cache, list("abcde")) == {"c": 3.0, "d": 4.0, "e": 5.0}
+    # После открытия замещение продолжается с самой старой записи
+    reopened = EmbeddingCache("m", directory=tmp_path, max_entries=3)
+    reopened.add_many(["f"], [vector(6)])
+    assert stored(reopened, list("abcdef")) == {"d": 4.0, "e": 5.0, "f": 6.0}
+
+
+def test_batch_larger_than_limit_keeps_last_vectors(tmp_path):
+    cache = EmbeddingCache("m", directory=tmp_path, max_entries=2)
+    cache.add_many(list("abc"), [vector(1), vector(2), vector(3)])
+    assert stored(cache, list("abc")) == {"b": 2.0, "c": 3.0}
+
+
+def test_journal_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "INITIAL_CAPACITY", 2)
+    cache = EmbeddingCache("m", directory=tmp_path, max_entries=2)
+    for value in range(20):
+        cache.add_many([f"k{value}"], [vector(value)])
+
+    assert len(cache.keys_path.read_text().splitlines()) <= 4
+    reopened = EmbeddingCache("m", directory=tmp_path, max_entries=2)
+    assert stored(reopened, ["k17", "k18", "k19"]) == {"k18": 18.0, "k19": 19.0}
+
+
+def test_reads_legacy_journal_and_drops_torn_line(tmp_path):
+    cache = EmbeddingCache("m", directory=tmp_path)
+    cache.add_many(["a", "b"], [vector(1), vector(2)])
+    # Журнал формата 1.0.0 (ключ на строку) с оборванной последней записью
+    cache.keys_path.write_text("a\nb\nc")
+
+    reopened = EmbeddingCache("m", directory=tmp_path)
+    assert stored(reopened, ["a", "b", "c"]) == {"a": 1.0, "b": 2.0}
+    reopened.add_many(["c"], [vector(3)])
+    assert stored(EmbeddingCache("m", directory=tmp_path), ["a", "b", "c"]) == {"a": 1.0, "b": 2.0, "c": 3.0}
+
+
+def test_dimension_mismatch_is_ignored(tmp_path):
+    cache = EmbeddingCache("m", directory=tmp_path)
+    cache.add_many(["a"], [vector(1)])
+    cache.add_many(["b"], [vector(2, dim=8)])
+    assert len(cache) == 1
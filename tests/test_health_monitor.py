@@ -0,0 +1,68 @@
+# LLMCAN/tests/test_health_monitor.py
+# ==================================================
+# Тесты снимка состояния Ollama в agents/health_monitor.py
+# ==================================================
+
+from types import SimpleNamespace
+
+from agents import health_monitor
+from agents.health_monitor import HealthMonitor
+from agents.llm_pool import OllamaPool
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        self.calls.append(url)
+        return FakeResponse(self.responses[url.rsplit("/api", 1)[1]])
+
+
+def test_check_ollama_reads_pool_state_without_own_requests(monkeypatch):
+    session = FakeSession({
+        "/tags": {"models": [{"name": "llama3:latest", "size": 1}]},
+        "/ps": {"models": []},
+        "/version": {"version": "0.5.1"},
+    })
+    pool = OllamaPool(["http://ollama.test"], session=session)
+    monkeypatch.setattr(health_monitor, "get_llm_client", lambda: SimpleNamespace(pool=pool))
+    monitor = HealthMonitor()
+
+    # До первой проверки пула сервер не считается доступным
+    [host] = monitor.check_ollama()
+    assert not host["available"]
+
+    pool.refresh()
+    calls = len(session.calls)
+    [host] = monitor.check_ollama()
+    assert len(session.calls) == calls
+    assert host == {
+        "base_url": "http://ollama.test",
+        "available": True,
+        "version": "0.5.1",
+        "models": [{"name": "llama3:latest", "size": 1}],
+        "error": None,
+    }
+
+
+def test_wait_snapshot_returns_first_snapshot_or_empty_on_timeout(monkeypatch):
+    monitor = HealthMonitor()
+    monkeypatch.setattr(monitor, "check_tor", lambda: {"service": "active"})
+    monkeypatch.setattr(monitor, "check_ollama", lambda: [])
+
+    assert monitor.wait_snapshot(0.01) == {}
+    monitor.refresh()
+    assert monitor.wait_snapshot(0.01)["tor"] == {"service": "active"}
@@ -0,0 +1,114 @@
+# LLMCAN/tests/test_llm_cache.py
+# ==================================================
+# Тесты кэша ответов LLM (agents/llm_cache.py) и записи в него из OllamaClient
+# ==================================================
+
+import json
+from contextlib import contextmanager
+
+import pytest
+
+from agents import llm_cache
+from agents.llm_cache import LLMCache
+from agents.llm_client import IncompleteStreamError, OllamaClient
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMCache(path=tmp_path / "llm_cache.sqlite3", ttl=60, max_entries=2)
+    yield cache
+    cache.close()
+
+
+def test_make_key_ignores_transport_fields():
+    base = LLMCache.make_key("m", "prompt", {"num_ctx": 8192}, {"format": "json"})
+    assert base == LLMCache.make_key("m", "prompt", {"num_ctx": 8192},
+                                     {"format": "json", "stream": True, "keep_alive": "30m"})
+
+
+@pytest.mark.parametrize("model, prompt, options", [
+    ("other", "prompt", {"num_ctx": 8192}),
+    ("m", "prompt 2", {"num_ctx": 8192}),
+    ("m", "prompt", {"num_ctx": 4096}),
+])
+def test_make_key_depends_on_model_prompt_and_options(model, prompt, options):
+    assert LLMCache.make_key("m", "prompt", {"num_ctx": 8192}) != LLMCache.make_key(model, prompt, options)
+
+
+def test_get_returns_stored_response_without_context(cache):
+    cache.set("k", "m", {"response": "ok", "done": True, "context": [1, 2, 3]})
+    assert cache.get("k") == {"response": "ok", "done": True}
+
+
+def test_expired_entry_is_not_returned(cache, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now)
+    cache.set("k", "m", {"response": "ok"})
+    now += 61
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entry_is_evicted(cache, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(llm_cache.time, "time", lambda: float(next(clock)))
+    cache.set("a", "m", {"response": "a"})
+    cache.set("b", "m", {"response": "b"})
+    assert cache.get("a") is not None  # "b" становится самой давней записью
+    cache.set("c", "m", {"response": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+class FakeStreamResponse:
+    def __init__(self, chunks):
+        self.lines = [json.dumps(chunk).encode() for chunk in chunks]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+class FakeSession:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def post(self, url, json=None, stream=False, timeout=None):
+        return FakeStreamResponse(self.chunks)
+
+
+class FakePool:
+    @contextmanager
+    def acquire(self, model):
+        yield "http://ollama.test"
+
+
+def make_client(cache, chunks):
+    client = OllamaClient(hosts=["http://ollama.test"], cache=cache)
+    client.session = FakeSession(chunks)
+    client.pool = FakePool()
+    return client
+
+
+def test_truncated_stream_raises_and_is_not_cached(cache):
+    client = make_client(cache, [{"response": "нача", "done": False}, {"response": "ло", "done": False}])
+    tokens = []
+    with pytest.raises(IncompleteStreamError):
+        client.generate("prompt", "m", stream=True, on_token=tokens.append)
+    assert tokens == ["нача", "ло"]
+    key = cache.make_key("m", "prompt", client._options(), {})
+    assert cache.get(key) is None
+
+
+def test_completed_stream_is_cached(cache):
+    client = make_client(cache, [{"response": "полный", "done": False}, {"response": " ответ", "done": True}])
+    response = client.generate("prompt", "m", stream=True)
+    assert response["response"] == "полный ответ"
+    assert cache.get(cache.make_key("m", "prompt", client._options(), {}))["response"] == "полный ответ"
@@ -0,0 +1,75 @@
+# LLMCAN/tests/test_llm_stages.py
+# ==================================================
+# Тесты каскада моделей по этапам (generate_stage в agents/llm_client.py)
+# ==================================================
+
+import pytest
+import requests
+
+from agents import llm_client
+from agents.llm_client import IncompleteStreamError, failure_reason, generate_stage
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (requests.ReadTimeout(), "не уложилась в 30 с"),
+    (requests.ConnectTimeout(), "недоступна (нет соединения с сервером)"),
+    (requests.ConnectionError(), "недоступна (нет соединения с сервером)"),
+    (http_error(404), "не найдена на сервере"),
+    (http_error(500), "вернула ошибку HTTP 500"),
+    (IncompleteStreamError(), "оборвала ответ"),
+    (ValueError("bad json"), "вернула некорректный ответ"),
+])
+def test_failure_reason_depends_on_error_type(error, expected):
+    assert failure_reason(error, 30) == expected
+
+
+class FakeClient:
+    """Для каждой модели — выведенные токены и исключение (или None)."""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+
+    def generate(self, prompt, model, stream=False, on_token=None, **kwargs):
+        tokens, error = self.outcomes[model]
+        for token in tokens:
+            if on_token:
+                on_token(token)
+        if error:
+            raise error
+        return {"response": "".join(tokens)}
+
+
+@pytest.fixture
+def cascade(monkeypatch):
+    monkeypatch.setitem(llm_client.LLM_STAGES, "test", [("big", 5), ("small", 5)])
+
+    def use(outcomes):
+        monkeypatch.setattr(llm_client, "get_llm_client", lambda: FakeClient(outcomes))
+    return use
+
+
+def test_partial_stream_is_closed_before_fallback(cascade):
+    cascade({"big": (["част", "ично"], IncompleteStreamError()), "small": (["ответ"], None)})
+    output = []
+    assert generate_stage("test", "p", stream=True, on_token=output.append) == "ответ"
+    assert "".join(output) == "частично\n[— ответ прерван —]\n[big оборвала ответ, переключаюсь на small]\nответ"
+
+
+def test_missing_model_is_not_reported_as_timeout(cascade):
+    cascade({"big": ([], http_error(404)), "small": (["ответ"], None)})
+    output = []
+    generate_stage("test", "p", stream=True, on_token=output.append)
+    assert output[0] == "\n[big не найдена на сервере, переключаюсь на small]\n"
+
+
+def test_returns_none_when_all_models_fail(cascade):
+    cascade({"big": ([], requests.ReadTimeout()), "small": (["об"], requests.ReadTimeout())})
+    output = []
+    assert generate_stage("test", "p", stream=True, on_token=output.append) is None
+    assert output[-1] == "\n[— ответ прерван —]"
@@ -0,0 +1,57 @@
+# LLMCAN/tests/test_page_fetcher.py
+# ==================================================
+# Тесты загрузки страниц (agents/page_fetcher.py)
+# ==================================================
+
+from agents.http_sessions import DIRECT, TOR
+from agents.page_fetcher import PageFetcher
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+    encoding = "utf-8"
+    apparent_encoding = "utf-8"
+
+    def __init__(self, body):
+        self.body = body
+
+    def iter_content(self, chunk_size=1):
+        yield self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def get(self, url, **kwargs):
+        return FakeResponse(b"<html><title>T</title><body><p>" + b"word " * 50 + b"</p></body></html>")
+
+
+class FakeSessions:
+    """Фабрика сессий: запоминает запрошенные маршруты."""
+
+    def __init__(self):
+        self.routes = []
+
+    def get(self, route):
+        self.routes.append(route)
+        return FakeSession()
+
+
+def test_fetch_passages_uses_requested_route_and_releases_hosts():
+    sessions = FakeSessions()
+    fetcher = PageFetcher(workers=2, per_host=1, sessions=sessions)
+    results = [{"url": f"http://site{i}.test/page"} for i in range(3)] + [{"url": "http://site0.test/other"}]
+
+    passages = fetcher.fetch_passages(results, top_n=4, deadline=5, use_tor=True)
+    assert {p["url"] for p in passages} == {r["url"] for r in results}
+    assert set(sessions.routes) == {TOR}
+    # Семафоры хостов не накапливаются после завершения загрузок
+    assert fetcher._host_limits == {}
+
+    fetcher.fetch_passages(results[:1], deadline=5)
+    assert sessions.routes[-1] == DIRECT
@@ -0,0 +1,65 @@
+# LLMCAN/tests/test_passage_ranker.py
+# ==================================================
+# Тесты ранжирования фрагментов по BM25 (agents/passage_ranker.py)
+# ==================================================
+
+import math
+
+import pytest
+
+from agents.context_packer import estimate_tokens
+from agents.passage_ranker import BM25Index, rank_passages, select_passages, tokenize
+
+TEXTS = [
+    "Курс доллара вырос на бирже",
+    "Прогноз погоды на завтра: дождь",
+    "Доллар и евро: курс долларов к рублю, курс евро",
+]
+
+
+def reference_bm25(texts, query, k1=1.5, b=0.75):
+    """Построчная формула BM25 для сверки с матричной реализацией."""
+    docs = [tokenize(text) for text in texts]
+    avg_length = sum(map(len, docs)) / len(docs)
+    scores = []
+    for doc in docs:
+        score = 0.0
+        for term in tokenize(query):
+            freq = doc.count(term)
+            if not freq:
+                continue
+            doc_freq = sum(term in other for other in docs)
+            idf = math.log1p((len(docs) - doc_freq + 0.5) / (doc_freq + 0.5))
+            score += idf * freq * (k1 + 1) / (freq + k1 * (1 - b + b * len(doc) / avg_length))
+        scores.append(score)
+    return scores
+
+
+def test_tokenize_lowercases_and_stems():
+    assert tokenize("Долларов, ДОЛЛАРА и доллар: a 42") == ["доллар", "доллар", "доллар", "42"]
+
+
+def test_matrix_scores_match_reference_formula():
+    scores = BM25Index(TEXTS).scores(["курс доллара"])
+    assert scores.tolist() == pytest.approx(reference_bm25(TEXTS, "курс доллара"), rel=1e-5)
+
+
+def test_scores_sum_over_queries():
+    index = BM25Index(TEXTS)
+    combined = index.scores(["курс", "погода завтра"])
+    assert combined.tolist() == pytest.approx((index.scores(["курс"]) + index.scores(["погода завтра"])).tolist())
+
+
+def test_empty_index_and_queries():
+    assert BM25Index([]).scores(["курс"]).tolist() == []
+    assert BM25Index(TEXTS).scores([]).tolist() == [0.0, 0.0, 0.0]
+
+
+def test_rank_and_select_passages():
+    passages = [{"url": f"http://{n}", "title": "", "text": text} for n, text in enumerate(TEXTS)]
+    ranked = rank_passages(passages, ["курс доллара"])
+    assert [p["url"] for _, p in ranked][:2] == ["http://2", "http://0"]
+
+    selected = select_passages(passages, ["курс доллара"], budget_tokens=estimate_tokens(TEXTS[2]))
+    # Фрагмент без общих терминов не отбирается, лишний не помещается в бюджет
+    assert selected == [passages[2]]
@@ -0,0 +1,48 @@
+# LLMCAN/tests/test_result_fusion.py
+# ==================================================
+# Тесты объединения результатов поиска (agents/result_fusion.py)
+# ==================================================
+
+import pytest
+
+from agents.result_fusion import fuse_results, normalize_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTPS://WWW.Example.com/Path/?utm_source=x&b=2&a=1#top", "https://example.com/Path?a=1&b=2"),
+    ("http://example.com:80/", "http://example.com/"),
+    ("http://example.com:8080/a/", "http://example.com:8080/a"),
+    ("https://example.com/?fbclid=1&gclid=2", "https://example.com/"),
+    ("https://example.com/?q=", "https://example.com/?q="),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def result(url, abstract=""):
+    return {"title": url, "url": url, "abstract": abstract}
+
+
+def test_pages_found_by_several_queries_rank_higher():
+    fused = fuse_results([
+        [result("http://a"), result("http://b")],
+        [result("http://c"), result("http://www.b/?utm_medium=x")],
+        [result("http://b/")],
+    ], top_k=10, k=60)
+    assert [r["url"] for r in fused][:1] == ["http://b"]
+    assert len(fused) == 3
+
+
+def test_duplicate_keeps_longest_abstract_and_ties_keep_first_order():
+    fused = fuse_results([
+        [result("http://a", "коротко"), result("http://x")],
+        [result("http://a/", "подробная аннотация"), result("http://y")],
+    ], top_k=10, k=60)
+    assert fused[0]["abstract"] == "подробная аннотация"
+    assert [r["url"] for r in fused[1:]] == ["http://x", "http://y"]
+
+
+def test_top_k_and_invalid_entries():
+    fused = fuse_results([[result(f"http://{i}") for i in range(5)] + ["мусор", {"title": "без url"}], None],
+                         top_k=2, k=60)
+    assert [r["url"] for r in fused] == ["http://0", "http://1"]
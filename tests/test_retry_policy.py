@@ -0,0 +1,85 @@
+# LLMCAN/tests/test_retry_policy.py
+# ==================================================
+# Тесты политики повторов поиска (agents/retry_policy.py)
+# ==================================================
+
+import pytest
+
+from agents import retry_policy
+from agents.retry_policy import RetryPolicy
+from agents.search_backends import SearchDecodeError, SearchNetworkError, SearchRateLimited
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    delays = []
+    monkeypatch.setattr(retry_policy.time, "sleep", delays.append)
+    return delays
+
+
+def failing(*errors, result=None):
+    """Функция поиска, выбрасывающая errors по очереди, затем возвращающая result."""
+    calls = []
+
+    def search(query):
+        calls.append(query)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    search.calls = calls
+    return search
+
+
+def test_network_errors_are_retried_until_success():
+    search = failing(SearchNetworkError("1"), SearchNetworkError("2"), result=["ok"])
+    assert RetryPolicy(max_attempts=3, deadline=60).call(search, "q") == ["ok"]
+    assert len(search.calls) == 3
+
+
+def test_attempts_exhausted_returns_none():
+    search = failing(*[SearchNetworkError("x")] * 5)
+    assert RetryPolicy(max_attempts=2, deadline=60).call(search, "q") is None
+    assert len(search.calls) == 2
+
+
+def test_empty_result_is_not_retried():
+    search = failing(result=[])
+    assert RetryPolicy(max_attempts=3, deadline=60).call(search, "q") == []
+    assert len(search.calls) == 1
+
+
+def test_decode_error_is_retried_once():
+    search = failing(*[SearchDecodeError("x")] * 5)
+    assert RetryPolicy(max_attempts=5, deadline=60).call(search, "q") is None
+    assert len(search.calls) == 2
+
+
+def test_rate_limit_calls_hook_and_uses_longer_backoff(monkeypatch, no_sleep):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    rotations = []
+    policy = RetryPolicy(max_attempts=3, base_delay=1, max_delay=100, deadline=60,
+                         on_rate_limit=lambda: rotations.append(1), rate_limit_factor=4)
+    search = failing(SearchRateLimited("429"), SearchNetworkError("timeout"), result=["ok"])
+    assert policy.call(search, "q") == ["ok"]
+    assert rotations == [1]
+    assert no_sleep == [4, 2]
+
+
+def test_unknown_errors_are_raised():
+    with pytest.raises(KeyError):
+        RetryPolicy().call(failing(KeyError("x")), "q")
+
+
+def test_retry_stops_when_deadline_would_be_exceeded(monkeypatch, no_sleep):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    search = failing(*[SearchNetworkError("x")] * 5)
+    policy = RetryPolicy(max_attempts=5, base_delay=10, max_delay=100, deadline=5)
+    assert policy.call(search, "q") is None
+    assert len(search.calls) == 1
+    assert no_sleep == []
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=3)
+    assert all(0 <= policy.backoff(10) <= 3 for _ in range(20))
@@ -0,0 +1,115 @@
+# LLMCAN/tests/test_search_backends.py
+# ==================================================
+# Тесты поисковых бэкендов (agents/search_backends.py): разбор HTML-выдачи
+# DuckDuckGo и отчёты пулу цепочек TOR
+# ==================================================
+
+import pytest
+
+from agents import search_backends
+from agents.search_backends import (
+    DuckDuckGoResultParser,
+    SearchBackend,
+    SearchDecodeError,
+    SearchNetworkError,
+    SearchRateLimited,
+    unwrap_redirect,
+)
+
+
+def parse(html):
+    parser = DuckDuckGoResultParser()
+    parser.feed(html)
+    return parser.results
+
+
+def result_html(url, title, snippet):
+    return (
+        f'<div class="result"><h2><a class="result__a" href="{url}">{title}</a></h2>'
+        f'<a class="result__snippet" href="{url}">{snippet}</a></div>'
+    )
+
+
+def test_parses_titles_urls_and_abstracts():
+    results = parse(
+        result_html("http://x", "Первый <b>результат</b>", "текст <b>один</b>")
+        + result_html("http://y", "Второй", "текст два")
+    )
+    assert results == [
+        {"title": "Первый результат", "url": "http://x", "abstract": "текст один"},
+        {"title": "Второй", "url": "http://y", "abstract": "текст два"},
+    ]
+
+
+def test_void_elements_do_not_swallow_following_results():
+    results = parse(
+        '<a class="result__a" href="http://x">T1</a>'
+        '<a class="result__snippet">one<br>two <img src="i.png">thr<wbr>ee</a>'
+        '<a class="result__a" href="http://y">T2</a>'
+        '<a class="result__snippet">s2</a>'
+    )
+    assert [r["title"] for r in results] == ["T1", "T2"]
+    assert results[0]["abstract"] == "one two three"
+    assert results[1]["abstract"] == "s2"
+
+
+def test_self_closing_tags_keep_nesting_balanced():
+    results = parse(
+        '<a class="result__a" href="http://x">T1</a>'
+        '<a class="result__snippet">one<br/>two<span/></a>'
+        '<a class="result__a" href="http://y">T2</a>'
+    )
+    assert [r["title"] for r in results] == ["T1", "T2"]
+    assert results[0]["abstract"] == "one two"
+
+
+def test_unwrap_redirect():
+    assert unwrap_redirect("//duckduckgo.com/l/?uddg=https%3A%2F%2Fexample.com%2Fa%3Fb%3D1&rut=x") \
+        == "https://example.com/a?b=1"
+    assert unwrap_redirect("https://example.com/") == "https://example.com/"
+
+
+class FakeCircuitPool:
+    def __init__(self):
+        self.reports = []
+        self.released = 0
+
+    def acquire(self):
+        return "circuit"
+
+    def release(self, circuit):
+        self.released += 1
+
+    def report(self, circuit, ok, latency=None, blocked=False):
+        self.reports.append((ok, blocked))
+
+
+class FailingBackend(SearchBackend):
+    def __init__(self, error):
+        self.error = error
+
+    def _search(self, query, use_tor=False, circuit=None):
+        raise self.error
+
+
+@pytest.mark.parametrize("error, report", [
+    (SearchRateLimited("429"), (False, True)),
+    (SearchNetworkError("timeout"), (False, False)),
+    (SearchDecodeError("bad json"), (False, False)),
+    (ValueError("unexpected"), (False, False)),
+])
+def test_every_failure_is_reported_to_circuit_pool(monkeypatch, error, report):
+    pool = FakeCircuitPool()
+    monkeypatch.setattr(search_backends, "get_circuit_pool", lambda: pool)
+    with pytest.raises(type(error)):
+        FailingBackend(error).search("q", use_tor=True)
+    assert pool.reports == [report]
+    assert pool.released == 1
+
+
+def test_backend_without_search_cannot_be_instantiated():
+    class Incomplete(SearchBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
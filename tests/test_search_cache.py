@@ -0,0 +1,65 @@
+# LLMCAN/tests/test_search_cache.py
+# ==================================================
+# Тесты дискового кэша результатов поиска (agents/search_cache.py)
+# ==================================================
+
+import pytest
+
+from agents import search_cache
+from agents.search_cache import SearchCache, cached_search, normalize_query
+
+RESULTS = [{"title": "T", "url": "http://x", "abstract": "A"}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SearchCache(path=tmp_path / "search_cache.sqlite3", ttl=60, max_entries=2)
+    yield cache
+    cache.close()
+
+
+def test_normalize_query():
+    assert normalize_query('  «Курс  доллара»?  ') == "курс доллара"
+    assert normalize_query('"Python" GIL.') == "python gil"
+
+
+def test_key_depends_on_normalized_query_and_tor_mode():
+    assert SearchCache.make_key("Курс  доллара?", False) == SearchCache.make_key("курс доллара", False)
+    assert SearchCache.make_key("курс доллара", False) != SearchCache.make_key("курс доллара", True)
+
+
+def test_get_returns_stored_results_for_same_mode_only(cache):
+    cache.set("Курс доллара", False, RESULTS)
+    assert cache.get("курс доллара?", False) == RESULTS
+    assert cache.get("курс доллара", True) is None
+
+
+def test_expired_entries_are_dropped(cache, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(search_cache.time, "time", lambda: now)
+    cache.set("q", False, RESULTS)
+    now += 61
+    assert cache.get("q", False) is None
+
+
+def test_least_recently_used_entry_is_evicted(cache, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(search_cache.time, "time", lambda: now)
+    cache.set("a", False, RESULTS)
+    now += 1
+    cache.set("b", False, RESULTS)
+    now += 1
+    assert cache.get("a", False) == RESULTS
+    now += 1
+    cache.set("c", False, RESULTS)
+    assert cache.get("b", False) is None
+    assert cache.get("a", False) == RESULTS
+
+
+def test_failed_and_empty_searches_are_not_cached(cache, monkeypatch):
+    monkeypatch.setattr(search_cache, "get_search_cache", lambda: cache)
+    assert cached_search(lambda q: None, "q", False) is None
+    assert cached_search(lambda q: [], "q", False) == []
+    assert cache.get("q", False) is None
+    assert cached_search(lambda q: RESULTS, "q", False) == RESULTS
+    assert cached_search(lambda q: pytest.fail("повторный поиск"), "q", False) == RESULTS
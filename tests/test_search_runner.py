@@ -0,0 +1,34 @@
+# LLMCAN/tests/test_search_runner.py
+# ==================================================
+# Тесты параллельного и упреждающего поиска (agents/search_runner.py)
+# ==================================================
+
+import threading
+
+from agents.search_runner import run_queries, start_speculative
+
+
+def test_run_queries_keeps_order_and_deduplicates():
+    calls = []
+
+    def search(query):
+        calls.append(query)
+        if query == "fail":
+            raise RuntimeError("boom")
+        return [query]
+
+    results = run_queries(["a", "fail", " A ", "b"], search)
+    assert results == [["a"], None, ["a"], ["b"]]
+    assert sorted(calls) == ["a", "b", "fail"]
+
+
+def test_speculative_search_skipped_while_previous_is_running():
+    release = threading.Event()
+    first = start_speculative("slow", lambda q: release.wait(5) and [q])
+    try:
+        assert first is not None
+        assert start_speculative("next", lambda q: [q]) is None
+    finally:
+        release.set()
+    assert first.result(timeout=5) == ["slow"]
+    assert start_speculative("next", lambda q: [q]).result(timeout=5) == ["next"]
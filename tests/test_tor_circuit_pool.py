@@ -0,0 +1,134 @@
+# LLMCAN/tests/test_tor_circuit_pool.py
+# ==================================================
+# Тесты пула изолированных цепочек TOR (agents/install_tor.py) и фоновых
+# замеров цепочек (agents/tor_prober.py)
+# ==================================================
+
+from threading import Thread
+from types import SimpleNamespace
+
+import pytest
+
+from agents import install_tor
+from agents.install_tor import TorCircuitPool
+from agents.tor_prober import CircuitProber
+
+
+@pytest.fixture(autouse=True)
+def no_controller(monkeypatch):
+    closed = []
+    monkeypatch.setattr(install_tor, "get_tor_controller",
+                        lambda: SimpleNamespace(close_circuits=closed.append))
+    return closed
+
+
+def make_pool(size=3, **kwargs):
+    options = dict(socks_proxy="socks5://127.0.0.1:9050", ports=[9050, 9052], max_failures=2,
+                   max_latency=10, window=10, min_success=0.5)
+    options.update(kwargs)
+    return TorCircuitPool(size=size, **options)
+
+
+def test_circuits_are_isolated_and_spread_over_ports():
+    pool = make_pool(size=4)
+    circuits = pool.circuits()
+    assert [c.port for c in circuits] == [9050, 9052, 9050, 9052]
+    assert len({c.username for c in circuits}) == 4
+    assert circuits[0].proxy.startswith(f"socks5h://{circuits[0].username}:")
+
+
+def test_acquire_prefers_free_then_fast_circuits():
+    pool = make_pool()
+    slow, fast, unmeasured = pool.circuits()
+    for latency in (3.0, 3.2):
+        pool.report(slow, ok=True, latency=latency)
+    for latency in (1.0, 1.2):
+        pool.report(fast, ok=True, latency=latency)
+
+    first = pool.acquire()
+    assert first is fast
+    # Занятая цепочка уступает свободным; без замеров цепочка считается средней
+    assert pool.acquire() is unmeasured
+    assert pool.acquire() is slow
+    pool.release(first)
+    assert pool.acquire() is fast
+
+
+def test_equal_circuits_are_used_round_robin():
+    pool = make_pool()
+    picked = []
+    for _ in range(3):
+        circuit = pool.acquire()
+        picked.append(circuit)
+        pool.release(circuit)
+    assert picked == pool.circuits()
+
+
+@pytest.mark.parametrize("reports", [
+    [dict(ok=False, blocked=True)],
+    [dict(ok=False), dict(ok=False)],
+    [dict(ok=True, latency=11.0)],
+])
+def test_bad_circuit_is_replaced(reports):
+    pool = make_pool()
+    circuit = pool.circuits()[1]
+    for report in reports:
+        pool.report(circuit, **report)
+    replacement = pool.circuits()[1]
+    assert replacement is not circuit
+    assert replacement.port == circuit.port
+
+
+def test_single_failure_keeps_circuit():
+    pool = make_pool()
+    circuit = pool.circuits()[0]
+    pool.report(circuit, ok=False)
+    pool.report(circuit, ok=True, latency=1.0)
+    pool.report(circuit, ok=False)
+    assert pool.circuits()[0] is circuit
+
+
+def test_rebalance_replaces_slow_and_unreliable_circuits(no_controller):
+    pool = make_pool(size=4)
+    slow, unreliable, *normal = pool.circuits()
+    for circuit in normal:
+        for latency in (1.0, 1.1, 1.2):
+            circuit.record(True, latency)
+    for latency in (5.0, 5.5, 6.0):
+        slow.record(True, latency)
+    for ok in (False, False, True):
+        unreliable.record(ok, 1.0 if ok else None)
+
+    evicted = pool.rebalance(percentile=90, min_samples=3)
+    assert set(evicted) == {slow, unreliable}
+    assert sorted(no_controller) == sorted([slow.username, unreliable.username])
+    assert pool.circuits()[2:] == normal
+
+
+def test_paused_prober_skips_rounds(monkeypatch):
+    prober = CircuitProber(make_pool(), interval=0.01)
+    rounds = []
+
+    def probe_all():
+        rounds.append(prober.paused)
+        prober.stop()
+
+    monkeypatch.setattr(prober, "probe_all", probe_all)
+    prober.pause()
+    thread = Thread(target=prober._run, daemon=True)
+    thread.start()
+    thread.join(0.1)
+    assert rounds == [] and thread.is_alive()
+    prober.resume()
+    thread.join(1)
+    assert rounds == [False] and not thread.is_alive()
+
+
+def test_tor_probing_follows_tor_mode(monkeypatch):
+    prober = CircuitProber(make_pool())
+    monkeypatch.setattr(install_tor, "_circuit_prober", prober)
+    monkeypatch.setattr(install_tor, "_tor_probing", True)
+    install_tor.set_tor_probing(False)
+    assert prober.paused
+    install_tor.set_tor_probing(True)
+    assert not prober.paused